@@ -2,7 +2,7 @@ import os
 import django
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'medical_consultation.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Medical_consultation.settings')
 django.setup()
 
 from channels.routing import ProtocolTypeRouter, URLRouter
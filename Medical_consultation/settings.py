@@ -57,6 +57,7 @@ LOCAL_APPS = [
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
+    'apps.core.query_budget.QueryBudgetMiddleware',  # QUERY_BUDGET['ENABLED'] bo'lsagina ishlaydi
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Static files uchun
@@ -247,8 +248,47 @@ CHANNEL_LAYERS = {
 #     }
 # }
 
+# Search log ingestion buffer (see apps/core/search_log_buffer.py)
+SEARCH_LOG_BUFFER = {
+    'ENABLED': config('SEARCH_LOG_BUFFER_ENABLED', default=True, cast=bool),
+    'BACKEND': config('SEARCH_LOG_BUFFER_BACKEND', default='local'),  # 'local' yoki 'redis'
+    'REDIS_URL': config('SEARCH_LOG_BUFFER_REDIS_URL', default='redis://127.0.0.1:6379/1'),
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': 5,  # soniya
+}
+
+# Admin dashboard snapshot (see apps/admin_panel/dashboard.py)
+ADMIN_DASHBOARD_SNAPSHOT = {
+    'MAX_AGE': config('ADMIN_DASHBOARD_MAX_AGE', default=300, cast=int),  # soniya
+    'BACKGROUND_REFRESH': True,
+}
+
+# Doctor micro-charges settled in batches (see apps/billing/sub_ledger.py)
+BILLING_SUB_LEDGER = {
+    'ENABLED': config('BILLING_SUB_LEDGER_ENABLED', default=False, cast=bool),
+    'SETTLE_INTERVAL': 30,  # soniya
+    'BATCH_SIZE': 2000,
+}
+
+# SQL query budgets per view (see apps/core/query_budget.py)
+QUERY_BUDGET = {
+    'ENABLED': config('QUERY_BUDGET_ENABLED', default=DEBUG, cast=bool),
+    'HEADERS': True,
+    'LOG_OVER_BUDGET': True,
+    'DEFAULT_BUDGET': None,
+}
+
 # Google Gemini AI Settings
 GOOGLE_API_KEY = config('GOOGLE_API_KEY', default='')
+GEMINI_MAX_CONCURRENCY = config('GEMINI_MAX_CONCURRENCY', default=8, cast=int)  # Bir vaqtdagi so'rovlar
+
+# Tasniflash natijalari cache'i (see apps/ai_assistant/classification_cache.py)
+AI_CLASSIFICATION_CACHE = {
+    'TTL': config('AI_CLASSIFICATION_CACHE_TTL', default=3600, cast=int),  # soniya
+    'MAX_ENTRIES': 1000,  # jarayon ichidagi LRU hajmi
+    'NEAR_DUPLICATE': config('AI_CLASSIFICATION_NEAR_DUPLICATE', default=False, cast=bool),
+    'NEAR_DUPLICATE_THRESHOLD': 0.8,
+}
 
 # Logging Configuration
 LOGGING = {
@@ -0,0 +1,171 @@
+"""
+Admin dashboard snapshot.
+
+AdminDashboardAPIView used to run one COUNT query per status/type bucket
+(about 20 queries per page load). The snapshot computes every bucket of a
+table with a single conditional-aggregate query (four queries in total plus
+the two "recent" lists) and keeps the result in the cache, so the admin home
+page is served from one cache read.
+
+Freshness (apps.core.swr_cache with a data version):
+    - Saving/deleting a User, Hospital, Doctor or Consultation bumps the
+      data version (see the signal handlers in admin_panel/models.py).
+    - A snapshot built at an old version, or older than ``MAX_AGE`` seconds,
+      is still returned, and a rebuild starts on a background thread
+      (stale-while-revalidate). Only a missing snapshot is built on the
+      request thread.
+    - ``generated_at`` tells the admin how fresh the numbers are.
+
+Configuration (settings.ADMIN_DASHBOARD_SNAPSHOT, all keys optional):
+    {
+        'MAX_AGE': 300,               # seconds
+        'BACKGROUND_REFRESH': True,   # False - rebuild stale snapshots inline
+    }
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from apps.core.swr_cache import StaleWhileRevalidateCache
+
+DEFAULTS = {
+    'MAX_AGE': 300,
+    'BACKGROUND_REFRESH': True,
+}
+
+# Bump when the snapshot layout changes, so old cached snapshots are ignored
+SNAPSHOT_SCHEMA = 1
+SNAPSHOT_KEY = f'admin_dashboard:snapshot:v{SNAPSHOT_SCHEMA}'
+VERSION_KEY = 'admin_dashboard:data_version'
+REFRESH_LOCK_TIMEOUT = 60
+
+RECENT_LIMIT = 5
+
+
+def get_dashboard_settings():
+    """ADMIN_DASHBOARD_SNAPSHOT settings merged with defaults"""
+    return {**DEFAULTS, **getattr(settings, 'ADMIN_DASHBOARD_SNAPSHOT', {})}
+
+
+def _user_stats():
+    from django.contrib.auth import get_user_model
+
+    return get_user_model().objects.aggregate(
+        total_users=Count('id'),
+        active_users=Count('id', filter=Q(is_active=True)),
+        patients=Count('id', filter=Q(user_type='patient')),
+        doctors=Count('id', filter=Q(user_type='doctor')),
+        approved_doctors=Count('id', filter=Q(user_type='doctor', is_approved_by_admin=True)),
+        pending_doctors=Count('id', filter=Q(
+            user_type='doctor', is_approved_by_admin=False, is_active=True
+        )),
+        hospital_admins=Count('id', filter=Q(user_type='hospital_admin')),
+    )
+
+
+def _hospital_stats():
+    from apps.hospitals.models import Hospital
+
+    # The doctors join repeats hospital rows, hence distinct counts
+    return Hospital.objects.aggregate(
+        total_hospitals=Count('id', distinct=True),
+        active_hospitals=Count('id', filter=Q(is_active=True), distinct=True),
+        hospitals_with_doctors=Count('id', filter=Q(doctors__isnull=False), distinct=True),
+    )
+
+
+def _doctor_stats():
+    from apps.doctors.models import Doctor
+
+    return Doctor.objects.aggregate(
+        total_doctors=Count('id'),
+        verified_doctors=Count('id', filter=Q(verification_status='approved')),
+        pending_doctors=Count('id', filter=Q(verification_status='pending')),
+        rejected_doctors=Count('id', filter=Q(verification_status='rejected')),
+        available_doctors=Count('id', filter=Q(is_available=True)),
+    )
+
+
+def _consultation_stats():
+    from apps.consultations.models import Consultation
+
+    return Consultation.objects.aggregate(
+        total_consultations=Count('id'),
+        completed_consultations=Count('id', filter=Q(status='completed')),
+        pending_consultations=Count('id', filter=Q(status='scheduled')),
+        cancelled_consultations=Count('id', filter=Q(status='cancelled')),
+    )
+
+
+def get_data_version():
+    """Current data version (0 until the first change is recorded)"""
+    return cache.get(VERSION_KEY, 0)
+
+
+def _compute_snapshot():
+    from apps.doctors.models import Doctor
+    from django.contrib.auth import get_user_model
+
+    from .serializers import AdminDoctorSerializer, AdminUserSerializer
+
+    recent_users = get_user_model().objects.filter(is_active=True).order_by('-created_at')[:RECENT_LIMIT]
+    pending_doctors = Doctor.objects.filter(
+        verification_status='pending'
+    ).order_by('-created_at')[:RECENT_LIMIT]
+
+    return {
+        'user_stats': _user_stats(),
+        'hospital_stats': _hospital_stats(),
+        'doctor_stats': _doctor_stats(),
+        'consultation_stats': _consultation_stats(),
+        'recent_users': AdminUserSerializer(recent_users, many=True).data,
+        'pending_doctors': AdminDoctorSerializer(pending_doctors, many=True).data,
+        'generated_at': timezone.now().isoformat(),
+    }
+
+
+def _snapshot_cache():
+    config = get_dashboard_settings()
+    return StaleWhileRevalidateCache(
+        _compute_snapshot,
+        SNAPSHOT_KEY,
+        soft_ttl=config['MAX_AGE'],
+        hard_ttl=None,
+        lock_timeout=REFRESH_LOCK_TIMEOUT,
+        version_key=VERSION_KEY,
+        background=config['BACKGROUND_REFRESH'],
+    )
+
+
+def mark_dashboard_stale():
+    """Record a data change; cached snapshots become stale"""
+    _snapshot_cache().bump_version()
+
+
+def build_dashboard_snapshot():
+    """
+    Compute the dashboard data and store it in the cache.
+
+    Returns:
+        dict: The snapshot (same keys as the dashboard response)
+    """
+    return _snapshot_cache().refresh()
+
+
+def get_dashboard_snapshot(force_refresh=False):
+    """
+    Dashboard data, served from the cached snapshot.
+
+    Args:
+        force_refresh: Rebuild the snapshot on the request thread
+
+    Returns:
+        dict: Snapshot with ``generated_at`` and a ``stale`` flag
+    """
+    snapshot_cache = _snapshot_cache()
+    if force_refresh:
+        return {**snapshot_cache.refresh(), 'stale': False}
+
+    snapshot, stale = snapshot_cache.lookup()
+    return {**snapshot, 'stale': stale}
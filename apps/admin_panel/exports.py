@@ -0,0 +1,270 @@
+"""
+Streaming data export for the admin panel.
+
+Rows are read with ``QuerySet.iterator(chunk_size=...)`` and written to a
+``StreamingHttpResponse`` one by one, so memory use does not grow with the
+table size and the first bytes reach the client as soon as the first chunk
+is fetched. Related counts are annotated in the same query.
+
+Formats:
+    - json:   {"type", "format", "exported_at", "data": [...], "count"}
+    - ndjson: one JSON object per line
+    - csv:    RFC 4180 CSV with a header row
+    - xlsx:   Excel-friendly CSV (UTF-8 BOM, CRLF, formula-like cells escaped)
+
+Data types: users, doctors, hospitals, transactions, charges.
+
+``format`` is also DRF's format-suffix parameter, so the view lists
+EXPORT_RENDERERS as its renderer classes.
+"""
+import csv
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from uuid import UUID
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+CHUNK_SIZE = 2000
+
+FORMATS = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'text/csv; charset=utf-8',
+}
+
+FILE_EXTENSIONS = {'json': 'json', 'ndjson': 'ndjson', 'csv': 'csv', 'xlsx': 'csv'}
+
+# Excel evaluates cells starting with these characters as formulas
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _isoformat(value):
+    return value.isoformat() if value else ''
+
+
+def _user_rows():
+    from django.contrib.auth import get_user_model
+
+    users = get_user_model().objects.order_by('id')
+    for user in users.iterator(chunk_size=CHUNK_SIZE):
+        yield {
+            'id': user.id,
+            'first_name': user.first_name,
+            'last_name': user.last_name,
+            'phone': user.phone,
+            'email': user.email,
+            'user_type': user.user_type,
+            'is_active': user.is_active,
+            'is_verified': user.is_verified,
+            'created_at': _isoformat(user.created_at),
+        }
+
+
+def _doctor_rows():
+    from apps.doctors.models import Doctor
+
+    doctors = Doctor.objects.select_related('user', 'hospital').order_by('id')
+    for doctor in doctors.iterator(chunk_size=CHUNK_SIZE):
+        yield {
+            'id': doctor.id,
+            'name': doctor.full_name,
+            'phone': doctor.user.phone,
+            'email': doctor.user.email or '',
+            'specialty': doctor.get_specialty_display(),
+            'experience': doctor.experience,
+            'rating': doctor.rating,
+            'hospital': doctor.hospital.name if doctor.hospital else '',
+            'verification_status': doctor.verification_status,
+            'is_available': doctor.is_available,
+            'created_at': _isoformat(doctor.created_at),
+        }
+
+
+def _hospital_rows():
+    from apps.hospitals.models import Hospital
+
+    hospitals = (
+        Hospital.objects
+        .select_related('region', 'district')
+        .annotate(doctor_count=Count('doctors'))
+        .order_by('name', 'id')
+    )
+    for hospital in hospitals.iterator(chunk_size=CHUNK_SIZE):
+        yield {
+            'id': hospital.id,
+            'name': hospital.name,
+            'address': hospital.address,
+            'phone': hospital.phone,
+            'email': hospital.email or '',
+            'hospital_type': hospital.get_hospital_type_display(),
+            'region': hospital.region.name if hospital.region else '',
+            'district': hospital.district.name if hospital.district else '',
+            'doctor_count': hospital.doctor_count,
+            'is_active': hospital.is_active,
+            'created_at': _isoformat(hospital.created_at),
+        }
+
+
+def _transaction_rows():
+    from apps.billing.models import WalletTransaction
+
+    transactions = WalletTransaction.objects.select_related('wallet__user').order_by('created_at', 'id')
+    for transaction in transactions.iterator(chunk_size=CHUNK_SIZE):
+        user = transaction.wallet.user
+        yield {
+            'id': transaction.id,
+            'user_id': user.id,
+            'user_phone': user.phone,
+            'user_name': user.get_full_name(),
+            'transaction_type': transaction.transaction_type,
+            'amount': transaction.amount,
+            'balance_before': transaction.balance_before,
+            'balance_after': transaction.balance_after,
+            'status': transaction.status,
+            'description': transaction.description,
+            'created_at': _isoformat(transaction.created_at),
+        }
+
+
+def _charge_rows():
+    from apps.doctors.models import ChargeLog
+
+    charge_logs = ChargeLog.objects.select_related('doctor__user').order_by('created_at', 'id')
+    for charge_log in charge_logs.iterator(chunk_size=CHUNK_SIZE):
+        yield {
+            'id': charge_log.id,
+            'doctor_id': charge_log.doctor_id,
+            'doctor_name': charge_log.doctor.full_name,
+            'charge_type': charge_log.charge_type,
+            'charge_type_display': charge_log.get_charge_type_display(),
+            'amount': charge_log.amount,
+            'user_id': charge_log.user_id,
+            'ip_address': charge_log.ip_address or '',
+            'created_at': _isoformat(charge_log.created_at),
+        }
+
+
+EXPORTS = {
+    'users': _user_rows,
+    'doctors': _doctor_rows,
+    'hospitals': _hospital_rows,
+    'transactions': _transaction_rows,
+    'charges': _charge_rows,
+}
+
+
+class _Echo:
+    """File-like object for csv.writer: write() returns the line"""
+
+    def write(self, value):
+        return value
+
+
+def _csv_value(value, escape_formulas):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (Decimal, UUID)):
+        return str(value)
+    if escape_formulas and isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return f"'{value}"
+    return value
+
+
+def _stream_csv(rows, excel=False):
+    writer = csv.writer(_Echo(), lineterminator='\r\n' if excel else '\n')
+    header = None
+    if excel:
+        yield '\ufeff'
+    for row in rows:
+        if header is None:
+            header = list(row)
+            yield writer.writerow(header)
+        yield writer.writerow([_csv_value(row[name], excel) for name in header])
+
+
+def _stream_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def _stream_json(rows, data_type):
+    head = json.dumps({
+        'type': data_type,
+        'format': 'json',
+        'exported_at': timezone.now().isoformat(),
+    }, ensure_ascii=False)
+    yield head[:-1] + ', "data": ['
+
+    count = 0
+    for row in rows:
+        yield (', ' if count else '') + json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False)
+        count += 1
+    yield f'], "count": {count}}}'
+
+
+class ExportRenderer(JSONRenderer):
+    """
+    Lets DRF accept ?format=ndjson/csv/xlsx.
+
+    Exports are StreamingHttpResponse objects and skip rendering; only error
+    payloads reach this renderer and are written as JSON.
+    """
+    charset = 'utf-8'
+
+    @classmethod
+    def for_format(cls, format_type):
+        return type(f'{format_type.upper()}ExportRenderer', (cls,), {
+            'format': format_type,
+            'media_type': FORMATS[format_type].split(';')[0],
+        })
+
+
+EXPORT_RENDERERS = [JSONRenderer] + [
+    ExportRenderer.for_format(format_type) for format_type in FORMATS if format_type != 'json'
+]
+
+
+def stream_export(data_type, format_type='json'):
+    """
+    Build a streaming export response.
+
+    Args:
+        data_type: One of EXPORTS
+        format_type: One of FORMATS
+
+    Returns:
+        StreamingHttpResponse
+
+    Raises:
+        ValueError: Unknown data type or format
+    """
+    if data_type not in EXPORTS:
+        raise ValueError(f"Invalid data type: {data_type}")
+    if format_type not in FORMATS:
+        raise ValueError(f"Invalid format: {format_type}")
+
+    rows = EXPORTS[data_type]()
+    if format_type == 'json':
+        content = _stream_json(rows, data_type)
+    elif format_type == 'ndjson':
+        content = _stream_ndjson(rows)
+    else:
+        content = _stream_csv(rows, excel=format_type == 'xlsx')
+
+    response = StreamingHttpResponse(content, content_type=FORMATS[format_type])
+    if format_type != 'json':
+        filename = f"{data_type}_{timezone.localdate():%Y%m%d}.{FILE_EXTENSIONS[format_type]}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    # Do not let proxies buffer the whole export
+    response['X-Accel-Buffering'] = 'no'
+    return response
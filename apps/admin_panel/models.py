@@ -226,3 +226,31 @@ class UserComplaintFile(models.Model):
         verbose_name_plural = "User Complaint Files"
         db_table = "user_complaint_file"
         ordering = ["-uploaded_at"]
+
+
+# Dashboard snapshot invalidation (see apps/admin_panel/dashboard.py)
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+DASHBOARD_MODELS = ('users.User', 'hospitals.Hospital', 'doctors.Doctor', 'consultations.Consultation')
+
+# Counters/bookkeeping fields that no dashboard bucket depends on
+DASHBOARD_IGNORED_FIELDS = {
+    'last_login', 'last_login_ip', 'last_activity', 'profile_views', 'weekly_views',
+    'monthly_views', 'rating', 'total_reviews', 'total_consultations', 'successful_consultations',
+}
+
+
+def _mark_dashboard_stale(sender, **kwargs):
+    """Counted data changed - the cached dashboard snapshot is stale"""
+    update_fields = kwargs.get('update_fields')
+    if update_fields and set(update_fields) <= DASHBOARD_IGNORED_FIELDS:
+        return
+
+    from .dashboard import mark_dashboard_stale
+    transaction.on_commit(mark_dashboard_stale)
+
+
+for _model in DASHBOARD_MODELS:
+    post_save.connect(_mark_dashboard_stale, sender=_model, dispatch_uid=f'dashboard_save_{_model}')
+    post_delete.connect(_mark_dashboard_stale, sender=_model, dispatch_uid=f'dashboard_delete_{_model}')
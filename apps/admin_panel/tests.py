@@ -1,2 +1,270 @@
+import csv
+import io
+import json
+from datetime import date
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from apps.billing.models import UserWallet, WalletTransaction
+from apps.doctors.models import ChargeLog, ChargeLogDailyRollup, Doctor
+from apps.hospitals.models import Hospital
+
+User = get_user_model()
+
+
+def create_doctor(phone, balance, profile_views=0):
+    user = User.objects.create(phone=phone, first_name='Test', last_name='Doctor', user_type='doctor')
+    UserWallet.objects.filter(user=user).update(balance=balance)
+    return Doctor.objects.create(
+        user=user,
+        specialty='terapevt',
+        experience=5,
+        education='Tashkent Medical Academy',
+        workplace='City Hospital',
+        consultation_price=50000,
+        verification_status='approved',
+        profile_views=profile_views
+    )
+
+
+def add_rollup(doctor, charge_type, count, amount, day=None):
+    ChargeLogDailyRollup.objects.create(
+        doctor=doctor,
+        date=day or date.today(),
+        charge_type=charge_type,
+        count=count,
+        amount=amount
+    )
+
+
+class DoctorStatisticsListTestCase(TestCase):
+    url = '/admin-panel/doctors-statistics/'
+
+    def setUp(self):
+        admin = User.objects.create(phone='+998901000901', first_name='Admin', last_name='User', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+
+        self.first = create_doctor('+998901000911', Decimal('1000'), profile_views=5)
+        self.second = create_doctor('+998901000912', Decimal('3000'), profile_views=20)
+        self.third = create_doctor('+998901000913', Decimal('2000'), profile_views=10)
+
+        add_rollup(self.first, 'search', 10, Decimal('5000'))
+        add_rollup(self.first, 'view_card', 1, Decimal('1000'))
+        add_rollup(self.second, 'search', 2, Decimal('1000'))
+        add_rollup(self.second, 'search', 3, Decimal('1500'), day=date(2024, 1, 1))
+        add_rollup(self.third, 'view_phone', 4, Decimal('8000'))
+
+    def get_ids(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [row['doctor_id'] for row in response.data['doctors']]
+
+    def test_charge_totals(self):
+        response = self.client.get(self.url, {'sort_by': 'created_at'})
+        rows = {row['doctor_id']: row for row in response.data['doctors']}
+
+        first = rows[self.first.pk]
+        self.assertEqual(
+            (first['total_searches'], first['total_card_views'], first['total_phone_views']),
+            (10, 1, 0)
+        )
+        self.assertEqual(first['total_charges'], 11)
+        self.assertEqual(Decimal(first['total_charge_amount']), Decimal('6000'))
+        # Rollups of all days are summed
+        self.assertEqual(rows[self.second.pk]['total_searches'], 5)
+        self.assertEqual(Decimal(rows[self.second.pk]['wallet_balance']), Decimal('3000'))
+
+    def test_sort_by_charge_metrics(self):
+        self.assertEqual(
+            self.get_ids(sort_by='-total_charge_amount'),
+            [self.third.pk, self.first.pk, self.second.pk]
+        )
+        self.assertEqual(
+            self.get_ids(sort_by='total_searches'),
+            [self.third.pk, self.second.pk, self.first.pk]
+        )
+        self.assertEqual(
+            self.get_ids(sort_by='-wallet_balance'),
+            [self.second.pk, self.third.pk, self.first.pk]
+        )
+
+    def test_default_and_invalid_sort(self):
+        self.assertEqual(self.get_ids(), [self.second.pk, self.third.pk, self.first.pk])
+        self.assertEqual(
+            self.get_ids(sort_by='user__password'),
+            [self.first.pk, self.second.pk, self.third.pk]
+        )
+
+    def test_pagination(self):
+        response = self.client.get(self.url, {'sort_by': '-profile_views', 'page_size': 2, 'page': 2})
+
+        self.assertEqual([row['doctor_id'] for row in response.data['doctors']], [self.first.pk])
+        pagination = response.data['pagination']
+        self.assertEqual(
+            (pagination['current_page'], pagination['total_pages'], pagination['total_items']),
+            (2, 2, 3)
+        )
+        self.assertFalse(pagination['has_next'])
+        self.assertTrue(pagination['has_previous'])
+
+    def test_ties_keep_page_boundaries(self):
+        """Doctors with equal sort values are ordered by id, so pages do not overlap"""
+        Doctor.objects.update(profile_views=0)
+
+        pages = [self.get_ids(page_size=2, page=page) for page in (1, 2)]
+
+        self.assertEqual(pages, [[self.first.pk, self.second.pk], [self.third.pk]])
+
+    def test_query_count_independent_of_doctor_count(self):
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                self.get_ids(sort_by='-total_charges', page_size=2)
+            return len(queries)
+
+        before = count_queries()
+        for index in range(5):
+            doctor = create_doctor(f'+99890100092{index}', Decimal('500'))
+            add_rollup(doctor, 'search', index + 1, Decimal('500'))
+
+        self.assertEqual(count_queries(), before)
+
+
+class DoctorStatisticsDateRangeTestCase(TestCase):
+    def setUp(self):
+        admin = User.objects.create(phone='+998901000931', first_name='Admin', last_name='User', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+
+        self.doctor = create_doctor('+998901000932', Decimal('1000'))
+        add_rollup(self.doctor, 'search', 2, Decimal('1000'), day=date(2024, 2, 10))
+        add_rollup(self.doctor, 'search', 3, Decimal('1500'), day=date(2024, 3, 10))
+
+    def urls(self):
+        return [f'/admin-panel/doctors-statistics/{self.doctor.pk}/', '/admin-panel/doctors-statistics/summary/']
+
+    def test_date_range(self):
+        for url in self.urls():
+            response = self.client.get(url, {'date_from': '2024-03-01', 'date_to': '2024-03-31'})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data['total_searches'], 3)
+
+    def test_invalid_date(self):
+        """Impossible or malformed dates are rejected instead of failing with a server error"""
+        for url in self.urls():
+            for params in ({'date_from': '2024-02-30'}, {'date_to': '2024-13-01'}, {'date_from': 'yesterday'}):
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, (url, params))
+                self.assertIn('error', response.data)
+
+
+class ExportTestCase(TestCase):
+    url = '/admin-panel/export/'
+
+    def setUp(self):
+        self.admin = User.objects.create(phone='+998901000941', first_name='=SUM(A1)', last_name='Admin', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+        self.hospital = Hospital.objects.create(name='City Hospital', address='Tashkent', phone='+998712000000')
+        self.doctor = create_doctor('+998901000942', Decimal('1000'))
+        self.doctor.hospital = self.hospital
+        self.doctor.save()
+
+        wallet = UserWallet.objects.get(user=self.doctor.user)
+        WalletTransaction.objects.create(
+            wallet=wallet,
+            transaction_type='debit',
+            amount=Decimal('500'),
+            balance_before=Decimal('1000'),
+            balance_after=Decimal('500'),
+            description='Search charge'
+        )
+        ChargeLog.objects.create(doctor=self.doctor, charge_type='search', amount=Decimal('500'), ip_address='10.0.0.1')
+
+        self.expected_counts = {
+            'users': User.objects.count(),
+            'doctors': 1,
+            'hospitals': 1,
+            'transactions': 1,
+            'charges': 1,
+        }
+
+    def export(self, data_type, format_type):
+        response = self.client.get(self.url, {'type': data_type, 'format': format_type})
+        self.assertEqual(response.status_code, status.HTTP_200_OK, (data_type, format_type))
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode('utf-8')
+
+    def test_json(self):
+        for data_type, count in self.expected_counts.items():
+            response, content = self.export(data_type, 'json')
+            self.assertEqual(response['Content-Type'], 'application/json')
+
+            payload = json.loads(content)
+            self.assertEqual((payload['type'], payload['format']), (data_type, 'json'))
+            self.assertEqual(payload['count'], count)
+            self.assertEqual(len(payload['data']), count)
+
+        _, content = self.export('hospitals', 'json')
+        self.assertEqual(json.loads(content)['data'][0]['doctor_count'], 1)
+
+    def test_ndjson(self):
+        for data_type, count in self.expected_counts.items():
+            response, content = self.export(data_type, 'ndjson')
+            self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+            self.assertIn(f'filename="{data_type}_', response['Content-Disposition'])
+
+            rows = [json.loads(line) for line in content.splitlines()]
+            self.assertEqual(len(rows), count)
+
+        _, content = self.export('charges', 'ndjson')
+        row = json.loads(content)
+        self.assertEqual((row['doctor_id'], row['amount']), (self.doctor.pk, '500.00'))
+
+    def test_csv(self):
+        for data_type, count in self.expected_counts.items():
+            response, content = self.export(data_type, 'csv')
+            self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+            self.assertIn('.csv"', response['Content-Disposition'])
+
+            rows = list(csv.DictReader(io.StringIO(content)))
+            self.assertEqual(len(rows), count)
+
+        _, content = self.export('doctors', 'csv')
+        row = next(csv.DictReader(io.StringIO(content)))
+        self.assertEqual((row['hospital'], row['is_available']), ('City Hospital', 'true'))
+
+        # Plain CSV keeps values as they are
+        _, content = self.export('users', 'csv')
+        self.assertIn('=SUM(A1)', content)
+        self.assertNotIn("'=SUM(A1)", content)
+
+    def test_xlsx(self):
+        """Excel-friendly CSV: UTF-8 BOM, CRLF line endings, formula-like cells escaped"""
+        for data_type, count in self.expected_counts.items():
+            response, content = self.export(data_type, 'xlsx')
+            self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+            self.assertTrue(content.startswith('\ufeff'))
+            self.assertTrue(content.endswith('\r\n'))
+
+            rows = list(csv.DictReader(io.StringIO(content[1:], newline='')))
+            self.assertEqual(len(rows), count)
+
+        _, content = self.export('users', 'xlsx')
+        rows = {row['id']: row for row in csv.DictReader(io.StringIO(content[1:], newline=''))}
+        self.assertEqual(rows[str(self.admin.pk)]['first_name'], "'=SUM(A1)")
+
+    def test_invalid_type_or_format(self):
+        response = self.client.get(self.url, {'type': 'passwords'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # ?format is DRF's format suffix: formats without a renderer are rejected before the view
+        response = self.client.get(self.url, {'type': 'users', 'format': 'pdf'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -5,8 +5,9 @@ from django.db.models import Avg, Count, Q
 from django.http import JsonResponse
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from rest_framework import permissions, status, viewsets
-from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.decorators import action, api_view, permission_classes, renderer_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
@@ -15,9 +16,12 @@ from apps.billing.models import WalletTransaction
 from apps.consultations.models import Consultation
 from apps.doctors.models import ChargeLog, Doctor
 from apps.doctors.serializers import DoctorSerializer
+from apps.doctors.services.charge_rollup import charge_total_annotations, get_charge_totals
 from apps.hospitals.models import Districts, Hospital, Regions
 from apps.hospitals.serializers import HospitalSerializer
 
+from .dashboard import get_dashboard_snapshot
+from .exports import EXPORT_RENDERERS, EXPORTS, FORMATS, stream_export
 from .models import DoctorComplaint, DoctorComplaintFile
 from .serializers import (
     AdminDoctorComplaintSerializer,
@@ -25,7 +29,6 @@ from .serializers import (
     AdminHospitalAdminSerializer,
     AdminHospitalAdminUpdateSerializer,
     AdminHospitalSerializer,
-    AdminUserSerializer,
     ChargeLogSerializer,
     DoctorComplaintCreateSerializer,
     DoctorComplaintFileSerializer,
@@ -712,131 +715,47 @@ class AdminDashboardAPIView(APIView):
 
     @staticmethod
     def get(request):
-        """Get admin dashboard statistics"""
-
-        # User statistics
-        user_stats = {
-            'total_users': User.objects.count(),
-            'active_users': User.objects.filter(is_active=True).count(),
-            'patients': User.objects.filter(user_type='patient').count(),
-            'doctors': User.objects.filter(user_type='doctor').count(),
-            'approved_doctors': User.objects.filter(
-                user_type='doctor',
-                is_approved_by_admin=True
-            ).count(),
-            'pending_doctors': User.objects.filter(
-                user_type='doctor',
-                is_approved_by_admin=False,
-                is_active=True
-            ).count(),
-            'hospital_admins': User.objects.filter(user_type='hospital_admin').count(),
-        }
-
-        # Hospital statistics
-        hospital_stats = {
-            'total_hospitals': Hospital.objects.count(),
-            'active_hospitals': Hospital.objects.filter(is_active=True).count(),
-            'hospitals_with_doctors': Hospital.objects.annotate(
-                doctor_count=Count('doctors')
-            ).filter(doctor_count__gt=0).count(),
-        }
-
-        # Doctor statistics
-        doctor_stats = {
-            'total_doctors': Doctor.objects.count(),
-            'verified_doctors': Doctor.objects.filter(verification_status='approved').count(),
-            'pending_doctors': Doctor.objects.filter(verification_status='pending').count(),
-            'rejected_doctors': Doctor.objects.filter(verification_status='rejected').count(),
-            'available_doctors': Doctor.objects.filter(is_available=True).count(),
-        }
-
-        # Consultation statistics
-        consultation_stats = {
-            'total_consultations': Consultation.objects.count(),
-            'completed_consultations': Consultation.objects.filter(status='completed').count(),
-            'pending_consultations': Consultation.objects.filter(status='scheduled').count(),
-            'cancelled_consultations': Consultation.objects.filter(status='cancelled').count(),
-        }
+        """
+        Get admin dashboard statistics
 
-        # Recent activities
-        recent_users = User.objects.filter(is_active=True).order_by('-created_at')[:5]
-        pending_doctors = Doctor.objects.filter(
-            verification_status='pending'
-        ).order_by('-created_at')[:5]
+        Served from the cached dashboard snapshot; ``generated_at`` shows
+        when it was computed. ``?refresh=true`` rebuilds it immediately.
+        """
+        force_refresh = request.GET.get('refresh', '').lower() in ('1', 'true')
+        snapshot = get_dashboard_snapshot(force_refresh=force_refresh)
 
         return Response({
-            'user_stats': user_stats,
-            'hospital_stats': hospital_stats,
-            'doctor_stats': doctor_stats,
-            'consultation_stats': consultation_stats,
-            'recent_users': AdminUserSerializer(recent_users, many=True).data,
-            'pending_doctors': AdminDoctorSerializer(pending_doctors, many=True).data,
+            'user_stats': snapshot['user_stats'],
+            'hospital_stats': snapshot['hospital_stats'],
+            'doctor_stats': snapshot['doctor_stats'],
+            'consultation_stats': snapshot['consultation_stats'],
+            'recent_users': snapshot['recent_users'],
+            'pending_doctors': snapshot['pending_doctors'],
+            'generated_at': snapshot['generated_at'],
+            'is_stale': snapshot['stale'],
         })
 
 
 @api_view(['GET'])
 @permission_classes([IsAdminPermission])
+@renderer_classes(EXPORT_RENDERERS)
 def export_data(request):
-    """Export data in various formats"""
+    """
+    Export data as a streaming response
 
+    Query params:
+        type: users, doctors, hospitals, transactions or charges
+        format: json (default), ndjson, csv or xlsx (Excel-friendly CSV)
+    """
     data_type = request.GET.get('type', 'users')
     format_type = request.GET.get('format', 'json')
 
-    if data_type == 'users':
-        users = User.objects.all().values(
-            'id', 'first_name', 'last_name', 'phone', 'email',
-            'user_type', 'is_active', 'is_verified', 'created_at'
-        )
-        data = list(users)
-
-    elif data_type == 'doctors':
-        doctors = Doctor.objects.select_related('user', 'hospital').all()
-        data = []
-        for doctor in doctors:
-            data.append({
-                'id': doctor.id,
-                'name': doctor.full_name(),
-                'phone': doctor.user.phone,
-                'email': doctor.user.email or '',
-                'specialty': doctor.get_specialty_display(),
-                'experience': doctor.experience,
-                'rating': doctor.rating,
-                'hospital': doctor.hospital.name if doctor.hospital else '',
-                'verification_status': doctor.verification_status,
-                'is_available': doctor.is_available,
-                'created_at': doctor.created_at.isoformat(),
-            })
-
-    elif data_type == 'hospitals':
-        hospitals = Hospital.objects.all()
-        data = []
-        for hospital in hospitals:
-            data.append({
-                'id': hospital.id,
-                'name': hospital.name,
-                'address': hospital.address,
-                'phone': hospital.phone,
-                'email': hospital.email or '',
-                'hospital_type': hospital.get_hospital_type_display() if hasattr(hospital,
-                                                                                 'get_hospital_type_display') else '',
-                'region': getattr(hospital, 'region', ''),
-                'district': getattr(hospital, 'district', ''),
-                'doctor_count': hospital.doctors.count(),
-                'is_active': getattr(hospital, 'is_active', True),
-                'created_at': getattr(hospital, 'created_at', '').isoformat() if hasattr(hospital,
-                                                                                         'created_at') else '',
-            })
-
-    else:
+    if data_type not in EXPORTS:
         return Response({'error': 'Invalid data type'}, status=400)
+    if format_type not in FORMATS:
+        return Response({'error': 'Invalid format'}, status=400)
 
-    return Response({
-        'data': data,
-        'count': len(data),
-        'type': data_type,
-        'format': format_type,
-        'exported_at': timezone.now().isoformat()
-    })
+    return stream_export(data_type, format_type)
 
 
 # Additional utility views
@@ -2021,11 +1940,12 @@ def transaction_statistics(request):
         transactions_this_month=Count('id', filter=Q(created_at__gte=this_month_start))
     )
 
-    # Doctor charge statistics
-    charge_stats = ChargeLog.objects.aggregate(
-        total_doctor_charges=Count('id'),
-        total_charge_amount=Sum('amount')
-    )
+    # Doctor charge statistics (daily rollup)
+    charge_totals = get_charge_totals()
+    charge_stats = {
+        'total_doctor_charges': charge_totals['total_charges'],
+        'total_charge_amount': charge_totals['total_charge_amount']
+    }
 
     # Combine statistics
     stats = {
@@ -2048,28 +1968,41 @@ def transaction_statistics(request):
 
 # ==================== Doctor Statistics APIs ====================
 
+def _get_date_range(request):
+    """
+    Parse the optional date_from/date_to query parameters.
+
+    Raises:
+        ValueError: A parameter is not a valid YYYY-MM-DD date (e.g. 2024-02-30)
+    """
+    dates = []
+    for param in ('date_from', 'date_to'):
+        value = request.GET.get(param) or ''
+        parsed = parse_date(value) if value else None
+        if value and parsed is None:
+            raise ValueError(f"Invalid {param}: {value}")
+        dates.append(parsed)
+    return tuple(dates)
+
+
 @api_view(['GET'])
 @permission_classes([IsAdminPermission])
 def doctor_statistics_detail(request, doctor_id):
     """
     Get comprehensive statistics for a specific doctor
     """
-    from django.db.models import Count, Sum
-
     # Get doctor
     doctor = get_object_or_404(
         Doctor.objects.select_related('user', 'hospital'),
         id=doctor_id
     )
 
-    # Get charge statistics
-    charge_stats = ChargeLog.objects.filter(doctor=doctor).aggregate(
-        total_searches=Count('id', filter=Q(charge_type='search')),
-        total_card_views=Count('id', filter=Q(charge_type='view_card')),
-        total_phone_views=Count('id', filter=Q(charge_type='view_phone')),
-        total_charges=Count('id'),
-        total_charge_amount=Sum('amount')
-    )
+    # Get charge statistics (daily rollup, optionally limited to date_from/date_to)
+    try:
+        start_date, end_date = _get_date_range(request)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    charge_stats = get_charge_totals(doctor=doctor, start_date=start_date, end_date=end_date)
 
     # Calculate success rate
     success_rate = 0
@@ -2135,8 +2068,11 @@ def doctor_statistics_detail(request, doctor_id):
 def doctors_statistics_list(request):
     """
     Get statistics for all doctors with filtering and sorting
+
+    Charge counters and the wallet balance come from one grouped query;
+    sorting and pagination happen in SQL.
     """
-    from django.db.models import Count, Sum
+    from django.db.models import F
 
     # Base queryset
     doctors = Doctor.objects.select_related('user', 'hospital').all()
@@ -2171,39 +2107,46 @@ def doctors_statistics_list(request):
             Q(user__phone__icontains=search)
         )
 
+    # Charge statistics (daily rollup) and wallet balance in one grouped query
+    doctors = doctors.annotate(
+        **charge_total_annotations(),
+        wallet_balance=F('user__wallet__balance')
+    )
+
     # Sorting
     sort_by = request.GET.get('sort_by', '-profile_views')
     valid_sorts = [
         'profile_views', '-profile_views',
         'total_consultations', '-total_consultations',
         'rating', '-rating',
-        'created_at', '-created_at'
+        'created_at', '-created_at',
+        'total_searches', '-total_searches',
+        'total_card_views', '-total_card_views',
+        'total_phone_views', '-total_phone_views',
+        'total_charges', '-total_charges',
+        'total_charge_amount', '-total_charge_amount',
+        'wallet_balance', '-wallet_balance'
     ]
     if sort_by in valid_sorts:
-        doctors = doctors.order_by(sort_by)
+        # id keeps page boundaries stable between requests
+        doctors = doctors.order_by(sort_by, 'id')
+    else:
+        doctors = doctors.order_by('id')
 
-    # Prepare statistics for each doctor
-    doctors_stats = []
-    for doctor in doctors:
-        # Get charge statistics for this doctor
-        charge_stats = ChargeLog.objects.filter(doctor=doctor).aggregate(
-            total_searches=Count('id', filter=Q(charge_type='search')),
-            total_card_views=Count('id', filter=Q(charge_type='view_card')),
-            total_phone_views=Count('id', filter=Q(charge_type='view_phone')),
-            total_charges=Count('id'),
-            total_charge_amount=Sum('amount')
-        )
+    # Pagination
+    page_size = int(request.GET.get('page_size', 20))
+    paginator = Paginator(doctors, page_size)
+    page_number = request.GET.get('page', 1)
+    page_obj = paginator.get_page(page_number)
 
+    # Prepare statistics for the doctors on this page only
+    doctors_stats = []
+    for doctor in page_obj:
         # Calculate success rate
         success_rate = 0
         if doctor.total_consultations > 0:
             success_rate = round((doctor.successful_consultations / doctor.total_consultations) * 100, 2)
 
-        # Get wallet info
-        wallet_balance = None
-        if hasattr(doctor.user, 'wallet'):
-            wallet_balance = float(doctor.user.wallet.balance)
-
         doctors_stats.append({
             'doctor_id': doctor.id,
             'doctor_name': doctor.user.get_full_name(),
@@ -2216,9 +2159,9 @@ def doctors_statistics_list(request):
             'weekly_views': doctor.weekly_views,
             'monthly_views': doctor.monthly_views,
 
-            'total_searches': charge_stats['total_searches'] or 0,
-            'total_card_views': charge_stats['total_card_views'] or 0,
-            'total_phone_views': charge_stats['total_phone_views'] or 0,
+            'total_searches': doctor.total_searches,
+            'total_card_views': doctor.total_card_views,
+            'total_phone_views': doctor.total_phone_views,
 
             'total_consultations': doctor.total_consultations,
             'successful_consultations': doctor.successful_consultations,
@@ -2227,10 +2170,10 @@ def doctors_statistics_list(request):
             'rating': doctor.rating,
             'total_reviews': doctor.total_reviews,
 
-            'total_charges': charge_stats['total_charges'] or 0,
-            'total_charge_amount': charge_stats['total_charge_amount'] or 0,
+            'total_charges': doctor.total_charges,
+            'total_charge_amount': doctor.total_charge_amount,
 
-            'wallet_balance': wallet_balance,
+            'wallet_balance': float(doctor.wallet_balance) if doctor.wallet_balance is not None else None,
             'is_blocked': doctor.is_blocked,
 
             'is_available': doctor.is_available,
@@ -2240,13 +2183,8 @@ def doctors_statistics_list(request):
             'last_activity': doctor.last_activity
         })
 
-    # Pagination
-    paginator = Paginator(doctors_stats, int(request.GET.get('page_size', 20)))
-    page_number = request.GET.get('page', 1)
-    page_obj = paginator.get_page(page_number)
-
     # Serialize
-    serializer = DoctorStatisticsSerializer(page_obj, many=True)
+    serializer = DoctorStatisticsSerializer(doctors_stats, many=True)
 
     return Response({
         'doctors': serializer.data,
@@ -2256,7 +2194,7 @@ def doctors_statistics_list(request):
             'total_items': paginator.count,
             'has_next': page_obj.has_next(),
             'has_previous': page_obj.has_previous(),
-            'page_size': int(request.GET.get('page_size', 20))
+            'page_size': page_size
         },
         'filters': {
             'specialties': dict(Doctor.SPECIALTIES),
@@ -2282,6 +2220,11 @@ def doctors_statistics_summary(request):
     """
     from django.db.models import Avg, Count, Sum
 
+    try:
+        start_date, end_date = _get_date_range(request)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
     # Overall doctor statistics
     doctor_stats = Doctor.objects.aggregate(
         total_doctors=Count('id'),
@@ -2294,14 +2237,8 @@ def doctors_statistics_summary(request):
         total_reviews=Sum('total_reviews')
     )
 
-    # Charge statistics
-    charge_stats = ChargeLog.objects.aggregate(
-        total_searches=Count('id', filter=Q(charge_type='search')),
-        total_card_views=Count('id', filter=Q(charge_type='view_card')),
-        total_phone_views=Count('id', filter=Q(charge_type='view_phone')),
-        total_charges=Count('id'),
-        total_charge_amount=Sum('amount')
-    )
+    # Charge statistics (daily rollup, optionally limited to date_from/date_to)
+    charge_stats = get_charge_totals(start_date=start_date, end_date=end_date)
 
     # Combine statistics
     summary = {
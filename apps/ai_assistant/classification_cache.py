@@ -0,0 +1,275 @@
+"""
+Tibbiy tasniflash natijalari uchun cache
+
+Kalit: (normallashtirilgan matn, til, prompt versiyasi). Normallashtirish
+(apps/core/text.py):
+    - NFKC va kichik harflar;
+    - apostrof variantlari (' ` ʻ ʼ ‘ ’) olib tashlanadi: "og'riq" == "ogriq";
+    - tinish belgilari va ortiqcha bo'shliqlar olib tashlanadi;
+    - kirill harflari lotinga o'giriladi: "бошим оғрияпти" == "boshim ogriyapti".
+
+Ikki daraja:
+    - L1: jarayon ichidagi LRU (MAX_ENTRIES, TTL);
+    - L2: Django cache (TTL) - barcha worker'lar uchun umumiy.
+
+Ixtiyoriy near-duplicate daraja (NEAR_DUPLICATE=True) L1 yozuvlari bo'yicha
+MinHash + LSH bilan o'xshash shikoyatlarni qidiradi va o'xshashlik
+NEAR_DUPLICATE_THRESHOLD dan yuqori bo'lsa, tayyor tasnifni qaytaradi.
+
+Sozlamalar (settings.AI_CLASSIFICATION_CACHE, barcha kalitlar ixtiyoriy):
+    {
+        'TTL': 3600,
+        'MAX_ENTRIES': 1000,
+        'NEAR_DUPLICATE': False,
+        'NEAR_DUPLICATE_THRESHOLD': 0.8,
+        'PROMPT_VERSION': None,   # None - prompt matnidan hisoblanadi
+    }
+"""
+import hashlib
+import random
+import threading
+import time
+import zlib
+from collections import OrderedDict, defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+
+from apps.core.text import normalize_text
+
+DEFAULTS = {
+    'TTL': 3600,
+    'MAX_ENTRIES': 1000,
+    'NEAR_DUPLICATE': False,
+    'NEAR_DUPLICATE_THRESHOLD': 0.8,
+    'PROMPT_VERSION': None,
+}
+
+KEY_PREFIX = 'medical_classification'
+
+# MinHash parametrlari: 16 band x 4 qator
+NUM_PERMUTATIONS = 64
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERMUTATIONS // LSH_BANDS
+SHINGLE_SIZE = 3
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(20240611)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_PERMUTATIONS)
+]
+
+
+def get_cache_settings():
+    """AI_CLASSIFICATION_CACHE sozlamalari (default'lar bilan)"""
+    return {**DEFAULTS, **getattr(settings, 'AI_CLASSIFICATION_CACHE', {})}
+
+
+def get_prompt_version(language):
+    """Tasniflash prompt'i versiyasi - prompt o'zgarsa, eski natijalar ishlatilmaydi"""
+    version = get_cache_settings()['PROMPT_VERSION']
+    if version:
+        return str(version)
+    return _get_prompt_digest(language)
+
+
+@lru_cache(maxsize=None)
+def _get_prompt_digest(language):
+    from .prompts import get_prompt
+
+    return hashlib.md5(get_prompt('classification', language).encode()).hexdigest()[:8]
+
+
+def get_shingles(normalized_text):
+    """Belgilar bo'yicha shingle'lar (3-gram)"""
+    if len(normalized_text) <= SHINGLE_SIZE:
+        return {normalized_text}
+    return {
+        normalized_text[i:i + SHINGLE_SIZE]
+        for i in range(len(normalized_text) - SHINGLE_SIZE + 1)
+    }
+
+
+def minhash_signature(shingles):
+    """MinHash imzosi"""
+    hashes = [zlib.crc32(shingle.encode()) for shingle in shingles]
+    return tuple(
+        min((a * value + b) % _MERSENNE_PRIME for value in hashes)
+        for a, b in _PERMUTATIONS
+    )
+
+
+def estimate_similarity(signature, other):
+    """Ikki imzo bo'yicha Jaccard o'xshashligini baholash"""
+    return sum(1 for x, y in zip(signature, other) if x == y) / NUM_PERMUTATIONS
+
+
+class ClassificationCache:
+    """Tasniflash natijalari uchun ikki darajali cache"""
+
+    def __init__(self, ttl=3600, max_entries=1000, near_duplicate=False, near_threshold=0.8):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.near_duplicate = near_duplicate
+        self.near_threshold = near_threshold
+        self._entries = OrderedDict()  # key -> (expires_at, result, signature, scope)
+        self._buckets = defaultdict(set)  # (scope, band, band_hash) -> keys
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(['local_hits', 'shared_hits', 'near_hits', 'misses', 'sets'], 0)
+
+    def get(self, user_message, language='uz'):
+        """
+        Tasnif natijasini qidirish
+
+        Returns:
+            tuple: (natija yoki None, tier) - tier: 'local', 'shared', 'near' yoki None
+        """
+        normalized = normalize_text(user_message)
+        scope = (language, get_prompt_version(language))
+        key = self._make_key(normalized, scope)
+
+        with self._lock:
+            result = self._get_local(key)
+        if result is not None:
+            self._record('local_hits')
+            return result, 'local'
+
+        result = cache.get(key)
+        if result is not None:
+            self._remember(key, normalized, scope, result)
+            self._record('shared_hits')
+            return result, 'shared'
+
+        if self.near_duplicate and normalized:
+            signature = minhash_signature(get_shingles(normalized))
+            with self._lock:
+                result = self._get_near(signature, scope)
+            if result is not None:
+                self._record('near_hits')
+                return result, 'near'
+
+        self._record('misses')
+        return None, None
+
+    def set(self, user_message, result, language='uz'):
+        """Tasnif natijasini saqlash"""
+        normalized = normalize_text(user_message)
+        scope = (language, get_prompt_version(language))
+        key = self._make_key(normalized, scope)
+
+        cache.set(key, result, self.ttl)
+        self._remember(key, normalized, scope, result)
+        self._record('sets')
+
+    def get_stats(self):
+        """Hit/miss statistikasi (joriy jarayon bo'yicha)"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+
+        hits = stats['local_hits'] + stats['shared_hits'] + stats['near_hits']
+        lookups = hits + stats['misses']
+        stats['hits'] = hits
+        stats['hit_rate'] = round(hits / lookups, 4) if lookups else 0.0
+        return stats
+
+    def clear(self):
+        """L1 va statistikani tozalash (L2 TTL bo'yicha eskiradi)"""
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+            for name in self._stats:
+                self._stats[name] = 0
+
+    @staticmethod
+    def _make_key(normalized, scope):
+        language, prompt_version = scope
+        digest = hashlib.md5(normalized.encode()).hexdigest()
+        return f"{KEY_PREFIX}:{prompt_version}:{language}:{digest}"
+
+    def _record(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _get_local(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            self._evict(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def _get_near(self, signature, scope):
+        candidates = set()
+        for band, band_hash in self._iter_bands(signature):
+            candidates |= self._buckets.get((scope, band, band_hash), set())
+
+        best_key, best_similarity = None, self.near_threshold
+        now = time.monotonic()
+        for key in candidates:
+            expires_at, _, other, _ = self._entries[key]
+            if expires_at < now:
+                continue
+            similarity = estimate_similarity(signature, other)
+            if similarity >= best_similarity:
+                best_key, best_similarity = key, similarity
+
+        if best_key is None:
+            return None
+        self._entries.move_to_end(best_key)
+        return self._entries[best_key][1]
+
+    def _remember(self, key, normalized, scope, result):
+        signature = None
+        if self.near_duplicate and normalized:
+            signature = minhash_signature(get_shingles(normalized))
+
+        with self._lock:
+            if key in self._entries:
+                self._evict(key)
+            self._entries[key] = (time.monotonic() + self.ttl, result, signature, scope)
+            if signature is not None:
+                for band, band_hash in self._iter_bands(signature):
+                    self._buckets[(scope, band, band_hash)].add(key)
+
+            while len(self._entries) > self.max_entries:
+                self._evict(next(iter(self._entries)))
+
+    def _evict(self, key):
+        _, _, signature, scope = self._entries.pop(key)
+        if signature is None:
+            return
+        for band, band_hash in self._iter_bands(signature):
+            bucket = self._buckets.get((scope, band, band_hash))
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[(scope, band, band_hash)]
+
+    @staticmethod
+    def _iter_bands(signature):
+        for band in range(LSH_BANDS):
+            yield band, hash(signature[band * LSH_ROWS:(band + 1) * LSH_ROWS])
+
+
+_classification_cache = None
+_classification_cache_lock = threading.Lock()
+
+
+def get_classification_cache():
+    """Jarayon bo'yicha yagona ClassificationCache"""
+    global _classification_cache
+    if _classification_cache is None:
+        with _classification_cache_lock:
+            if _classification_cache is None:
+                config = get_cache_settings()
+                _classification_cache = ClassificationCache(
+                    ttl=config['TTL'],
+                    max_entries=config['MAX_ENTRIES'],
+                    near_duplicate=config['NEAR_DUPLICATE'],
+                    near_threshold=config['NEAR_DUPLICATE_THRESHOLD']
+                )
+    return _classification_cache
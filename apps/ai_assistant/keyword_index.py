@@ -0,0 +1,169 @@
+"""
+Kalit so'zlar indeksi (Aho-Corasick)
+
+SYMPTOM_KEYWORDS, EMERGENCY_KEYWORDS, HIGH_PRIORITY_KEYWORDS va
+URGENCY_KEYWORDS import paytida bitta Aho-Corasick avtomatiga kompilyatsiya
+qilinadi. Xabar bir marta o'qiladi va barcha mosliklar (bir-birini qoplaydigan
+mosliklar ham, masalan "tish" va "tish og'rig'i") guruh, kategoriya, til va
+joylashuvi bilan qaytariladi. Xabarni qayta ishlash vaqti kalit so'zlar soniga
+bog'liq emas.
+
+Moslik eski ``keyword in text.lower()`` bilan bir xil: registrga bog'liq emas,
+so'z ichida ham topiladi ("tishim" -> "tish"). Apostrof variantlari
+(ʻ ʼ ‘ ’ `) oddiy ' ga keltiriladi.
+
+Micro-benchmark: python manage.py benchmark_keyword_index
+"""
+from collections import deque
+from typing import NamedTuple
+
+from .prompts import EMERGENCY_KEYWORDS, HIGH_PRIORITY_KEYWORDS, SYMPTOM_KEYWORDS
+
+# Shoshilinchlik darajasi kalit so'zlari (assess_urgency)
+URGENCY_KEYWORDS = {
+    'urgent': ['tez', 'shoshilinch', 'og\'riq', 'qon', 'yurak', 'nafas'],
+    'high': ['kuchli', 'zo\'r', 'og\'ir', 'isitma'],
+    'medium': ['sekin', 'bosim', 'stress'],
+    'low': ['oddiy', 'kichik', 'yengil']
+}
+
+# Guruhlar
+SYMPTOM = 'symptom'
+EMERGENCY = 'emergency'
+HIGH_PRIORITY = 'high_priority'
+URGENCY = 'urgency'
+
+_APOSTROPHES = str.maketrans({char: "'" for char in "`ʻʼ‘’ʹ′"})
+
+
+class KeywordMatch(NamedTuple):
+    keyword: str
+    group: str
+    category: str
+    language: str
+    start: int
+    end: int
+
+
+def normalize(text):
+    """Matnni moslik uchun tayyorlash (kichik harf, apostroflar)"""
+    return text.lower().translate(_APOSTROPHES)
+
+
+class AhoCorasick:
+    """Ko'p naqshli qidiruv avtomati"""
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]  # tugun -> [(uzunlik, payload), ...]
+        self._built = False
+
+    def add(self, pattern, payload):
+        if self._built:
+            raise RuntimeError("Avtomat allaqachon kompilyatsiya qilingan")
+
+        node = 0
+        for char in pattern:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            node = next_node
+        self._output[node].append((len(pattern), payload))
+
+    def build(self):
+        """Failure havolalarini hisoblash (BFS)"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                # Suffiks naqshlarining chiqishlarini meros qilib olish
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+        self._built = True
+        return self
+
+    def iter(self, text):
+        """(start, end, payload) - matndagi barcha mosliklar"""
+        goto, fail, output = self._goto, self._fail, self._output
+        node = 0
+        for index, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for length, payload in output[node]:
+                yield index + 1 - length, index + 1, payload
+
+
+class KeywordIndex:
+    """Barcha kalit so'z lug'atlari uchun umumiy indeks"""
+
+    def __init__(self):
+        self._automaton = AhoCorasick()
+        self.size = 0
+
+    def add_keywords(self, keywords, group, category, language):
+        for keyword in keywords:
+            keyword = normalize(keyword)
+            if keyword:
+                self._automaton.add(keyword, (keyword, group, category, language))
+                self.size += 1
+
+    def build(self):
+        self._automaton.build()
+        return self
+
+    def find_all(self, text, groups=None, languages=None):
+        """
+        Matndagi barcha kalit so'zlarni bir o'tishda topish
+
+        Args:
+            text (str): Xabar matni
+            groups (set): Faqat shu guruhlar (None - barchasi)
+            languages (set): Faqat shu tillar (None - barchasi)
+
+        Returns:
+            list[KeywordMatch]: Mosliklar (start bo'yicha tartiblangan)
+        """
+        matches = [
+            KeywordMatch(*payload, start, end)
+            for start, end, payload in self._automaton.iter(normalize(text))
+            if (groups is None or payload[1] in groups)
+            and (languages is None or payload[3] in languages)
+        ]
+        matches.sort(key=lambda match: (match.start, -match.end))
+        return matches
+
+    def contains(self, text, group, languages=None):
+        """Kamida bitta moslik bormi"""
+        for _, _, payload in self._automaton.iter(normalize(text)):
+            if payload[1] == group and (languages is None or payload[3] in languages):
+                return True
+        return False
+
+
+def build_keyword_index():
+    """prompts.py lug'atlaridan indeks yaratish"""
+    index = KeywordIndex()
+    for language, specialties in SYMPTOM_KEYWORDS.items():
+        for specialty, keywords in specialties.items():
+            index.add_keywords(keywords, SYMPTOM, specialty, language)
+    for language, keywords in EMERGENCY_KEYWORDS.items():
+        index.add_keywords(keywords, EMERGENCY, EMERGENCY, language)
+    for language, keywords in HIGH_PRIORITY_KEYWORDS.items():
+        index.add_keywords(keywords, HIGH_PRIORITY, HIGH_PRIORITY, language)
+    for level, keywords in URGENCY_KEYWORDS.items():
+        index.add_keywords(keywords, URGENCY, level, 'uz')
+    return index.build()
+
+
+keyword_index = build_keyword_index()
+
@@ -0,0 +1,135 @@
+"""
+Tibbiy shikoyatni qayta ishlash pipeline'i
+
+Bosqichlar kichik bog'liqlik grafi sifatida bajariladi:
+
+    classification ──┐
+                     ├──> advice (taxminiy mutaxassislik to'g'ri bo'lsa)
+    speculative_advice ┘
+
+Tasniflash va maslahat ikkalasi ham alohida Gemini so'rovi. Maslahat
+kalit so'zlar bo'yicha taxmin qilingan mutaxassislik bilan tasniflash bilan
+parallel boshlanadi. Ikkala maslahat so'rovi bir xil ma'lumotlarni oladi:
+simptomlar tasnifdagi kabi xabarning kalit so'z tahlilidan olinadi, shuning
+uchun taxminiy maslahat oddiy maslahatdan farq qilmaydi.
+
+Tasniflash boshqa mutaxassislikni qaytarsa, taxminiy maslahat tashlab
+yuboriladi ('discarded') va maslahat to'g'ri mutaxassislik bilan qayta
+olinadi. Navbatda turgan so'rov bekor qilinadi, lekin boshlangan Gemini
+so'rovini to'xtatib bo'lmaydi - u oxirigacha bajariladi va natijasi
+ishlatilmaydi. Keraksiz bosqichlar umuman ishga tushirilmaydi:
+    - tasniflash cache'da bo'lsa, taxminiy maslahat kerak emas;
+    - AI mavjud bo'lmasa, barcha bosqichlar fallback va thread'siz bajariladi.
+
+Har bir bosqich vaqti natijadagi ``stage_timings`` ga yoziladi.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Taxminiy bosqichlar uchun jarayon bo'yicha yagona thread pool"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'GEMINI_MAX_CONCURRENCY', 8),
+                    thread_name_prefix='medical-pipeline'
+                )
+    return _executor
+
+
+def _timed(func, *args, **kwargs):
+    """Funksiyani bajarish va (natija, sekundlar) qaytarish"""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def run_medical_pipeline(service, user_message, user_context=None, language='uz'):
+    """
+    Tasniflash va maslahatni iloji boricha parallel bajarish
+
+    Args:
+        service (GeminiService): Gemini servisi
+        user_message (str): Foydalanuvchi xabari
+        user_context (dict): Qo'shimcha kontekst ma'lumotlari
+        language (str): Til kodi
+
+    Returns:
+        dict: classification, advice, stage_timings va speculation ma'lumotlari.
+            speculation['status']: 'hit', 'discarded', 'failed' yoki 'skipped'
+    """
+    pipeline_start = time.perf_counter()
+    timings = {}
+    guessed_specialty = None
+    speculation = 'skipped'
+
+    # Cache'dagi tasnif bo'lsa, taxminiy maslahat keraksiz
+    classification, timings['classification'] = _timed(
+        service.get_cached_classification, user_message, language
+    )
+    speculative = None
+
+    if classification is None:
+        if service.model:
+            guessed_specialty = service.guess_specialty(user_message)
+            # Tasnifdagi symptoms_analysis ham xuddi shu tahlil natijasi
+            symptoms = service.analyze_symptoms(user_message)['detected_symptoms']
+            speculative = get_executor().submit(
+                _timed, service.get_medical_advice,
+                user_message, guessed_specialty, symptoms, language
+            )
+
+        classification, timings['classification'] = _timed(
+            service.classify_medical_issue, user_message, user_context, language,
+            cache_lookup=False
+        )
+
+    specialty = classification.get('specialty')
+    advice = None
+
+    if speculative is not None:
+        if specialty == guessed_specialty:
+            try:
+                advice, timings['speculative_advice'] = speculative.result()
+                speculation = 'hit'
+            except Exception as e:
+                logger.error(f"Speculative advice xatolik: {e}")
+                speculation = 'failed'
+        else:
+            # Mutaxassislik o'zgardi - taxminiy natija kerak emas. cancel()
+            # faqat hali boshlanmagan so'rovni to'xtatadi
+            speculative.cancel()
+            speculation = 'discarded'
+
+    if advice is None:
+        advice, timings['advice'] = _timed(
+            service.get_medical_advice,
+            user_message,
+            specialty,
+            classification.get('symptoms_analysis', {}).get('detected_symptoms', []),
+            language
+        )
+
+    timings['total'] = time.perf_counter() - pipeline_start
+
+    return {
+        'classification': classification,
+        'advice': advice,
+        'stage_timings': {stage: round(seconds, 4) for stage, seconds in timings.items()},
+        'speculation': {
+            'guessed_specialty': guessed_specialty,
+            'status': speculation,
+        }
+    }
@@ -2,12 +2,14 @@
 AI Assistant Services - Gemini AI Integration
 """
 
+import asyncio
 import json
 import time
 import logging
-import hashlib
+import threading
+import weakref
 
-from django.core.cache import cache
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.utils.translation import gettext as _
 
@@ -20,43 +22,129 @@ except ImportError:
     AI_AVAILABLE = False
     genai = None
 
+from .classification_cache import get_classification_cache
+from .keyword_index import EMERGENCY, HIGH_PRIORITY, SYMPTOM, URGENCY, keyword_index
+
 logger = logging.getLogger(__name__)
 
+GEMINI_MODEL_NAME = 'gemini-2.5-flash'
 
-class GeminiService:
+
+class GeminiClientPool:
     """
-    Google Gemini AI bilan ishlash uchun servis
+    Jarayon (process) bo'yicha yagona Gemini klienti
+
+    genai.configure va GenerativeModel bir marta sozlanadi va barcha
+    GeminiService nusxalari tomonidan ulashiladi. Bir vaqtdagi so'rovlar
+    soni semafor bilan cheklanadi: sync chaqiruvlar uchun threading semafori,
+    async chaqiruvlar uchun har bir event loop uchun alohida asyncio semafori.
     """
 
-    def __init__(self):
-        """Servisni ishga tushirish"""
+    def __init__(self, max_concurrency=8):
         self.model = None
         self.generation_config = None
+        self.max_concurrency = max_concurrency
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._async_semaphores = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._configure()
+
+    def _configure(self):
+        """Gemini sozlash (bir marta)"""
+        if not (AI_AVAILABLE and getattr(settings, 'GOOGLE_API_KEY', None)):
+            logger.warning("Gemini API key topilmadi yoki kutubxona mavjud emas")
+            return
+
+        try:
+            genai.configure(api_key=settings.GOOGLE_API_KEY)
+            self.model = genai.GenerativeModel(GEMINI_MODEL_NAME)
+
+            # Generation config
+            self.generation_config = genai.GenerationConfig(
+                temperature=0.3,
+                top_p=0.8,
+                top_k=40,
+                max_output_tokens=8192,
+                response_mime_type="text/plain"
+            )
+
+            logger.info("Gemini AI muvaffaqiyatli ulandi")
+
+        except Exception as e:
+            logger.error(f"Gemini AI ulanish xatoligi: {e}")
+            self.model = None
 
-        if AI_AVAILABLE and hasattr(settings, 'GOOGLE_API_KEY'):
-            try:
-                # Gemini sozlash
-                genai.configure(api_key=settings.GOOGLE_API_KEY)
-                self.model = genai.GenerativeModel('gemini-2.5-flash')
-
-                # Generation config
-                self.generation_config = genai.GenerationConfig(
-                    temperature=0.3,
-                    top_p=0.8,
-                    top_k=40,
-                    max_output_tokens=8192,
-                    response_mime_type="text/plain"
+    @property
+    def available(self):
+        return self.model is not None
+
+    def generate(self, prompt):
+        """Sync generatsiya (worker thread'lar uchun)"""
+        with self._semaphore:
+            return self.model.generate_content(
+                prompt,
+                generation_config=self.generation_config
+            )
+
+    async def agenerate(self, prompt):
+        """Async generatsiya (ASGI / Channels uchun)"""
+        async with self._get_async_semaphore():
+            return await self.model.generate_content_async(
+                prompt,
+                generation_config=self.generation_config
+            )
+
+    async def astream(self, prompt):
+        """Async streaming generatsiya - matn bo'laklarini kelishi bilan qaytaradi"""
+        async with self._get_async_semaphore():
+            response = await self.model.generate_content_async(
+                prompt,
+                generation_config=self.generation_config,
+                stream=True
+            )
+            async for chunk in response:
+                if chunk.text:
+                    yield chunk.text
+
+    def _get_async_semaphore(self):
+        """Joriy event loop uchun semaforni olish"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            semaphore = self._async_semaphores.get(loop)
+            if semaphore is None:
+                semaphore = asyncio.Semaphore(self.max_concurrency)
+                self._async_semaphores[loop] = semaphore
+        return semaphore
+
+
+_client_pool = None
+_client_pool_lock = threading.Lock()
+
+
+def get_client_pool():
+    """Jarayon bo'yicha yagona GeminiClientPool'ni olish"""
+    global _client_pool
+    if _client_pool is None:
+        with _client_pool_lock:
+            if _client_pool is None:
+                _client_pool = GeminiClientPool(
+                    max_concurrency=getattr(settings, 'GEMINI_MAX_CONCURRENCY', 8)
                 )
+    return _client_pool
 
-                logger.info("Gemini AI muvaffaqiyatli ulandi")
 
-            except Exception as e:
-                logger.error(f"Gemini AI ulanish xatoligi: {e}")
-                self.model = None
-        else:
-            logger.warning("Gemini API key topilmadi yoki kutubxona mavjud emas")
+class GeminiService:
+    """
+    Google Gemini AI bilan ishlash uchun servis
+    """
 
-    def classify_medical_issue(self, user_message, user_context=None, language='uz'):
+    def __init__(self, pool=None):
+        """Servisni ishga tushirish"""
+        self.pool = pool or get_client_pool()
+        self.model = self.pool.model
+        self.generation_config = self.pool.generation_config
+
+    def classify_medical_issue(self, user_message, user_context=None, language='uz', cache_lookup=True):
         """
         Tibbiy muammoni tasniflash va shifokor turini aniqlash
 
@@ -64,6 +152,7 @@ class GeminiService:
             user_message (str): Foydalanuvchi xabari
             user_context (dict): Qo'shimcha kontekst ma'lumotlari
             language (str): Til kodi (default: 'uz')
+            cache_lookup (bool): Cache'dan qidirish (False - cache allaqachon tekshirilgan)
 
         Returns:
             dict: Tasnif natijasi
@@ -72,58 +161,68 @@ class GeminiService:
             start_time = time.time()
             logger.info("Medical classification so'rovi: %s", user_message)
 
-            # Cache kaliti yaratish
-            cache_key = f"medical_classification_{hashlib.md5(user_message.encode()).hexdigest()}"
-            cached_result = cache.get(cache_key)
-            if cached_result:
-                logger.info("Cache'dan natija topildi: %s", cache_key)
-                return cached_result
-
-            logger.info("Cache'dan natija topilmadi: %s", cache_key)
+            classification_cache = get_classification_cache()
+            if cache_lookup:
+                cached_result = self.get_cached_classification(user_message, language)
+                if cached_result:
+                    return cached_result
 
             # Agar AI mavjud bo'lmasa, fallback ishlatish
             if not self.model:
                 logger.warning("AI modeli mavjud emas, fallback tasniflash ishlatilmoqda")
                 return self._get_fallback_classification(user_message)
 
-            logger.info("AI modeli mavjud, tasniflash davom etmoqda")
+            # AI'dan javob olish
+            response = self.pool.generate(self._get_classification_prompt(user_message, language))
+
+            result = self._process_classification_response(
+                response.text,
+                user_message,
+                time.time() - start_time
+            )
 
+            classification_cache.set(user_message, result, language)
 
-            from .prompts import get_prompt
+            logger.info(f"Medical classification yakunlandi: {result['processing_time']:.2f}s")
+            return result
 
-            logger.info("Tibbiy tasniflash uchun prompt yaratish")
-            # Prompt yaratish
-            prompt = get_prompt('classification', language).format(user_message=user_message)
+        except Exception as e:
+            logger.error(f"Medical classification xatolik: {e}")
+            return self._get_fallback_classification(user_message)
 
-            logger.info("Prompt tayyorlandi, AI'dan javob olinmoqda")
+    async def aclassify_medical_issue(self, user_message, user_context=None, language='uz'):
+        """classify_medical_issue'ning async varianti (event loop'ni bloklamaydi)"""
+        try:
+            start_time = time.time()
 
+            cached_result = await sync_to_async(
+                self.get_cached_classification, thread_sensitive=False
+            )(user_message, language)
+            if cached_result:
+                return cached_result
 
-            # AI'dan javob olish
-            response = self.model.generate_content(
-                prompt,
-                generation_config=self.generation_config
+            if not self.model:
+                return self._get_fallback_classification(user_message)
+
+            response = await self.pool.agenerate(
+                self._get_classification_prompt(user_message, language)
             )
-            logger.info("AI javobi olindi")
-            print("AI Response:", response)
-            print("AI Response:", response.text)
 
-            # Javobni qayta ishlash
-            processing_time = time.time() - start_time
-            print("Processing time:", processing_time)
             result = self._process_classification_response(
                 response.text,
                 user_message,
-                processing_time
+                time.time() - start_time
             )
 
-            # Cache'ga saqlash (5 daqiqa)
-            cache.set(cache_key, result, 300)
+            await sync_to_async(
+                get_classification_cache().set, thread_sensitive=False
+            )(user_message, result, language)
 
-            logger.info(f"Medical classification yakunlandi: {processing_time:.2f}s")
+            logger.info(f"Medical classification (async) yakunlandi: {result['processing_time']:.2f}s")
             return result
 
         except Exception as e:
-            logger.error(f"Medical classification xatolik: {e}")
+            logger.error(f"Medical classification (async) xatolik: {e}")
             return self._get_fallback_classification(user_message)
 
     def get_medical_advice(self, user_message, specialty, symptoms=None, language='uz'):
@@ -145,35 +244,131 @@ class GeminiService:
             if not self.model:
                 return self._get_fallback_advice(specialty)
 
-            from .prompts import get_prompt
-
-            prompt = get_prompt('advice', language).format(
-                user_message=user_message,
-                specialty=specialty
+            response = self.pool.generate(
+                self._get_advice_prompt(user_message, specialty, language, symptoms)
             )
 
-            response = self.model.generate_content(
-                prompt,
-                generation_config=self.generation_config
-            )
+            result = self._build_advice_result(response.text, specialty, time.time() - start_time)
+            logger.info(f"Medical advice yakunlandi: {result['processing_time']:.2f}s")
+            return result
 
-            processing_time = time.time() - start_time
+        except Exception as e:
+            logger.error(f"Medical advice xatolik: {e}")
+            return self._get_fallback_advice(specialty)
 
-            result = {
-                'advice': response.text,
-                'specialty': specialty,
-                'processing_time': processing_time,
-                'model_used': 'gemini-2.5-flash',
-                'timestamp': time.time()
-            }
+    async def aget_medical_advice(self, user_message, specialty, symptoms=None, language='uz'):
+        """get_medical_advice'ning async varianti"""
+        try:
+            start_time = time.time()
+
+            if not self.model:
+                return self._get_fallback_advice(specialty)
 
-            logger.info(f"Medical advice yakunlandi: {processing_time:.2f}s")
+            response = await self.pool.agenerate(
+                self._get_advice_prompt(user_message, specialty, language, symptoms)
+            )
+
+            result = self._build_advice_result(response.text, specialty, time.time() - start_time)
+            logger.info(f"Medical advice (async) yakunlandi: {result['processing_time']:.2f}s")
             return result
 
         except Exception as e:
-            logger.error(f"Medical advice xatolik: {e}")
+            logger.error(f"Medical advice (async) xatolik: {e}")
             return self._get_fallback_advice(specialty)
 
+    async def astream_medical_advice(self, user_message, specialty, symptoms=None, language='uz'):
+        """
+        Tibbiy maslahatni bo'laklab (token oqimi) olish
+
+        AI mavjud bo'lmasa yoki oqim xatolik bilan tugasa, fallback maslahat
+        bitta bo'lak sifatida qaytariladi.
+        """
+        if not self.model:
+            yield self._get_fallback_advice(specialty)['advice']
+            return
+
+        streamed = False
+        try:
+            async for text in self.pool.astream(
+                self._get_advice_prompt(user_message, specialty, language, symptoms)
+            ):
+                streamed = True
+                yield text
+        except Exception as e:
+            logger.error(f"Medical advice stream xatolik: {e}")
+            if not streamed:
+                yield self._get_fallback_advice(specialty)['advice']
+
+    def get_cached_classification(self, user_message, language='uz'):
+        """Cache'dagi tasnif natijasini olish (topilmasa None)"""
+        cached_result, tier = get_classification_cache().get(user_message, language)
+        if cached_result is None:
+            return None
+
+        logger.info("Cache'dan natija topildi (%s)", tier)
+        result = {**cached_result, 'cache_tier': tier}
+        if tier == 'near':
+            # O'xshash shikoyat tasnifi - xabarga bog'liq maydonlarni qayta hisoblash
+            result.update({
+                'original_message': user_message,
+                'symptoms_analysis': self.analyze_symptoms(user_message),
+                'urgency_assessment': self.assess_urgency([], user_message)
+            })
+        return result
+
+    @staticmethod
+    def guess_specialty(user_message):
+        """Kalit so'zlar bo'yicha mutaxassislikni tez taxmin qilish (AI'siz)"""
+        message_lower = user_message.lower()
+
+        if any(word in message_lower for word in ['tish', 'diş', 'tooth']):
+            return 'stomatolog'
+        if any(word in message_lower for word in ['yurak', 'qalb', 'heart']):
+            return 'kardiolog'
+        if any(word in message_lower for word in ['siydik', 'buyrак', 'kidney']):
+            return 'urolog'
+        if any(word in message_lower for word in ['ko\'z', 'eye', 'глаз']):
+            return 'oftalmolog'
+        if any(word in message_lower for word in ['quloq', 'ear', 'ухо']):
+            return 'lor'
+        if any(word in message_lower for word in ['bola', 'child', 'ребенок']):
+            return 'pediatr'
+        if any(word in message_lower for word in ['ayol', 'woman', 'женщина']):
+            return 'ginekolog'
+        return 'terapevt'
+
+    @staticmethod
+    def _get_classification_prompt(user_message, language):
+        """Tasniflash uchun prompt yaratish"""
+        from .prompts import get_prompt
+
+        return get_prompt('classification', language).format(user_message=user_message)
+
+    @staticmethod
+    def _get_advice_prompt(user_message, specialty, language, symptoms=None):
+        """Maslahat uchun prompt yaratish"""
+        from .prompts import get_prompt
+
+        symptom_names = [
+            symptom['symptom'] if isinstance(symptom, dict) else str(symptom)
+            for symptom in symptoms or []
+        ]
+        return get_prompt('advice', language).format(
+            user_message=user_message,
+            specialty=specialty,
+            symptoms=', '.join(symptom_names) or '-'
+        )
+
+    @staticmethod
+    def _build_advice_result(advice_text, specialty, processing_time):
+        return {
+            'advice': advice_text,
+            'specialty': specialty,
+            'processing_time': processing_time,
+            'model_used': GEMINI_MODEL_NAME,
+            'timestamp': time.time()
+        }
+
     def analyze_symptoms(self, text, language='uz'):
         """
         Simptomlarni tahlil qilish
@@ -185,21 +380,24 @@ class GeminiService:
             dict: Simptom tahlili
         """
         try:
-            # Oddiy kalit so'z tahlili
-            text_lower = text.lower()
+            # Kalit so'z tahlili - barcha tillar bo'yicha bitta o'tish
             detected_symptoms = []
             keywords = []
-
-            from .prompts import SYMPTOM_KEYWORDS
-            for symptom_category, symptom_list in SYMPTOM_KEYWORDS.items():
-                for symptom in symptom_list:
-                    if symptom in text_lower:
-                        detected_symptoms.append({
-                            'symptom': symptom,
-                            'category': symptom_category,
-                            'confidence': 0.8
-                        })
-                        keywords.append(symptom)
+            seen = set()
+
+            for match in keyword_index.find_all(text, groups={SYMPTOM}):
+                if (match.keyword, match.category) in seen:
+                    continue
+                seen.add((match.keyword, match.category))
+                detected_symptoms.append({
+                    'symptom': match.keyword,
+                    'category': match.category,
+                    'language': match.language,
+                    'span': [match.start, match.end],
+                    'confidence': 0.8
+                })
+                if match.keyword not in keywords:
+                    keywords.append(match.keyword)
 
             return {
                 'detected_symptoms': detected_symptoms,
@@ -230,28 +428,28 @@ class GeminiService:
         """
         try:
             urgency_score = 0
-            urgency_keywords = {
-                'urgent': ['tez', 'shoshilinch', 'og\'riq', 'qon', 'yurak', 'nafas'],
-                'high': ['kuchli', 'zo\'r', 'og\'ir', 'isitma'],
-                'medium': ['sekin', 'bosim', 'stress'],
-                'low': ['oddiy', 'kichik', 'yengil']
-            }
-
-            message_lower = user_message.lower()
+            level_scores = {'urgent': 5, 'high': 3, 'medium': 1, 'low': 0}
+            matches = keyword_index.find_all(
+                user_message, groups={URGENCY, EMERGENCY, HIGH_PRIORITY}
+            )
+            # Har bir kalit so'z bir marta hisoblanadi
+            matched = {(match.keyword, match.group, match.category) for match in matches}
+            is_emergency = False
 
             # Urgency keywords bo'yicha ball berish
-            for level, keywords in urgency_keywords.items():
-                for keyword in keywords:
-                    if keyword in message_lower:
-                        if level == 'urgent':
-                            urgency_score += 5
-                        elif level == 'high':
-                            urgency_score += 3
-                        elif level == 'medium':
-                            urgency_score += 1
+            for keyword, group, category in matched:
+                if group == EMERGENCY:
+                    is_emergency = True
+                elif group == HIGH_PRIORITY:
+                    urgency_score += level_scores['high']
+                else:
+                    urgency_score += level_scores[category]
 
             # Urgency level aniqlash
-            if urgency_score >= 5:
+            if is_emergency:
+                level = 'emergency'
+                description = 'Shoshilinch holat - darhol tez yordam chaqiring'
+            elif urgency_score >= 5:
                 level = 'urgent'
                 description = 'Darhol tibbiy yordam kerak'
             elif urgency_score >= 3:
@@ -268,7 +466,8 @@ class GeminiService:
                 'urgency_level': level,
                 'urgency_score': urgency_score,
                 'description': description,
-                'recommendation': self._get_urgency_recommendation(level)
+                'recommendation': self._get_urgency_recommendation(level),
+                'matched_keywords': sorted({keyword for keyword, _, _ in matched})
             }
 
         except Exception as e:
@@ -296,7 +495,7 @@ class GeminiService:
             # Qo'shimcha ma'lumotlar
             result.update({
                 'processing_time': processing_time,
-                'model_used': 'gemini-2.5-flash',
+                'model_used': GEMINI_MODEL_NAME,
                 'original_message': original_message,
                 'timestamp': time.time(),
                 'symptoms_analysis': self.analyze_symptoms(original_message),
@@ -326,28 +525,8 @@ class GeminiService:
 
     def _get_fallback_classification(self, user_message):
         """Fallback classification (AI ishlamasa)"""
-        message_lower = user_message.lower()
-
-        # Oddiy kalit so'z tahlili
-        if any(word in message_lower for word in ['tish', 'diş', 'tooth']):
-            specialty = 'stomatolog'
-        elif any(word in message_lower for word in ['yurak', 'qalb', 'heart']):
-            specialty = 'kardiolog'
-        elif any(word in message_lower for word in ['siydik', 'buyrак', 'kidney']):
-            specialty = 'urolog'
-        elif any(word in message_lower for word in ['ko\'z', 'eye', 'глаз']):
-            specialty = 'oftalmolog'
-        elif any(word in message_lower for word in ['quloq', 'ear', 'ухо']):
-            specialty = 'lor'
-        elif any(word in message_lower for word in ['bola', 'child', 'ребенок']):
-            specialty = 'pediatr'
-        elif any(word in message_lower for word in ['ayol', 'woman', 'женщина']):
-            specialty = 'ginekolog'
-        else:
-            specialty = 'terapevt'
-
         return {
-            'specialty': specialty,
+            'specialty': self.guess_specialty(user_message),
             'confidence': 0.7,
             'explanation': _('Oddiy kalit so\'z tahlili asosida'),
             'processing_time': 0.1,
@@ -382,6 +561,7 @@ class GeminiService:
     def _get_urgency_recommendation(self, level):
         """Shoshilinchlik darajasiga qarab tavsiya"""
         recommendations = {
+            'emergency': 'Darhol 103 ga qo\'ng\'iroq qiling yoki tez yordam chaqiring',
             'urgent': 'Darhol 103 ga qo\'ng\'iroq qiling yoki tez yordam chaqiring',
             'high': 'Bugun yoki ertaga shifokorga murojaat qiling',
             'medium': 'Bir necha kun ichida shifokorga ko\'rsating',
@@ -561,11 +741,14 @@ class GeminiService:
 
 # Singlton instance
 _gemini_service = None
+_gemini_service_lock = threading.Lock()
 
 
 def get_gemini_service():
-    """Gemini servisini olish"""
+    """Gemini servisini olish (umumiy klient pool bilan)"""
     global _gemini_service
     if _gemini_service is None:
-        _gemini_service = GeminiService()
-    return _gemini_service
\ No newline at end of file
+        with _gemini_service_lock:
+            if _gemini_service is None:
+                _gemini_service = GeminiService()
+    return _gemini_service
@@ -5,6 +5,7 @@ from django.db.models import Count, Avg, Q
 from django.utils import timezone
 from datetime import date, timedelta
 
+from apps.core.swr_cache import stale_while_revalidate
 from apps.core.utils import get_client_ip
 from apps.core.throttling import ChatThrottle, SearchThrottle
 from apps.doctors.models import Doctor
@@ -13,7 +14,8 @@ from apps.consultations.models import Consultation, Review
 
 # Chat API'lari kengaytirilgan import
 try:
-    from apps.ai_assistant.services import GeminiService
+    from apps.ai_assistant.services import get_gemini_service
+    from apps.ai_assistant.classification_cache import get_classification_cache
 
     AI_AVAILABLE = True
 except ImportError:
@@ -25,6 +27,10 @@ except ImportError:
             return {'specialty': 'terapevt', 'confidence': 0.5, 'explanation': 'Fallback'}
 
 
+    def get_gemini_service():
+        return GeminiService()
+
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def api_overview(request):
@@ -88,13 +94,13 @@ def quick_send_message(request):
         )
 
         # AI tahlil
-        gemini_service = GeminiService()
+        gemini_service = get_gemini_service()
         classification = gemini_service.classify_medical_issue(message)
 
         # Session yangilash
         session.detected_specialty = classification.get('specialty')
         session.confidence_score = classification.get('confidence', 0.5)
-        session.save()
+        session.save(update_fields=['detected_specialty', 'confidence_score', 'updated_at'])
 
         # Shifokorlarni topish
         doctors = Doctor.objects.filter(
@@ -145,14 +151,14 @@ def quick_send_message(request):
         ai_response += "\n**❗ Muhim:** Bu umumiy maslahat. Aniq tashxis uchun shifokor bilan maslahatlashing."
 
         # AI xabarini saqlash
-        ai_message = ChatMessage.objects.create(
+        ai_message = ChatMessage.objects.add_reply(ChatMessage(
             session=session,
             sender_type='ai',
             message_type='text',
             content=ai_response,
             ai_model_used=classification.get('model_used', 'fallback'),
             ai_response_time=classification.get('processing_time', 0)
-        )
+        ))
 
         return Response({
             'success': True,
@@ -191,7 +197,7 @@ def quick_classify_issue(request):
             }, status=400)
 
         # AI tahlili
-        gemini_service = GeminiService()
+        gemini_service = get_gemini_service()
         result = gemini_service.classify_medical_issue(message)
 
         return Response({
@@ -420,7 +426,8 @@ def quick_health_check(request):
             },
             'ai_service': {
                 'status': ai_status,
-                'available': AI_AVAILABLE
+                'available': AI_AVAILABLE,
+                'classification_cache': get_classification_cache().get_stats() if AI_AVAILABLE else None
             },
             'version': '1.0.0'
         })
@@ -434,80 +441,91 @@ def quick_health_check(request):
         }, status=500)
 
 
-@api_view(['GET'])
-@permission_classes([AllowAny])
-def quick_stats(request):
-    """Tizim statistikasi"""
+@stale_while_revalidate('api:quick_stats', soft_ttl=60, hard_ttl=600)
+def compute_quick_stats():
+    """Tizim statistikasini hisoblash (quick_stats uchun cache'lanadi)"""
     today = date.today()
     week_ago = today - timedelta(days=7)
-    month_ago = today - timedelta(days=30)
+    available = Q(is_available=True)
+
+    # Har bir jadval uchun bitta shartli aggregate so'rov
+    doctor_stats = Doctor.objects.aggregate(
+        total=Count('id'),
+        available=Count('id', filter=available),
+        online_consultation=Count('id', filter=available & Q(is_online_consultation=True)),
+        avg_rating=Avg('rating', filter=available),
+        avg_price=Avg('consultation_price', filter=available)
+    )
+    chat_stats = ChatSession.objects.aggregate(
+        total_sessions=Count('id'),
+        active_sessions=Count('id', filter=Q(status='active')),
+        sessions_today=Count('id', filter=Q(created_at__date=today)),
+        sessions_this_week=Count('id', filter=Q(created_at__date__gte=week_ago))
+    )
+    consultation_stats = Consultation.objects.aggregate(
+        total=Count('id'),
+        today=Count('id', filter=Q(scheduled_date=today)),
+        this_week=Count('id', filter=Q(scheduled_date__gte=week_ago))
+    )
+    review_stats = Review.objects.filter(is_active=True).aggregate(
+        total=Count('id'),
+        avg_rating=Avg('overall_rating'),
+        verified=Count('id', filter=Q(is_verified=True))
+    )
+
+    return {
+        'doctors': {
+            'total': doctor_stats['total'],
+            'available': doctor_stats['available'],
+            'online_consultation': doctor_stats['online_consultation'],
+            'by_specialty': dict(
+                Doctor.objects.filter(is_available=True)
+                .values('specialty')
+                .annotate(count=Count('id'))
+                .values_list('specialty', 'count')
+            ),
+            'avg_rating': doctor_stats['avg_rating'] or 0,
+            'avg_price': doctor_stats['avg_price'] or 0
+        },
 
-    try:
-        stats = {
-            'doctors': {
-                'total': Doctor.objects.count(),
-                'available': Doctor.objects.filter(is_available=True).count(),
-                'online_consultation': Doctor.objects.filter(
-                    is_available=True,
-                    is_online_consultation=True
-                ).count(),
-                'by_specialty': dict(
-                    Doctor.objects.filter(is_available=True)
-                    .values('specialty')
-                    .annotate(count=Count('id'))
-                    .values_list('specialty', 'count')
-                ),
-                'avg_rating': Doctor.objects.filter(is_available=True)
-                              .aggregate(avg=Avg('rating'))['avg'] or 0,
-                'avg_price': Doctor.objects.filter(is_available=True)
-                             .aggregate(avg=Avg('consultation_price'))['avg'] or 0
-            },
+        'chat': {
+            **chat_stats,
+            'total_messages': ChatMessage.objects.count(),
+            'ai_available': AI_AVAILABLE,
+            'top_specialties': list(
+                ChatSession.objects.filter(detected_specialty__isnull=False)
+                .values('detected_specialty')
+                .annotate(count=Count('id'))
+                .order_by('-count')[:5]
+            )
+        },
 
-            'chat': {
-                'total_sessions': ChatSession.objects.count(),
-                'active_sessions': ChatSession.objects.filter(status='active').count(),
-                'sessions_today': ChatSession.objects.filter(
-                    created_at__date=today
-                ).count(),
-                'sessions_this_week': ChatSession.objects.filter(
-                    created_at__date__gte=week_ago
-                ).count(),
-                'total_messages': ChatMessage.objects.count(),
-                'ai_available': AI_AVAILABLE,
-                'top_specialties': list(
-                    ChatSession.objects.filter(detected_specialty__isnull=False)
-                    .values('detected_specialty')
-                    .annotate(count=Count('id'))
-                    .order_by('-count')[:5]
-                )
-            },
+        'consultations': {
+            **consultation_stats,
+            'by_status': dict(
+                Consultation.objects.values('status')
+                .annotate(count=Count('id'))
+                .values_list('status', 'count')
+            )
+        },
 
-            'consultations': {
-                'total': Consultation.objects.count(),
-                'today': Consultation.objects.filter(scheduled_date=today).count(),
-                'this_week': Consultation.objects.filter(
-                    scheduled_date__gte=week_ago
-                ).count(),
-                'by_status': dict(
-                    Consultation.objects.values('status')
-                    .annotate(count=Count('id'))
-                    .values_list('status', 'count')
-                )
-            },
+        'reviews': {
+            'total': review_stats['total'],
+            'avg_rating': review_stats['avg_rating'] or 0,
+            'verified': review_stats['verified']
+        },
 
-            'reviews': {
-                'total': Review.objects.filter(is_active=True).count(),
-                'avg_rating': Review.objects.filter(is_active=True)
-                              .aggregate(avg=Avg('overall_rating'))['avg'] or 0,
-                'verified': Review.objects.filter(
-                    is_active=True,
-                    is_verified=True
-                ).count()
-            },
+        'timestamp': timezone.now().isoformat(),
+        'ai_available': AI_AVAILABLE
+    }
 
-            'timestamp': timezone.now().isoformat(),
-            'ai_available': AI_AVAILABLE
-        }
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def quick_stats(request):
+    """Tizim statistikasi (cache'dan, fonda yangilanadi)"""
+    try:
+        stats = compute_quick_stats()
 
         return Response({
             'success': True,
@@ -0,0 +1,94 @@
+"""
+Process-level cache of billing configuration.
+
+BillingSettings (one row) and the active BillingRules change rarely but are
+read on every charge and access check. Each process keeps them in memory:
+
+    - the cached copy is tagged with a version stamp stored in the Django
+      cache; every read compares the stamp (one cache get, no SQL) and
+      reloads both tables when it changed;
+    - saving or deleting a BillingSettings or BillingRule drops the copy of
+      the saving process and bumps the stamp after the transaction commits
+      (see the signal handlers in billing/models.py). With a shared cache
+      backend every process reloads on its next read;
+    - a copy is also reloaded once it is ``CONFIG_TTL`` seconds old. With a
+      per-process cache backend (LocMemCache, the default) other processes
+      never see the bumped stamp, so this bounds how long they use the old
+      configuration;
+    - rules are a precomputed {service_type: rule} dict of active rules.
+
+    from apps.billing.config_cache import get_billing_settings, get_rule
+
+    rule = get_rule('doctor_view')   # None when missing or inactive
+"""
+import copy
+import threading
+import time
+
+from django.core.cache import cache
+
+VERSION_KEY = 'billing_config:version'
+
+# Seconds a process uses its copy before reloading it
+CONFIG_TTL = 30
+
+_config = None  # (version, loaded at, settings, rules by service type)
+_lock = threading.Lock()
+
+
+def _load():
+    from .models import BillingRule, BillingSettings
+
+    settings = BillingSettings.load_settings()
+    rules = {rule.service_type: rule for rule in BillingRule.objects.filter(is_active=True)}
+    return settings, rules
+
+
+def _is_current(config, version):
+    return config is not None and config[0] == version and time.monotonic() - config[1] < CONFIG_TTL
+
+
+def _get_config():
+    global _config
+
+    version = cache.get(VERSION_KEY, 0)
+    config = _config
+    if _is_current(config, version):
+        return config
+
+    with _lock:
+        if not _is_current(_config, version):
+            _config = (version, time.monotonic(), *_load())
+        return _config
+
+
+def get_billing_settings():
+    """BillingSettings, created with defaults if missing (a copy - safe to modify)"""
+    return copy.copy(_get_config()[2])
+
+
+def get_rules():
+    """Active billing rules by service type (shared instances - read only)"""
+    return _get_config()[3]
+
+
+def get_rule(service_type):
+    """Active BillingRule of a service type, or None"""
+    return get_rules().get(service_type)
+
+
+def clear_local_config():
+    """Drop this process's copy"""
+    global _config
+
+    _config = None
+
+
+def invalidate_billing_config():
+    """Billing settings or rules changed - reload on the next read (other processes: see CONFIG_TTL)"""
+    clear_local_config()
+    if not cache.add(VERSION_KEY, 1, None):
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.set(VERSION_KEY, 1, None)
@@ -0,0 +1,152 @@
+"""
+Request-scoped billing state.
+
+Stacked billing permissions and BillingService used to repeat the same
+lookups for one request: BillingSettings.get_settings() (a get_or_create),
+BillingRule.objects.get, UserWallet.objects.get_or_create and today's usage
+aggregates. A ``BillingContext`` loads each of them lazily, once:
+
+    settings  - BillingSettings                         process cache
+    rules     - every active BillingRule by service type process cache
+    wallet    - the user's wallet, annotated with today's
+                free views (FreeViewQuota) and spending 1 query
+    usage     - read from the wallet annotations        no query
+
+Settings and rules come from apps.billing.config_cache, so a fully stacked
+permission chain costs one query for the wallet and usage. Loading the
+context never writes: a user without a wallet row gets an unsaved, empty
+default wallet.
+
+Permissions get the context of the request with ``get_billing_context``;
+services take an optional ``context`` argument and build a throwaway one
+when called without a request.
+
+    context = get_billing_context(request)
+    if context.billing_active and context.get_rule('doctor_view'): ...
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import DecimalField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from .config_cache import get_billing_settings, get_rules
+
+CONTEXT_ATTRIBUTE = '_billing_context'
+
+
+class BillingContext:
+    """Lazily loaded, memoized billing state of one user"""
+
+    def __init__(self, user):
+        self.user = user
+        self.today = timezone.now().date()
+        self._recent_debits = {}
+        self._viewed_doctors = {}
+
+    @cached_property
+    def settings(self):
+        return get_billing_settings()
+
+    @property
+    def billing_active(self):
+        """Billing enabled and not in maintenance mode"""
+        return self.settings.enable_billing and not self.settings.maintenance_mode
+
+    @cached_property
+    def rules(self):
+        """Active billing rules by service type"""
+        return get_rules()
+
+    def get_rule(self, service_type):
+        """Active BillingRule of a service type, or None"""
+        return self.rules.get(service_type)
+
+    @cached_property
+    def wallet(self):
+        """The user's wallet with today's usage annotated (unsaved default if missing)"""
+        from .models import FreeViewQuota, UserWallet
+
+        wallet = UserWallet.objects.filter(user=self.user).annotate(
+            free_views_today=Coalesce(
+                Subquery(FreeViewQuota.objects.filter(
+                    user=OuterRef('user'), date=self.today
+                ).values('used')[:1]),
+                Value(0)
+            ),
+            spent_today=Coalesce(
+                Sum('transactions__amount', filter=Q(
+                    transactions__created_at__date=self.today,
+                    transactions__transaction_type='debit', transactions__status='completed'
+                )),
+                Value(Decimal('0.00')),
+                output_field=DecimalField(max_digits=12, decimal_places=2)
+            )
+        ).first()
+
+        if wallet is None:
+            # Permission checks stay read-only; charging creates the row
+            wallet = UserWallet(user=self.user)
+            wallet.free_views_today = 0
+            wallet.spent_today = Decimal('0.00')
+        return wallet
+
+    @property
+    def free_views_used(self):
+        """Free doctor views used today"""
+        return self.wallet.free_views_today
+
+    @property
+    def free_views_remaining(self):
+        return max(0, self.settings.free_views_per_day - self.free_views_used)
+
+    @property
+    def spent_today(self):
+        """Completed debits today"""
+        return self.wallet.spent_today
+
+    def recent_debit_count(self, minutes):
+        """Debit transactions of the user in the last ``minutes``"""
+        if minutes not in self._recent_debits:
+            from .models import WalletTransaction
+
+            self._recent_debits[minutes] = WalletTransaction.objects.filter(
+                wallet__user=self.user,
+                created_at__gte=timezone.now() - timedelta(minutes=minutes),
+                transaction_type='debit'
+            ).count()
+        return self._recent_debits[minutes]
+
+    def viewed_doctor_today(self, doctor_id):
+        """Whether the user already paid to view the doctor today"""
+        if doctor_id not in self._viewed_doctors:
+            from .models import DoctorViewCharge
+
+            self._viewed_doctors[doctor_id] = DoctorViewCharge.objects.filter(
+                user=self.user,
+                doctor_id=doctor_id,
+                created_at__date=self.today
+            ).exists()
+        return self._viewed_doctors[doctor_id]
+
+    def refresh(self):
+        """Drop wallet and usage state after the user was charged"""
+        self.__dict__.pop('wallet', None)
+        self._recent_debits.clear()
+        self._viewed_doctors.clear()
+
+
+def get_billing_context(request):
+    """
+    Billing context of the request's user, created on first use.
+
+    Shared by the DRF Request and the underlying HttpRequest.
+    """
+    http_request = getattr(request, '_request', request)
+    context = getattr(http_request, CONTEXT_ATTRIBUTE, None)
+    if context is None or context.user != request.user:
+        context = BillingContext(request.user)
+        setattr(http_request, CONTEXT_ATTRIBUTE, context)
+    return context
@@ -0,0 +1,83 @@
+"""
+Daily free doctor-view quota.
+
+Free views used to be zero-amount WalletTransaction rows, counted with
+``created_at__date=today AND description ILIKE '%free view%'`` - an
+unindexed scan of the user's ledger on every check. Each user now has one
+FreeViewQuota row per day, looked up by the unique (user, date) index:
+
+    used / remaining   1 SELECT
+    consume            1 conditional UPDATE (1 INSERT for the first view
+                       of the day)
+
+``consume`` increments only while ``used < limit``, so concurrent requests
+cannot use more free views than the limit. The limit defaults to
+BillingSettings.free_views_per_day.
+
+Rows of past days are not read again and can be deleted at any time.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .config_cache import get_billing_settings
+
+
+def _today():
+    return timezone.now().date()
+
+
+def _default_limit():
+    return get_billing_settings().free_views_per_day
+
+
+def used(user, day=None):
+    """Free views the user used on ``day`` (default today)"""
+    from .models import FreeViewQuota
+
+    count = FreeViewQuota.objects.filter(
+        user=user, date=day or _today()
+    ).values_list('used', flat=True).first()
+    return count or 0
+
+
+def remaining(user, limit=None):
+    """Free views the user has left today"""
+    if limit is None:
+        limit = _default_limit()
+    return max(0, limit - used(user))
+
+
+def consume(user, limit=None):
+    """
+    Use one of today's free views.
+
+    Returns:
+        bool: False when the quota is exhausted
+    """
+    from .models import FreeViewQuota
+
+    if limit is None:
+        limit = _default_limit()
+    if limit <= 0:
+        return False
+
+    today = _today()
+    quota = FreeViewQuota.objects.filter(user=user, date=today, used__lt=limit)
+    if quota.update(used=F('used') + 1):
+        return True
+
+    try:
+        with transaction.atomic():
+            FreeViewQuota.objects.create(user=user, date=today, used=1)
+        return True
+    except IntegrityError:
+        # Today's row exists: the quota is exhausted, or it was just created concurrently
+        return bool(quota.update(used=F('used') + 1))
+
+
+def reset(user, day=None):
+    """Give the user their free views for ``day`` (default today) back"""
+    from .models import FreeViewQuota
+
+    FreeViewQuota.objects.filter(user=user, date=day or _today()).delete()
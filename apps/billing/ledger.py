@@ -0,0 +1,242 @@
+"""
+Wallet ledger: the single place where UserWallet balances change.
+
+Every debit or credit is a conditional UPDATE of the wallet row plus one
+WalletTransaction INSERT, in one transaction:
+
+    UPDATE billing_userwallet
+       SET balance = balance - 500, total_spent = total_spent + 500, ...
+     WHERE id = 7 AND balance >= 500 AND NOT is_blocked
+    RETURNING id, balance
+
+The database checks the balance and applies the change atomically, so no
+row has to be read (or locked) first and concurrent debits cannot overdraw
+a wallet. The returned balance fills balance_before/balance_after of the
+transaction row.
+
+A batch (``post``) costs the same two statements: one UPDATE with CASE
+expressions over all wallets and one bulk INSERT. Entries touching the same
+wallet more than once are applied in extra rounds of one UPDATE each.
+
+Backends without UPDATE ... RETURNING (MySQL, SQLite < 3.35) lock the rows
+with SELECT ... FOR UPDATE, check the balances in Python and run the same
+UPDATE without RETURNING.
+
+    from apps.billing import ledger
+
+    transaction = ledger.debit(wallet.id, Decimal('500'), "Card view charge")
+    ledger.credit(wallet.id, Decimal('10000'), "Payment top-up", ref=payment.id)
+
+    transactions = ledger.post([
+        ledger.LedgerEntry(wallet_a, 'debit', Decimal('500'), "Search charge"),
+        ledger.LedgerEntry(wallet_b, 'debit', Decimal('500'), "Search charge"),
+    ], partial=True)   # None for entries that did not fit the balance
+"""
+from decimal import Decimal
+from typing import NamedTuple, Optional
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+CENT = Decimal('0.01')
+
+
+class InsufficientBalance(ValueError):
+    """Debit exceeds the wallet balance, or the wallet is blocked"""
+
+    def __init__(self, wallet_id=None):
+        self.wallet_id = wallet_id
+        super().__init__("Insufficient balance")
+
+
+class LedgerEntry(NamedTuple):
+    """One debit or credit of a wallet"""
+    wallet_id: int
+    transaction_type: str  # 'debit' or 'credit'
+    amount: Decimal
+    description: str = ''
+    ref: Optional[int] = None  # WalletTransaction.object_id
+
+
+def debit(wallet_id, amount, description='', ref=None):
+    """
+    Take ``amount`` from a wallet.
+
+    Returns:
+        WalletTransaction
+
+    Raises:
+        InsufficientBalance: Balance too low or wallet blocked
+    """
+    return post([LedgerEntry(wallet_id, 'debit', amount, description, ref)])[0]
+
+
+def credit(wallet_id, amount, description='', ref=None):
+    """
+    Add ``amount`` to a wallet (blocked wallets too).
+
+    Returns:
+        WalletTransaction
+    """
+    return post([LedgerEntry(wallet_id, 'credit', amount, description, ref)])[0]
+
+
+def post(entries, partial=False):
+    """
+    Apply a batch of ledger entries.
+
+    Args:
+        entries: Iterable of LedgerEntry
+        partial: Skip debits that do not fit instead of rolling back the batch
+
+    Returns:
+        list: WalletTransaction per entry (None for skipped debits)
+
+    Raises:
+        InsufficientBalance: A debit did not fit and ``partial`` is False
+    """
+    from .models import WalletTransaction
+
+    entries = [_normalize(entry) for entry in entries]
+    results = [None] * len(entries)
+    if not entries:
+        return results
+
+    with transaction.atomic():
+        for round_indexes in _rounds(entries):
+            balances = _apply_round([entries[index] for index in round_indexes])
+            for index in round_indexes:
+                entry = entries[index]
+                balance_after = balances.get(entry.wallet_id)
+                if balance_after is None:
+                    if not partial:
+                        raise InsufficientBalance(entry.wallet_id)
+                    continue
+                delta = -entry.amount if entry.transaction_type == 'debit' else entry.amount
+                results[index] = WalletTransaction(
+                    wallet_id=entry.wallet_id,
+                    transaction_type=entry.transaction_type,
+                    amount=entry.amount,
+                    balance_before=balance_after - delta,
+                    balance_after=balance_after,
+                    description=entry.description[:255],
+                    object_id=entry.ref,
+                    status='completed'
+                )
+
+        WalletTransaction.objects.bulk_create([result for result in results if result is not None])
+    return results
+
+
+def _normalize(entry):
+    if entry.transaction_type not in ('debit', 'credit'):
+        raise ValueError(f"Unknown transaction type: {entry.transaction_type}")
+    amount = Decimal(str(entry.amount))
+    if amount <= 0:
+        raise ValueError("Amount must be positive")
+    ref = getattr(entry.ref, 'pk', entry.ref)
+    return entry._replace(amount=amount, ref=ref, description=entry.description or '')
+
+
+def _rounds(entries):
+    """Split entry indexes into rounds touching each wallet at most once"""
+    rounds = []
+    for index, entry in enumerate(entries):
+        for round_indexes, wallet_ids in rounds:
+            if entry.wallet_id not in wallet_ids:
+                break
+        else:
+            round_indexes, wallet_ids = [], set()
+            rounds.append((round_indexes, wallet_ids))
+        round_indexes.append(index)
+        wallet_ids.add(entry.wallet_id)
+    return [round_indexes for round_indexes, _ in rounds]
+
+
+def _supports_update_returning():
+    if connection.vendor == 'postgresql':
+        return True
+    if connection.vendor == 'sqlite':
+        # UPDATE ... RETURNING arrived with INSERT ... RETURNING in SQLite 3.35
+        return connection.features.can_return_rows_from_bulk_insert
+    return False
+
+
+def _apply_round(entries):
+    """
+    One UPDATE for entries on distinct wallets.
+
+    Returns:
+        dict: {wallet_id: balance after} of the wallets that were updated
+    """
+    from .models import UserWallet
+
+    table = connection.ops.quote_name(UserWallet._meta.db_table)
+    qn = connection.ops.quote_name
+
+    debits = {entry.wallet_id: entry.amount for entry in entries if entry.transaction_type == 'debit'}
+    credits = {entry.wallet_id: entry.amount for entry in entries if entry.transaction_type == 'credit'}
+
+    if not _supports_update_returning():
+        # Lock, check in Python, then update without RETURNING
+        wallets = UserWallet.objects.select_for_update().in_bulk(list(debits) + list(credits))
+        debits = {
+            wallet_id: amount for wallet_id, amount in debits.items()
+            if wallet_id in wallets
+            and not wallets[wallet_id].is_blocked and wallets[wallet_id].balance >= amount
+        }
+        credits = {wallet_id: amount for wallet_id, amount in credits.items() if wallet_id in wallets}
+        if not debits and not credits:
+            return {}
+
+    params = []
+
+    def case(values, default='0'):
+        # CASE id WHEN %s THEN %s ... ELSE <default> END
+        if not values:
+            return default
+        whens = []
+        for wallet_id, amount in values.items():
+            whens.append('WHEN %s THEN %s')
+            params.extend([wallet_id, amount])
+        return f"CASE {qn('id')} {' '.join(whens)} ELSE {default} END"
+
+    def id_list(values):
+        params.extend(values)
+        return ', '.join(['%s'] * len(values))
+
+    signed = {**{wallet_id: -amount for wallet_id, amount in debits.items()}, **credits}
+    sql = (
+        f"UPDATE {table} SET "
+        f"{qn('balance')} = {qn('balance')} + {case(signed)}, "
+        f"{qn('total_spent')} = {qn('total_spent')} + {case(debits)}, "
+        f"{qn('total_topped_up')} = {qn('total_topped_up')} + {case(credits)}, "
+        f"{qn('updated_at')} = %s "
+    )
+    params.append(timezone.now())
+
+    conditions = []
+    if debits:
+        debit_ids = id_list(list(debits))
+        params.append(False)
+        required = case(debits, default='NULL')
+        conditions.append(
+            f"({qn('id')} IN ({debit_ids}) AND {qn('is_blocked')} = %s AND {qn('balance')} >= {required})"
+        )
+    if credits:
+        conditions.append(f"{qn('id')} IN ({id_list(list(credits))})")
+    sql += f"WHERE {' OR '.join(conditions)}"
+
+    with connection.cursor() as cursor:
+        if _supports_update_returning():
+            cursor.execute(f"{sql} RETURNING {qn('id')}, {qn('balance')}", params)
+            return {
+                wallet_id: Decimal(str(balance)).quantize(CENT)
+                for wallet_id, balance in cursor.fetchall()
+            }
+        cursor.execute(sql, params)
+
+    return {
+        wallet_id: (wallets[wallet_id].balance + amount).quantize(CENT)
+        for wallet_id, amount in signed.items()
+    }
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.billing.sub_ledger import get_sub_ledger_settings, settle_pending_charges
+
+
+class Command(BaseCommand):
+    help = 'Settle deferred doctor charges (PendingCharge) into wallet balances'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep settling every SETTLE_INTERVAL seconds'
+        )
+
+    def handle(self, *args, **options):
+        config = get_sub_ledger_settings()
+
+        while True:
+            settled, dropped = settle_pending_charges()
+            self.stdout.write(self.style.SUCCESS(
+                f'Settled {settled} pending charges, dropped {dropped} exceeding the balance'
+            ))
+
+            if not options['loop']:
+                break
+            time.sleep(config['SETTLE_INTERVAL'])
@@ -60,40 +60,18 @@ class UserWallet(models.Model):
 
     def deduct_balance(self, amount, description=""):
         """Deduct amount from wallet"""
-        if not self.has_sufficient_balance(amount):
-            raise ValueError("Insufficient balance")
-
-        balance_before = self.balance
-        self.balance -= amount
-        self.total_spent += amount
-        self.save()
-
-        # Create transaction record
-        WalletTransaction.objects.create(
-            wallet=self,
-            transaction_type='debit',
-            amount=amount,
-            description=description,
-            balance_before=balance_before,
-            balance_after=self.balance
-        )
+        from .ledger import debit
+
+        transaction = debit(self.pk, amount, description)
+        self._apply_ledger_transaction(transaction)
+        return transaction
 
     def add_balance(self, amount, description=""):
         """Add amount to wallet"""
-        balance_before = self.balance
-        self.balance += amount
-        self.total_topped_up += amount
-        self.save()
-
-        # Create transaction record
-        WalletTransaction.objects.create(
-            wallet=self,
-            transaction_type='credit',
-            amount=amount,
-            description=description,
-            balance_before=balance_before,
-            balance_after=self.balance
-        )
+        from .ledger import credit
+
+        transaction = credit(self.pk, amount, description)
+        self._apply_ledger_transaction(transaction)
 
         # Unblock doctor if balance topped up to more than 5000
         if self.balance > 5000 and self.user.user_type == 'doctor':
@@ -105,6 +83,16 @@ class UserWallet(models.Model):
             except Exception:
                 pass  # User might not have doctor profile yet
 
+        return transaction
+
+    def _apply_ledger_transaction(self, transaction):
+        """Sync the in-memory wallet with a ledger transaction"""
+        self.balance = transaction.balance_after
+        if transaction.transaction_type == 'debit':
+            self.total_spent += transaction.amount
+        else:
+            self.total_topped_up += transaction.amount
+
 
 class BillingRule(models.Model):
     """Configurable billing rules for different services"""
@@ -315,6 +303,95 @@ class DoctorViewCharge(models.Model):
         return f"{self.user.get_full_name()} - {self.doctor.full_name} - {self.amount_charged} so'm"
 
 
+class FreeViewQuota(models.Model):
+    """Foydalanuvchining kunlik bepul ko'rishlari hisoblagichi (apps/billing/free_views.py)"""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='free_view_quotas',
+        verbose_name="Foydalanuvchi"
+    )
+
+    date = models.DateField(verbose_name="Sana")
+
+    used = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Ishlatilgan bepul ko'rishlar"
+    )
+
+    class Meta:
+        verbose_name = "Bepul ko'rishlar kvotasi"
+        verbose_name_plural = "Bepul ko'rishlar kvotalari"
+        unique_together = ['user', 'date']
+
+    def __str__(self):
+        return f"{self.user_id} - {self.date} - {self.used}"
+
+
+class PendingCharge(models.Model):
+    """
+    Hisoblanmagan (kechiktirilgan) shifokor to'lovi.
+
+    Faqat qo'shiladi va vaqti-vaqti bilan hamyonga hisoblanadi
+    (apps/billing/sub_ledger.py).
+    """
+
+    wallet = models.ForeignKey(
+        UserWallet,
+        on_delete=models.CASCADE,
+        related_name='pending_charges',
+        verbose_name="Hamyon"
+    )
+
+    doctor = models.ForeignKey(
+        'doctors.Doctor',
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+        related_name='pending_charges',
+        verbose_name="Shifokor"
+    )
+
+    charge_type = models.CharField(max_length=20, verbose_name="To'lov turi")
+
+    amount = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        validators=[MinValueValidator(Decimal('0.01'))],
+        verbose_name="Summa"
+    )
+
+    # Ko'ruvchi (ChargeLog.user va DoctorViewCharge.user uchun)
+    viewer = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='+',
+        verbose_name="Ko'ruvchi"
+    )
+    ip_address = models.GenericIPAddressField(blank=True, null=True, verbose_name="IP manzil")
+    user_agent = models.TextField(blank=True, default='', verbose_name="User Agent")
+    metadata = models.JSONField(default=dict, blank=True, verbose_name="Qo'shimcha ma'lumot")
+    track_view = models.BooleanField(default=False, verbose_name="DoctorViewCharge yaratish")
+
+    # Hisoblash jarayoni egallagan qatorlar
+    settlement_id = models.UUIDField(blank=True, null=True, verbose_name="Hisoblash ID")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Kutilayotgan to'lov"
+        verbose_name_plural = "Kutilayotgan to'lovlar"
+        indexes = [
+            models.Index(fields=['settlement_id']),
+        ]
+
+    def __str__(self):
+        return f"{self.wallet_id} - {self.charge_type}: {self.amount} so'm"
+
+
 class BillingSettings(models.Model):
     """Global billing settings"""
 
@@ -364,7 +441,21 @@ class BillingSettings(models.Model):
 
     @classmethod
     def get_settings(cls):
-        """Get or create billing settings"""
+        """Get or create billing settings (cached per process, see config_cache)"""
+        from .config_cache import get_billing_settings
+
+        return get_billing_settings()
+
+    @staticmethod
+    def get_billing_rule(service_type):
+        """Active billing rule of a service type, or None"""
+        from .config_cache import get_rule
+
+        return get_rule(service_type)
+
+    @classmethod
+    def load_settings(cls):
+        """Get or create billing settings from the database"""
         settings, created = cls.objects.get_or_create(
             id=1,
             defaults={
@@ -380,7 +471,8 @@ class BillingSettings(models.Model):
 
 
 # Signal handlers for automatic wallet creation
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
 
@@ -395,4 +487,15 @@ def create_user_wallet(sender, instance, created, **kwargs):
 def save_user_wallet(sender, instance, **kwargs):
     """Ensure wallet exists for all users"""
     if not hasattr(instance, 'wallet'):
-        UserWallet.objects.create(user=instance)
\ No newline at end of file
+        UserWallet.objects.create(user=instance)
+
+
+@receiver([post_save, post_delete], sender=BillingSettings)
+@receiver([post_save, post_delete], sender=BillingRule)
+def invalidate_billing_config_cache(sender, **kwargs):
+    """Reload cached billing settings and rules in every process"""
+    from . import config_cache
+
+    # This process reloads right away, the others once the change is committed
+    config_cache.clear_local_config()
+    transaction.on_commit(config_cache.invalidate_billing_config)
@@ -1,14 +1,9 @@
 from rest_framework import permissions
 from rest_framework.exceptions import PermissionDenied
 from django.contrib.auth import get_user_model
-from django.utils import timezone
-from django.db.models import Q
 from decimal import Decimal
 
-from .models import (
-    UserWallet, BillingRule, BillingSettings,
-    DoctorViewCharge, WalletTransaction
-)
+from .context import get_billing_context
 from .services import BillingService
 
 User = get_user_model()
@@ -17,28 +12,17 @@ User = get_user_model()
 class BillingPermissionMixin:
     """Mixin for billing-related permission checks"""
 
-    def check_billing_enabled(self):
+    def check_billing_enabled(self, request):
         """Check if billing system is enabled"""
-        settings = BillingSettings.get_settings()
-        if not settings.enable_billing:
-            return False
-
-        if settings.maintenance_mode:
-            return False
+        return get_billing_context(request).billing_active
 
-        return True
-
-    def check_user_wallet_active(self, user):
+    def check_user_wallet_active(self, request):
         """Check if user's wallet is active and not blocked"""
-        try:
-            wallet = user.wallet
-            return not wallet.is_blocked
-        except UserWallet.DoesNotExist:
-            return True  # Will be created automatically
+        return not get_billing_context(request).wallet.is_blocked
 
-    def get_user_daily_usage(self, user):
+    def get_user_daily_usage(self, request):
         """Get user's daily usage statistics"""
-        return BillingService.get_daily_free_views_used(user)
+        return get_billing_context(request).free_views_used
 
 
 class HasSufficientBalance(permissions.BasePermission):
@@ -51,9 +35,10 @@ class HasSufficientBalance(permissions.BasePermission):
         if not request.user.is_authenticated:
             return False
 
+        context = get_billing_context(request)
+
         # Check if billing is enabled
-        settings = BillingSettings.get_settings()
-        if not settings.enable_billing:
+        if not context.settings.enable_billing:
             return True  # Allow access when billing is disabled
 
         # Get service type from view or request
@@ -66,13 +51,12 @@ class HasSufficientBalance(permissions.BasePermission):
 
         try:
             # Get billing rule
-            billing_rule = BillingRule.objects.get(
-                service_type=service_type,
-                is_active=True
-            )
+            billing_rule = context.get_rule(service_type)
+            if billing_rule is None:
+                return True  # No billing rule found, allow access
 
             # Get user wallet
-            wallet, created = UserWallet.objects.get_or_create(user=request.user)
+            wallet = context.wallet
 
             # Check if wallet is blocked
             if wallet.is_blocked:
@@ -90,9 +74,6 @@ class HasSufficientBalance(permissions.BasePermission):
 
             return True
 
-        except BillingRule.DoesNotExist:
-            # No billing rule found, allow access
-            return True
         except Exception:
             # On any error, deny access for security
             return False
@@ -117,7 +98,8 @@ class CanAccessDoctorProfile(permissions.BasePermission):
         access_check = BillingService.can_user_access_service(
             request.user,
             'doctor_view',
-            doctor_id
+            doctor_id,
+            context=get_billing_context(request)
         )
 
         if not access_check['can_access']:
@@ -137,15 +119,10 @@ class HasValidWallet(permissions.BasePermission):
         if not request.user.is_authenticated:
             return False
 
-        try:
-            wallet = request.user.wallet
-            if wallet.is_blocked:
-                self.message = "Your wallet is blocked. Please contact support."
-                return False
-            return True
-        except UserWallet.DoesNotExist:
-            # Wallet will be created automatically
-            return True
+        if get_billing_context(request).wallet.is_blocked:
+            self.message = "Your wallet is blocked. Please contact support."
+            return False
+        return True
 
 
 class CanPerformWalletAction(permissions.BasePermission):
@@ -158,20 +135,17 @@ class CanPerformWalletAction(permissions.BasePermission):
         if not request.user.is_authenticated:
             return False
 
+        context = get_billing_context(request)
+
         # Check billing settings
-        settings = BillingSettings.get_settings()
-        if settings.maintenance_mode:
+        if context.settings.maintenance_mode:
             self.message = "Billing system is under maintenance"
             return False
 
         # Check wallet status
-        try:
-            wallet = request.user.wallet
-            if wallet.is_blocked:
-                self.message = "Your wallet is blocked"
-                return False
-        except UserWallet.DoesNotExist:
-            pass  # Will be created
+        if context.wallet.is_blocked:
+            self.message = "Your wallet is blocked"
+            return False
 
         return True
 
@@ -232,17 +206,8 @@ class RateLimitedBillingAccess(permissions.BasePermission):
         if not request.user.is_authenticated:
             return False
 
-        # Get time window
-        time_threshold = timezone.now() - timezone.timedelta(
-            minutes=self.time_window_minutes
-        )
-
         # Count recent billing transactions
-        recent_transactions = WalletTransaction.objects.filter(
-            wallet__user=request.user,
-            created_at__gte=time_threshold,
-            transaction_type='debit'
-        ).count()
+        recent_transactions = get_billing_context(request).recent_debit_count(self.time_window_minutes)
 
         if recent_transactions >= self.max_requests:
             self.message = f"Too many billing operations. Limit: {self.max_requests} per {self.time_window_minutes} minutes"
@@ -321,33 +286,25 @@ class FreeViewQuotaPermission(permissions.BasePermission):
         if not request.user.is_authenticated:
             return False
 
+        context = get_billing_context(request)
+
         # Check billing settings
-        settings = BillingSettings.get_settings()
-        if not settings.enable_billing:
+        if not context.settings.enable_billing:
             return True  # Always allow when billing disabled
 
         # Check free views used today
-        free_views_used = BillingService.get_daily_free_views_used(request.user)
-
-        if free_views_used >= settings.free_views_per_day:
+        if context.free_views_used >= context.settings.free_views_per_day:
             # Check if user has sufficient balance for paid access
-            try:
-                billing_rule = BillingRule.objects.get(
-                    service_type='doctor_view',
-                    is_active=True
-                )
-
-                wallet, created = UserWallet.objects.get_or_create(user=request.user)
-                required_amount = billing_rule.get_effective_price()
-
-                if not wallet.has_sufficient_balance(required_amount):
-                    self.message = f"Free quota exceeded and insufficient balance. Required: {required_amount} so'm"
-                    return False
-
-            except BillingRule.DoesNotExist:
+            billing_rule = context.get_rule('doctor_view')
+            if billing_rule is None:
                 self.message = "Free quota exceeded and no billing rule configured"
                 return False
 
+            required_amount = billing_rule.get_effective_price()
+            if not context.wallet.has_sufficient_balance(required_amount):
+                self.message = f"Free quota exceeded and insufficient balance. Required: {required_amount} so'm"
+                return False
+
         return True
 
 
@@ -363,20 +320,18 @@ class ServiceTypePermission(permissions.BasePermission):
         if not request.user.is_authenticated:
             return False
 
+        context = get_billing_context(request)
+
         # Check if service is available
-        try:
-            billing_rule = BillingRule.objects.get(
-                service_type=self.service_type,
-                is_active=True
-            )
-        except BillingRule.DoesNotExist:
+        if context.get_rule(self.service_type) is None:
             self.message = f"Service {self.service_type} is not available"
             return False
 
         # Check user access
         access_check = BillingService.can_user_access_service(
             request.user,
-            self.service_type
+            self.service_type,
+            context=context
         )
 
         if not access_check['can_access']:
@@ -424,12 +379,8 @@ class MinimumBalancePermission(permissions.BasePermission):
         if not request.user.is_authenticated:
             return False
 
-        try:
-            wallet = request.user.wallet
-            if wallet.balance < self.minimum_balance:
-                return False
-        except UserWallet.DoesNotExist:
-            return False  # No wallet, no balance
+        if get_billing_context(request).wallet.balance < self.minimum_balance:
+            return False
 
         return True
 
@@ -441,14 +392,12 @@ class BillingMaintenancePermission(permissions.BasePermission):
 
     def has_permission(self, request, view):
         """Check if billing system is not in maintenance mode"""
-        settings = BillingSettings.get_settings()
-
         # Allow superusers even in maintenance mode
         if request.user.is_superuser:
             return True
 
         # Check maintenance mode
-        if settings.maintenance_mode:
+        if get_billing_context(request).settings.maintenance_mode:
             return False
 
         return True
@@ -466,24 +415,9 @@ class DailyLimitPermission(permissions.BasePermission):
         if not request.user.is_authenticated:
             return False
 
-        # Calculate today's spending
-        today = timezone.now().date()
-
-        try:
-            wallet = request.user.wallet
-            today_spending = wallet.transactions.filter(
-                created_at__date=today,
-                transaction_type='debit',
-                status='completed'
-            ).aggregate(
-                total=models.Sum('amount')
-            )['total'] or Decimal('0.00')
-
-            if today_spending >= self.daily_limit:
-                return False
-
-        except UserWallet.DoesNotExist:
-            pass  # No wallet, no spending
+        # Today's spending
+        if get_billing_context(request).spent_today >= self.daily_limit:
+            return False
 
         return True
 
@@ -520,18 +454,15 @@ class ComprehensiveBillingPermission(permissions.BasePermission):
         if not request.user.is_authenticated:
             return False
 
+        context = get_billing_context(request)
+
         # Check billing system status
-        settings = BillingSettings.get_settings()
-        if settings.maintenance_mode and not request.user.is_superuser:
+        if context.settings.maintenance_mode and not request.user.is_superuser:
             return False
 
         # Check wallet status
-        try:
-            wallet = request.user.wallet
-            if wallet.is_blocked:
-                return False
-        except UserWallet.DoesNotExist:
-            pass  # Will be created automatically
+        if context.wallet.is_blocked:
+            return False
 
         # Check user account status
         if not request.user.is_active:
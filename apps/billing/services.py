@@ -4,8 +4,10 @@ from django.contrib.auth import get_user_model
 from decimal import Decimal
 from datetime import timedelta
 
+from . import free_views
+from .context import BillingContext
 from .models import (
-    UserWallet, BillingRule, DoctorViewCharge,
+    UserWallet, BillingRule,
     BillingSettings, WalletTransaction
 )
 from apps.doctors.models import ChargeLog
@@ -19,37 +21,18 @@ class BillingService:
     @staticmethod
     def get_daily_free_views_used(user):
         """Get number of free views used today by user"""
-        today = timezone.now().date()
-
-        # Count free views (stored as special transactions)
-        free_views = WalletTransaction.objects.filter(
-            wallet__user=user,
-            created_at__date=today,
-            description__icontains='free view'
-        ).count()
-
-        return free_views
+        return free_views.used(user)
 
     @staticmethod
-    def record_free_view(user, doctor_id):
-        """Record a free view usage"""
-        wallet, created = UserWallet.objects.get_or_create(user=user)
-
-        # Create a zero-amount transaction to track free usage
-        WalletTransaction.objects.create(
-            wallet=wallet,
-            transaction_type='debit',
-            amount=Decimal('0.00'),
-            balance_before=wallet.balance,
-            balance_after=wallet.balance,
-            description=f'Free view - Doctor ID: {doctor_id}',
-            status='completed'
-        )
+    def record_free_view(user, doctor_id=None):
+        """Record a free view usage; False when today's quota is exhausted"""
+        return free_views.consume(user)
 
     @staticmethod
-    def can_user_access_service(user, service_type, object_id=None):
+    def can_user_access_service(user, service_type, object_id=None, context=None):
         """Check if user can access a service (free or paid)"""
-        settings = BillingSettings.get_settings()
+        context = context or BillingContext(user)
+        settings = context.settings
 
         # Check if billing is disabled
         if not settings.enable_billing:
@@ -69,54 +52,43 @@ class BillingService:
 
         # Special handling for doctor views
         if service_type == 'doctor_view' and object_id:
-            return BillingService._check_doctor_view_access(user, object_id, settings)
+            return BillingService._check_doctor_view_access(context, object_id)
 
         # Check for other services
-        try:
-            billing_rule = BillingRule.objects.get(
-                service_type=service_type,
-                is_active=True
-            )
-
-            wallet, created = UserWallet.objects.get_or_create(user=user)
-            required_amount = billing_rule.get_effective_price()
-
-            if wallet.has_sufficient_balance(required_amount):
-                return {
-                    'can_access': True,
-                    'reason': 'sufficient_balance',
-                    'charge_required': True,
-                    'required_amount': required_amount
-                }
-            else:
-                return {
-                    'can_access': False,
-                    'reason': 'insufficient_balance',
-                    'charge_required': True,
-                    'required_amount': required_amount,
-                    'current_balance': wallet.balance
-                }
-
-        except BillingRule.DoesNotExist:
+        billing_rule = context.get_rule(service_type)
+        if billing_rule is None:
             return {
                 'can_access': False,
                 'reason': 'billing_rule_not_found',
                 'charge_required': False
             }
 
+        wallet = context.wallet
+        required_amount = billing_rule.get_effective_price()
+
+        if wallet.has_sufficient_balance(required_amount):
+            return {
+                'can_access': True,
+                'reason': 'sufficient_balance',
+                'charge_required': True,
+                'required_amount': required_amount
+            }
+        else:
+            return {
+                'can_access': False,
+                'reason': 'insufficient_balance',
+                'charge_required': True,
+                'required_amount': required_amount,
+                'current_balance': wallet.balance
+            }
+
     @staticmethod
-    def _check_doctor_view_access(user, doctor_id, settings):
+    def _check_doctor_view_access(context, doctor_id):
         """Check doctor view access specifically"""
-        today = timezone.now().date()
+        settings = context.settings
 
         # Check if already viewed today
-        already_viewed = DoctorViewCharge.objects.filter(
-            user=user,
-            doctor_id=doctor_id,
-            created_at__date=today
-        ).exists()
-
-        if already_viewed:
+        if context.viewed_doctor_today(doctor_id):
             return {
                 'can_access': True,
                 'reason': 'already_viewed_today',
@@ -124,7 +96,7 @@ class BillingService:
             }
 
         # Check free views
-        free_views_used = BillingService.get_daily_free_views_used(user)
+        free_views_used = context.free_views_used
         if free_views_used < settings.free_views_per_day:
             return {
                 'can_access': True,
@@ -135,67 +107,62 @@ class BillingService:
             }
 
         # Check paid access
-        try:
-            billing_rule = BillingRule.objects.get(
-                service_type='doctor_view',
-                is_active=True
-            )
-
-            wallet, created = UserWallet.objects.get_or_create(user=user)
-            required_amount = billing_rule.get_effective_price()
-
-            return {
-                'can_access': wallet.has_sufficient_balance(required_amount),
-                'reason': 'payment_required',
-                'charge_required': True,
-                'required_amount': required_amount,
-                'current_balance': wallet.balance
-            }
-
-        except BillingRule.DoesNotExist:
+        billing_rule = context.get_rule('doctor_view')
+        if billing_rule is None:
             return {
                 'can_access': False,
                 'reason': 'billing_rule_not_found',
                 'charge_required': False
             }
 
+        wallet = context.wallet
+        required_amount = billing_rule.get_effective_price()
+
+        return {
+            'can_access': wallet.has_sufficient_balance(required_amount),
+            'reason': 'payment_required',
+            'charge_required': True,
+            'required_amount': required_amount,
+            'current_balance': wallet.balance
+        }
+
     @staticmethod
-    def charge_for_service(user, service_type, object_id=None, quantity=1):
+    def charge_for_service(user, service_type, object_id=None, quantity=1, context=None):
         """Charge user for a service"""
-        try:
-            billing_rule = BillingRule.objects.get(
-                service_type=service_type,
-                is_active=True
-            )
+        context = context or BillingContext(user)
 
-            wallet, created = UserWallet.objects.get_or_create(user=user)
+        billing_rule = context.get_rule(service_type)
+        if billing_rule is None:
+            raise ValueError("Billing rule not found")
 
-            # Calculate total amount
-            price_per_unit = billing_rule.get_effective_price(quantity)
-            total_amount = price_per_unit * quantity
+        wallet = context.wallet
+        if wallet.pk is None:
+            wallet, created = UserWallet.objects.get_or_create(user=user)
 
-            # Check balance
-            if not wallet.has_sufficient_balance(total_amount):
-                raise ValueError("Insufficient balance")
+        # Calculate total amount
+        price_per_unit = billing_rule.get_effective_price(quantity)
+        total_amount = price_per_unit * quantity
 
-            # Deduct amount
-            description = f"{billing_rule.get_service_type_display()}"
-            if object_id:
-                description += f" (ID: {object_id})"
-            if quantity > 1:
-                description += f" x{quantity}"
+        # Check balance
+        if not wallet.has_sufficient_balance(total_amount):
+            raise ValueError("Insufficient balance")
 
-            wallet.deduct_balance(total_amount, description)
+        # Deduct amount
+        description = f"{billing_rule.get_service_type_display()}"
+        if object_id:
+            description += f" (ID: {object_id})"
+        if quantity > 1:
+            description += f" x{quantity}"
 
-            return {
-                'success': True,
-                'amount_charged': total_amount,
-                'new_balance': wallet.balance,
-                'transaction_id': wallet.transactions.first().id
-            }
+        transaction = wallet.deduct_balance(total_amount, description)
+        context.refresh()
 
-        except BillingRule.DoesNotExist:
-            raise ValueError("Billing rule not found")
+        return {
+            'success': True,
+            'amount_charged': total_amount,
+            'new_balance': transaction.balance_after,
+            'transaction_id': transaction.id
+        }
 
     @staticmethod
     def get_user_billing_summary(user, days=30):
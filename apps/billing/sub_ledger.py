@@ -0,0 +1,296 @@
+"""
+Deferred settlement of doctor micro-charges.
+
+Search, card-view and phone-view charges debit the doctor's UserWallet many
+times a minute. Debiting the row directly makes it a lock hot spot (one row
+lock per charge on PostgreSQL, the whole database on SQLite). With the
+sub-ledger enabled a charge is one INSERT into PendingCharge instead:
+
+    request path:  1 SELECT wallet + 1 SUM(pending)   - no locks
+                   1 INSERT PendingCharge (bulk for a search page)
+    settlement:    claim a batch of pending rows (one UPDATE),
+                   lock the affected wallets, apply the charges in order,
+                   one ledger UPDATE for all wallets, one summary
+                   WalletTransaction per wallet, bulk INSERT ChargeLog /
+                   DoctorViewCharge,
+                   DELETE the settled rows - all in one transaction.
+
+Over-spend protection:
+    - requests check ``available balance = balance - pending`` before
+      deferring a charge;
+    - settlement re-checks every charge against the locked wallet balance
+      and drops the ones that no longer fit (two requests may race past the
+      first check), so the wallet balance never goes negative;
+    - a doctor whose available balance drops to DOCTOR_BLOCK_BALANCE is
+      blocked when the charge is deferred, not only at settlement, so they
+      stop collecting charges right away.
+
+Settlement runs on a background timer every SETTLE_INTERVAL seconds in the
+process that deferred charges, and from ``manage.py settle_pending_charges``
+(``--loop`` for a dedicated worker). Claiming rows with an UPDATE makes
+concurrent settlements safe.
+
+Configuration (settings.BILLING_SUB_LEDGER, all keys optional):
+    {
+        'ENABLED': False,
+        'SETTLE_INTERVAL': 30,
+        'BATCH_SIZE': 2000,
+    }
+
+ChargeLog rows are written at settlement, so statistics lag by up to
+SETTLE_INTERVAL seconds.
+"""
+import logging
+import threading
+import uuid
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Sum
+
+from . import ledger
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': False,
+    'SETTLE_INTERVAL': 30,
+    'BATCH_SIZE': 2000,
+}
+
+# Doctors are blocked at or below this balance (see Doctor.check_and_update_block_status)
+DOCTOR_BLOCK_BALANCE = 5000
+
+
+def get_sub_ledger_settings():
+    """Return BILLING_SUB_LEDGER settings merged with defaults"""
+    return {**DEFAULTS, **getattr(settings, 'BILLING_SUB_LEDGER', {})}
+
+
+def is_enabled():
+    return get_sub_ledger_settings()['ENABLED']
+
+
+def get_pending_totals(wallet_ids):
+    """
+    Unsettled charges per wallet.
+
+    Returns:
+        dict: {wallet_id: Decimal}
+    """
+    from .models import PendingCharge
+
+    return dict(
+        PendingCharge.objects.filter(wallet_id__in=list(wallet_ids))
+        .values('wallet_id')
+        .annotate(total=Sum('amount'))
+        .values_list('wallet_id', 'total')
+    )
+
+
+def get_available_balance(wallet):
+    """Wallet balance minus unsettled charges"""
+    if not is_enabled():
+        return wallet.balance
+    return wallet.balance - get_pending_totals([wallet.id]).get(wallet.id, Decimal('0'))
+
+
+def defer_charges(charges, pending_totals=None):
+    """
+    Append charges to the sub-ledger and schedule their settlement.
+
+    Args:
+        charges: Unsaved PendingCharge instances, already checked against
+                 the available balance
+        pending_totals: get_pending_totals() of the charged wallets, read
+                        for that check (None - read again after the insert)
+    """
+    from .models import PendingCharge
+
+    if not charges:
+        return
+    PendingCharge.objects.bulk_create(charges)
+
+    wallets = {charge.wallet_id: charge.wallet for charge in charges}
+    if pending_totals is None:
+        pending = get_pending_totals(wallets)
+    else:
+        pending = {wallet_id: pending_totals.get(wallet_id, Decimal('0')) for wallet_id in wallets}
+        for charge in charges:
+            pending[charge.wallet_id] += charge.amount
+    _block_low_balance_doctors(wallets.values(), pending)
+    _get_scheduler().schedule()
+
+
+def _block_low_balance_doctors(wallets, pending):
+    """Block doctors whose available balance reached DOCTOR_BLOCK_BALANCE"""
+    from apps.doctors.models import Doctor
+
+    user_ids = [
+        wallet.user_id for wallet in wallets
+        if wallet.balance - pending.get(wallet.id, Decimal('0')) <= DOCTOR_BLOCK_BALANCE
+    ]
+    if user_ids:
+        Doctor.objects.filter(user_id__in=user_ids, is_blocked=False).update(
+            is_blocked=True, is_available=False
+        )
+
+
+def settle_pending_charges(batch_size=None):
+    """
+    Settle all pending charges into the wallets.
+
+    Returns:
+        tuple: (settled charges, dropped charges)
+    """
+    batch_size = batch_size or get_sub_ledger_settings()['BATCH_SIZE']
+    settled = dropped = 0
+    while True:
+        batch_settled, batch_dropped = _settle_batch(batch_size)
+        if not batch_settled and not batch_dropped:
+            break
+        settled += batch_settled
+        dropped += batch_dropped
+    return settled, dropped
+
+
+def _settle_batch(batch_size):
+    from apps.doctors.models import ChargeLog, Doctor
+    from apps.doctors.services.charge_rollup import record_charge_logs
+
+    from .models import DoctorViewCharge, PendingCharge, UserWallet
+
+    with transaction.atomic():
+        # Claim the oldest unclaimed rows; a concurrent settlement skips them
+        settlement_id = uuid.uuid4()
+        batch_ids = list(
+            PendingCharge.objects.filter(settlement_id__isnull=True)
+            .order_by('id').values_list('id', flat=True)[:batch_size]
+        )
+        if not batch_ids:
+            return 0, 0
+        PendingCharge.objects.filter(
+            id__in=batch_ids, settlement_id__isnull=True
+        ).update(settlement_id=settlement_id)
+
+        pending_by_wallet = defaultdict(list)
+        for charge in PendingCharge.objects.filter(settlement_id=settlement_id).order_by('id'):
+            pending_by_wallet[charge.wallet_id].append(charge)
+
+        wallets = UserWallet.objects.select_for_update().in_bulk(list(pending_by_wallet))
+
+        entries = []
+        accepted_by_wallet = []
+        dropped = 0
+        low_balance_users = []
+
+        for wallet_id, charges in pending_by_wallet.items():
+            wallet = wallets[wallet_id]
+            balance = wallet.balance
+            total = Decimal('0')
+            wallet_accepted = []
+            for charge in charges:
+                if wallet.is_blocked or balance - total < charge.amount:
+                    dropped += 1
+                    continue
+                total += charge.amount
+                wallet_accepted.append(charge)
+
+            if not wallet_accepted:
+                continue
+
+            entries.append(ledger.LedgerEntry(
+                wallet_id, 'debit', total, f"Deferred charges ({len(wallet_accepted)})"
+            ))
+            accepted_by_wallet.append(wallet_accepted)
+
+            if balance - total <= DOCTOR_BLOCK_BALANCE:
+                low_balance_users.append(wallet.user_id)
+
+        # One summary transaction per wallet; the wallets are locked, so every entry fits
+        accepted = [
+            (charge, wallet_transaction)
+            for wallet_accepted, wallet_transaction in zip(accepted_by_wallet, ledger.post(entries))
+            for charge in wallet_accepted
+        ]
+
+        charge_logs = [
+            ChargeLog(
+                doctor_id=charge.doctor_id,
+                charge_type=charge.charge_type,
+                amount=charge.amount,
+                user_id=charge.viewer_id,
+                ip_address=charge.ip_address,
+                user_agent=charge.user_agent,
+                metadata={**charge.metadata, 'charged_at': charge.created_at.isoformat()}
+            )
+            for charge, _ in accepted if charge.doctor_id
+        ]
+        ChargeLog.objects.bulk_create(charge_logs)
+        record_charge_logs(charge_logs)
+
+        DoctorViewCharge.objects.bulk_create([
+            DoctorViewCharge(
+                user_id=charge.viewer_id,
+                doctor_id=charge.doctor_id,
+                transaction=wallet_transaction,
+                amount_charged=charge.amount,
+                ip_address=charge.ip_address
+            )
+            for charge, wallet_transaction in accepted
+            if charge.track_view and charge.viewer_id and charge.doctor_id
+        ], ignore_conflicts=True)
+
+        if low_balance_users:
+            Doctor.objects.filter(user_id__in=low_balance_users, is_blocked=False).update(
+                is_blocked=True, is_available=False
+            )
+
+        PendingCharge.objects.filter(settlement_id=settlement_id).delete()
+
+    if dropped:
+        logger.warning(f"Dropped {dropped} deferred charges exceeding the wallet balance")
+    return len(accepted), dropped
+
+
+class _SettlementScheduler:
+    """Settles pending charges on a background timer (one per process)"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def schedule(self):
+        with self._lock:
+            if self._timer is not None and self._timer.is_alive():
+                return
+            self._timer = threading.Timer(self.interval, self._settle)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _settle(self):
+        try:
+            settle_pending_charges()
+        except Exception as e:
+            # Rows stay pending and are settled by the next run
+            logger.error(f"Deferred charge settlement failed: {e}")
+        finally:
+            # Background threads own their DB connections
+            connections.close_all()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def _get_scheduler():
+    global _scheduler
+
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = _SettlementScheduler(get_sub_ledger_settings()['SETTLE_INTERVAL'])
+    return _scheduler
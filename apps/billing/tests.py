@@ -1,3 +1,314 @@
-from django.test import TestCase
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+
+from apps.billing import ledger, sub_ledger
+from apps.billing.models import PendingCharge, UserWallet, WalletTransaction
+from apps.doctors.models import ChargeLog, Doctor
+
+User = get_user_model()
+
+SUB_LEDGER_ON = {'ENABLED': True, 'SETTLE_INTERVAL': 3600, 'BATCH_SIZE': 2}
+
+
+def create_doctor(phone, balance):
+    user = User.objects.create(phone=phone, first_name='Test', last_name='Doctor', user_type='doctor')
+    UserWallet.objects.filter(user=user).update(balance=balance)
+    return Doctor.objects.create(
+        user=user,
+        specialty='terapevt',
+        experience=5,
+        education='Tashkent Medical Academy',
+        workplace='City Hospital',
+        consultation_price=50000,
+        verification_status='approved'
+    )
+
+
+@override_settings(BILLING_SUB_LEDGER=SUB_LEDGER_ON)
+class SubLedgerTestCase(TestCase):
+    def setUp(self):
+        self.doctor = create_doctor('+998901000001', Decimal('20000'))
+        self.wallet = UserWallet.objects.get(user=self.doctor.user)
+
+    def pending(self, amount, count=1):
+        return [
+            PendingCharge(wallet=self.wallet, doctor=self.doctor, charge_type='search', amount=amount)
+            for _ in range(count)
+        ]
+
+    def test_settle_drops_over_committed_charges(self):
+        """Charges that no longer fit the locked balance are dropped at settlement"""
+        # Two requests raced past the available-balance check
+        PendingCharge.objects.bulk_create(self.pending(Decimal('6000'), count=4))
+
+        settled, dropped = sub_ledger.settle_pending_charges()
+
+        self.assertEqual((settled, dropped), (3, 1))
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal('2000'))
+        self.assertEqual(self.wallet.total_spent, Decimal('18000'))
+        self.assertEqual(PendingCharge.objects.count(), 0)
+        self.assertEqual(ChargeLog.objects.filter(doctor=self.doctor).count(), 3)
+        # Batches of two: one summary transaction per wallet and batch
+        self.assertEqual(WalletTransaction.objects.filter(wallet=self.wallet).count(), 2)
+
+    def test_settle_blocks_low_balance_doctor(self):
+        """A doctor left at or below the block balance is blocked at settlement"""
+        PendingCharge.objects.bulk_create(self.pending(Decimal('15000')))
+
+        sub_ledger.settle_pending_charges()
+
+        self.doctor.refresh_from_db()
+        self.assertTrue(self.doctor.is_blocked)
+        self.assertFalse(self.doctor.is_available)
+
+    def test_settle_skips_blocked_wallet(self):
+        """Charges of a blocked wallet are dropped"""
+        UserWallet.objects.filter(pk=self.wallet.pk).update(is_blocked=True)
+        PendingCharge.objects.bulk_create(self.pending(Decimal('500'), count=2))
+
+        self.assertEqual(sub_ledger.settle_pending_charges(), (0, 2))
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal('20000'))
+
+    def test_defer_blocks_doctor_immediately(self):
+        """The doctor is blocked as soon as the available balance reaches the block balance"""
+        sub_ledger.defer_charges(self.pending(Decimal('10000')))
+        self.doctor.refresh_from_db()
+        self.assertFalse(self.doctor.is_blocked)
+
+        sub_ledger.defer_charges(self.pending(Decimal('5000')))
+        self.doctor.refresh_from_db()
+        self.assertTrue(self.doctor.is_blocked)
+        self.assertFalse(self.doctor.is_available)
+
+        # Nothing is settled yet
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal('20000'))
+        self.assertEqual(sub_ledger.get_available_balance(self.wallet), Decimal('5000'))
+
+    def test_defer_with_known_pending_totals(self):
+        """Totals read for the balance check are reused instead of summing the sub-ledger again"""
+        PendingCharge.objects.bulk_create(self.pending(Decimal('10000')))
+        totals = sub_ledger.get_pending_totals([self.wallet.id])
+
+        with CaptureQueriesContext(connection) as queries:
+            sub_ledger.defer_charges(self.pending(Decimal('5000')), pending_totals=totals)
+
+        self.assertFalse([query for query in queries if 'SUM(' in query['sql']])
+        self.doctor.refresh_from_db()
+        self.assertTrue(self.doctor.is_blocked)
+
+
+class LedgerTestCase(TestCase):
+    def setUp(self):
+        self.wallet = self.create_wallet('+998901000101', Decimal('1000'))
+        self.other_wallet = self.create_wallet('+998901000102', Decimal('300'))
+
+    @staticmethod
+    def create_wallet(phone, balance):
+        user = User.objects.create(phone=phone, first_name='Test', last_name='User')
+        UserWallet.objects.filter(user=user).update(balance=balance)
+        return UserWallet.objects.get(user=user)
+
+    def assertBalance(self, wallet, balance):
+        wallet.refresh_from_db()
+        self.assertEqual(wallet.balance, balance)
+
+    def test_debit(self):
+        transaction = ledger.debit(self.wallet.id, Decimal('400'), 'Card view charge')
+
+        self.assertEqual(transaction.balance_before, Decimal('1000.00'))
+        self.assertEqual(transaction.balance_after, Decimal('600.00'))
+        self.assertBalance(self.wallet, Decimal('600'))
+        self.assertEqual(self.wallet.total_spent, Decimal('400'))
+
+    def test_debit_insufficient_balance(self):
+        with self.assertRaises(ledger.InsufficientBalance):
+            ledger.debit(self.wallet.id, Decimal('1000.01'))
+
+        self.assertBalance(self.wallet, Decimal('1000'))
+        self.assertFalse(WalletTransaction.objects.exists())
+
+    def test_debit_blocked_wallet(self):
+        UserWallet.objects.filter(pk=self.wallet.pk).update(is_blocked=True)
+
+        with self.assertRaises(ledger.InsufficientBalance):
+            ledger.debit(self.wallet.id, Decimal('1'))
+        self.assertBalance(self.wallet, Decimal('1000'))
+
+        # Credits still reach a blocked wallet
+        ledger.credit(self.wallet.id, Decimal('500'))
+        self.assertBalance(self.wallet, Decimal('1500'))
+
+    def test_post_rolls_back_batch(self):
+        entries = [
+            ledger.LedgerEntry(self.wallet.id, 'debit', Decimal('500')),
+            ledger.LedgerEntry(self.other_wallet.id, 'debit', Decimal('500')),
+        ]
+        with self.assertRaises(ledger.InsufficientBalance):
+            ledger.post(entries)
+
+        self.assertBalance(self.wallet, Decimal('1000'))
+        self.assertFalse(WalletTransaction.objects.exists())
+
+    def test_post_partial(self):
+        """Debits that do not fit are skipped, the rest is applied"""
+        results = ledger.post([
+            ledger.LedgerEntry(self.wallet.id, 'debit', Decimal('500')),
+            ledger.LedgerEntry(self.other_wallet.id, 'debit', Decimal('500')),
+            ledger.LedgerEntry(self.other_wallet.id, 'credit', Decimal('100')),
+        ], partial=True)
+
+        self.assertIsNotNone(results[0])
+        self.assertIsNone(results[1])
+        self.assertEqual(results[2].balance_after, Decimal('400.00'))
+        self.assertBalance(self.wallet, Decimal('500'))
+        self.assertBalance(self.other_wallet, Decimal('400'))
+        self.assertEqual(WalletTransaction.objects.count(), 2)
+
+    def test_post_same_wallet_rounds(self):
+        """Entries on the same wallet are applied in order, one round each"""
+        results = ledger.post([
+            ledger.LedgerEntry(self.wallet.id, 'debit', Decimal('600')),
+            ledger.LedgerEntry(self.other_wallet.id, 'debit', Decimal('100')),
+            ledger.LedgerEntry(self.wallet.id, 'debit', Decimal('600')),
+            ledger.LedgerEntry(self.wallet.id, 'credit', Decimal('200')),
+            ledger.LedgerEntry(self.wallet.id, 'debit', Decimal('500')),
+        ], partial=True)
+
+        self.assertEqual(
+            [result and result.balance_after for result in results],
+            [Decimal('400.00'), Decimal('200.00'), None, Decimal('600.00'), Decimal('100.00')]
+        )
+        self.assertBalance(self.wallet, Decimal('100'))
+        self.assertEqual(self.wallet.total_spent, Decimal('1100'))
+        self.assertEqual(self.wallet.total_topped_up, Decimal('200'))
+
+    def test_post_without_update_returning(self):
+        """Backends without UPDATE ... RETURNING lock and check in Python"""
+        with mock.patch.object(ledger, '_supports_update_returning', return_value=False):
+            results = ledger.post([
+                ledger.LedgerEntry(self.wallet.id, 'debit', Decimal('600')),
+                ledger.LedgerEntry(self.wallet.id, 'debit', Decimal('600')),
+                ledger.LedgerEntry(self.other_wallet.id, 'credit', Decimal('50')),
+            ], partial=True)
+
+            with self.assertRaises(ledger.InsufficientBalance):
+                ledger.debit(self.wallet.id, Decimal('500'))
+
+        self.assertEqual(results[0].balance_after, Decimal('400.00'))
+        self.assertIsNone(results[1])
+        self.assertEqual(results[2].balance_after, Decimal('350.00'))
+        self.assertBalance(self.wallet, Decimal('400'))
+        self.assertBalance(self.other_wallet, Decimal('350'))
+
+
+class BillingContextTestCase(TestCase):
+    def test_wallet_lookup_is_read_only(self):
+        """A user without a wallet gets an unsaved default; no row is written"""
+        from apps.billing.context import BillingContext
+
+        user = User.objects.create(phone='+998901000201', first_name='Test', last_name='User')
+        UserWallet.objects.filter(user=user).delete()
+
+        wallet = BillingContext(user).wallet
+
+        self.assertIsNone(wallet.pk)
+        self.assertEqual(wallet.balance, Decimal('0'))
+        self.assertFalse(wallet.is_blocked)
+        self.assertEqual(wallet.free_views_today, 0)
+        self.assertFalse(UserWallet.objects.filter(user=user).exists())
+
+
+class FreeViewQuotaTestCase(TestCase):
+    def setUp(self):
+        from apps.billing.models import FreeViewQuota
+
+        self.quota_model = FreeViewQuota
+        self.user = User.objects.create(phone='+998901000301', first_name='Test', last_name='User')
+
+    def test_consume_until_limit(self):
+        from apps.billing import free_views
+
+        self.assertEqual([free_views.consume(self.user, limit=2) for _ in range(3)], [True, True, False])
+        self.assertEqual(free_views.used(self.user), 2)
+        self.assertEqual(free_views.remaining(self.user, limit=2), 0)
+        self.assertEqual(self.quota_model.objects.filter(user=self.user).count(), 1)
+
+    def test_consume_zero_limit(self):
+        from apps.billing import free_views
+
+        self.assertFalse(free_views.consume(self.user, limit=0))
+        self.assertFalse(self.quota_model.objects.exists())
+
+    def test_consume_when_row_created_concurrently(self):
+        """The first view of the day lost the INSERT race: the conditional UPDATE is retried"""
+        from django.db.models.query import QuerySet
+
+        from apps.billing import free_views
+
+        update = QuerySet.update
+
+        def consume_racing(used_by_other_request):
+            # The other request inserts today's row right after our first UPDATE missed it
+            self.quota_model.objects.all().delete()
+            calls = []
+
+            def racing_update(queryset, **kwargs):
+                calls.append(kwargs)
+                if len(calls) == 1:
+                    self.quota_model.objects.create(
+                        user=self.user, date=free_views._today(), used=used_by_other_request
+                    )
+                    return 0
+                return update(queryset, **kwargs)
+
+            with mock.patch.object(QuerySet, 'update', autospec=True, side_effect=racing_update):
+                return free_views.consume(self.user, limit=2)
+
+        self.assertTrue(consume_racing(1))
+        self.assertEqual(free_views.used(self.user), 2)
+
+        self.assertFalse(consume_racing(2))
+        self.assertEqual(free_views.used(self.user), 2)
+
+
+class BillingRuleLookupTestCase(TestCase):
+    def setUp(self):
+        from rest_framework.test import APIClient
+
+        from apps.billing import config_cache
+
+        config_cache.clear_local_config()
+        self.user = User.objects.create(phone='+998901000401', first_name='Test', last_name='User')
+        UserWallet.objects.filter(user=self.user).update(balance=Decimal('1500'))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def check_balance(self, service_type):
+        return self.client.post('/api/v1/billing/check-balance/', {'service_type': service_type}, format='json')
+
+    def test_missing_rule(self):
+        response = self.check_balance('consultation')
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.data['success'])
+
+    def test_rule_read_from_config_cache(self):
+        from apps.billing.models import BillingRule
+
+        BillingRule.objects.create(service_type='consultation', price=Decimal('1000'))
+        self.check_balance('consultation')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.check_balance('consultation')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['has_sufficient_balance'])
+        self.assertEqual(response.data['required_amount'], Decimal('1000'))
+        self.assertFalse([query for query in queries if 'billing_billingrule' in query['sql']])
@@ -12,6 +12,8 @@ from rest_framework.views import APIView
 
 from apps.doctors.models import Doctor
 
+from . import free_views
+from .config_cache import get_rule
 from .models import BillingRule, BillingSettings, DoctorViewCharge, UserWallet
 from .serializers import (
     BillingRuleSerializer,
@@ -77,31 +79,26 @@ class CheckBalanceView(APIView):
                 'error': 'service_type is required'
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            billing_rule = BillingRule.objects.get(
-                service_type=service_type,
-                is_active=True
-            )
-
-            wallet = get_object_or_404(UserWallet, user=request.user)
-            required_amount = billing_rule.get_effective_price(quantity) * quantity
-
-            has_balance = wallet.has_sufficient_balance(required_amount)
-
-            return Response({
-                'success': True,
-                'has_sufficient_balance': has_balance,
-                'current_balance': wallet.balance,
-                'required_amount': required_amount,
-                'service_price': billing_rule.get_effective_price(quantity)
-            })
-
-        except BillingRule.DoesNotExist:
+        billing_rule = get_rule(service_type)
+        if billing_rule is None:
             return Response({
                 'success': False,
                 'error': 'Billing rule not found for this service'
             }, status=status.HTTP_404_NOT_FOUND)
 
+        wallet = get_object_or_404(UserWallet, user=request.user)
+        required_amount = billing_rule.get_effective_price(quantity) * quantity
+
+        has_balance = wallet.has_sufficient_balance(required_amount)
+
+        return Response({
+            'success': True,
+            'has_sufficient_balance': has_balance,
+            'current_balance': wallet.balance,
+            'required_amount': required_amount,
+            'service_price': billing_rule.get_effective_price(quantity)
+        })
+
 
 class ChargeForServiceView(APIView):
     """Charge user for a service"""
@@ -119,14 +116,16 @@ class ChargeForServiceView(APIView):
                 'error': 'service_type is required'
             }, status=status.HTTP_400_BAD_REQUEST)
 
+        # Get billing rule
+        billing_rule = get_rule(service_type)
+        if billing_rule is None:
+            return Response({
+                'success': False,
+                'error': 'Billing rule not found for this service'
+            }, status=status.HTTP_404_NOT_FOUND)
+
         try:
             with transaction.atomic():
-                # Get billing rule
-                billing_rule = BillingRule.objects.get(
-                    service_type=service_type,
-                    is_active=True
-                )
-
                 # Check billing settings
                 settings = BillingSettings.get_settings()
                 if not settings.enable_billing:
@@ -143,16 +142,13 @@ class ChargeForServiceView(APIView):
                 total_amount = price_per_unit * quantity
 
                 # Check for free usage
-                if service_type == 'doctor_view':
-                    free_views_used = BillingService.get_daily_free_views_used(request.user)
-                    if free_views_used < settings.free_views_per_day:
-                        # Grant free view
-                        BillingService.record_free_view(request.user, object_id)
-                        return Response({
-                            'success': True,
-                            'charged': False,
-                            'message': f'Free view granted ({free_views_used + 1}/{settings.free_views_per_day})'
-                        })
+                if service_type == 'doctor_view' and free_views.consume(request.user, settings.free_views_per_day):
+                    # Grant free view
+                    return Response({
+                        'success': True,
+                        'charged': False,
+                        'message': f'Free view granted ({free_views.used(request.user)}/{settings.free_views_per_day})'
+                    })
 
                 # Check balance
                 if not wallet.has_sufficient_balance(total_amount):
@@ -192,11 +188,6 @@ class ChargeForServiceView(APIView):
                     'message': f'Successfully charged for {billing_rule.get_service_type_display()}'
                 })
 
-        except BillingRule.DoesNotExist:
-            return Response({
-                'success': False,
-                'error': 'Billing rule not found for this service'
-            }, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
             return Response({
                 'success': False,
@@ -309,13 +300,15 @@ class ProtectedDoctorDetailView(APIView):
 
         # Try to charge for view
         # Manually call the charge logic
+        billing_rule = get_rule('doctor_view')
+        if billing_rule is None:
+            return Response({
+                'success': False,
+                'error': 'Billing rule not found for this service'
+            }, status=status.HTTP_404_NOT_FOUND)
+
         try:
             with transaction.atomic():
-                billing_rule = BillingRule.objects.get(
-                    service_type='doctor_view',
-                    is_active=True
-                )
-
                 wallet = get_object_or_404(UserWallet, user=request.user)
                 price_per_unit = billing_rule.get_effective_price(1)
 
@@ -344,11 +337,6 @@ class ProtectedDoctorDetailView(APIView):
                 new_balance = wallet.balance
                 message = f'Successfully charged for {billing_rule.get_service_type_display()}'
 
-        except BillingRule.DoesNotExist:
-            return Response({
-                'success': False,
-                'error': 'Billing rule not found for this service'
-            }, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
             return Response({
                 'success': False,
@@ -411,32 +399,27 @@ def check_doctor_view_access(request, doctor_id):
         })
 
     # Check balance for paid access
-    try:
-        billing_rule = BillingRule.objects.get(
-            service_type='doctor_view',
-            is_active=True
-        )
-
-        wallet = get_object_or_404(UserWallet, user=request.user)
-        required_amount = billing_rule.get_effective_price()
-        has_balance = wallet.has_sufficient_balance(required_amount)
-
-        return Response({
-            'has_access': has_balance,
-            'reason': 'payment_required',
-            'charge_required': True,
-            'required_amount': required_amount,
-            'current_balance': wallet.balance,
-            'has_sufficient_balance': has_balance
-        })
-
-    except BillingRule.DoesNotExist:
+    billing_rule = get_rule('doctor_view')
+    if billing_rule is None:
         return Response({
             'has_access': False,
             'reason': 'billing_rule_not_found',
             'error': 'Billing configuration error'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    wallet = get_object_or_404(UserWallet, user=request.user)
+    required_amount = billing_rule.get_effective_price()
+    has_balance = wallet.has_sufficient_balance(required_amount)
+
+    return Response({
+        'has_access': has_balance,
+        'reason': 'payment_required',
+        'charge_required': True,
+        'required_amount': required_amount,
+        'current_balance': wallet.balance,
+        'has_sufficient_balance': has_balance
+    })
+
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
@@ -6,6 +6,8 @@ from django.db.models import Count, Avg, Q
 from django.utils import timezone
 from datetime import timedelta
 
+from apps.core.swr_cache import stale_while_revalidate
+
 from .models import ChatSession, ChatMessage, AIAnalysis, DoctorRecommendation, ChatFeedback
 from .serializers import (
     ChatSessionSerializer, ChatMessageSerializer, AIAnalysisSerializer,
@@ -13,7 +15,7 @@ from .serializers import (
 )
 
 try:
-    from apps.ai_assistant.services import GeminiService
+    from apps.ai_assistant.services import get_gemini_service
 
     AI_AVAILABLE = True
 except ImportError:
@@ -25,6 +27,50 @@ except ImportError:
             return {'specialty': 'terapevt', 'confidence': 0.5, 'explanation': 'Fallback'}
 
 
+    def get_gemini_service():
+        return GeminiService()
+
+
+@stale_while_revalidate('chat:stats', soft_ttl=60, hard_ttl=600)
+def compute_chat_stats():
+    """Chat statistikasini hisoblash (ChatSessionViewSet.stats uchun cache'lanadi)"""
+    today = timezone.now().date()
+    week_ago = today - timedelta(days=7)
+
+    stats = ChatSession.objects.aggregate(
+        total_sessions=Count('id'),
+        active_sessions=Count('id', filter=Q(status='active')),
+        sessions_today=Count('id', filter=Q(created_at__date=today)),
+        sessions_this_week=Count('id', filter=Q(created_at__date__gte=week_ago)),
+        average_session_duration=Avg('duration_minutes', filter=Q(duration_minutes__gt=0))
+    )
+    stats.update(ChatMessage.objects.aggregate(
+        total_messages=Count('id'),
+        ai_messages=Count('id', filter=Q(sender_type='ai')),
+        user_messages=Count('id', filter=Q(sender_type='user'))
+    ))
+    stats['average_session_duration'] = stats['average_session_duration'] or 0
+
+    # Eng ko'p so'ralgan mutaxassisliklar
+    specialties = ChatSession.objects.filter(
+        detected_specialty__isnull=False
+    ).values('detected_specialty').annotate(
+        count=Count('id')
+    ).order_by('-count')[:5]
+
+    stats['top_specialties'] = list(specialties)
+
+    # Feedback statistikasi
+    stats['feedback'] = ChatFeedback.objects.aggregate(
+        avg_overall=Avg('overall_rating'),
+        avg_accuracy=Avg('ai_accuracy_rating'),
+        avg_response_time=Avg('response_time_rating'),
+        total_feedback=Count('id')
+    )
+    stats['ai_available'] = AI_AVAILABLE
+    return stats
+
+
 class ChatSessionViewSet(viewsets.ModelViewSet):
     """Chat Session API ViewSet"""
     queryset = ChatSession.objects.all()
@@ -80,13 +126,14 @@ class ChatSessionViewSet(viewsets.ModelViewSet):
         )
 
         # AI javobini olish
-        gemini_service = GeminiService()
+        gemini_service = get_gemini_service()
         classification = gemini_service.classify_medical_issue(message_content)
 
         # AI javobini yaratish
         ai_response = self._generate_ai_response(classification, session)
 
-        ai_message = ChatMessage.objects.create(
+        # AI javobini saqlash
+        ai_message = ChatMessage.objects.add_reply(ChatMessage(
             session=session,
             sender_type='ai',
             message_type='text',
@@ -94,12 +141,12 @@ class ChatSessionViewSet(viewsets.ModelViewSet):
             ai_model_used=ai_response.get('model_used', 'fallback'),
             ai_response_time=ai_response.get('processing_time', 0),
             metadata=ai_response.get('metadata', {})
-        )
+        ))
 
         # Session ma'lumotlarini yangilash
         session.detected_specialty = classification.get('specialty')
         session.confidence_score = classification.get('confidence', 0.5)
-        session.save()
+        session.save(update_fields=['detected_specialty', 'confidence_score', 'updated_at'])
 
         return Response({
             'user_message': ChatMessageSerializer(user_message).data,
@@ -113,50 +160,15 @@ class ChatSessionViewSet(viewsets.ModelViewSet):
         session = self.get_object()
         session.status = 'completed'
         session.ended_at = timezone.now()
-        session.calculate_duration()
-        session.save()
+        session.calculate_duration(save=False)
+        session.save(update_fields=['status', 'ended_at', 'duration_minutes', 'updated_at'])
 
         return Response({'message': 'Session yakunlandi'})
 
     @action(detail=False, methods=['get'])
     def stats(self, request):
-        """Chat statistikasi"""
-        today = timezone.now().date()
-        week_ago = today - timedelta(days=7)
-
-        stats = {
-            'total_sessions': ChatSession.objects.count(),
-            'active_sessions': ChatSession.objects.filter(status='active').count(),
-            'sessions_today': ChatSession.objects.filter(created_at__date=today).count(),
-            'sessions_this_week': ChatSession.objects.filter(created_at__date__gte=week_ago).count(),
-            'total_messages': ChatMessage.objects.count(),
-            'ai_messages': ChatMessage.objects.filter(sender_type='ai').count(),
-            'user_messages': ChatMessage.objects.filter(sender_type='user').count(),
-            'average_session_duration': ChatSession.objects.filter(
-                duration_minutes__gt=0
-            ).aggregate(avg=Avg('duration_minutes'))['avg'] or 0,
-        }
-
-        # Eng ko'p so'ralgan mutaxassisliklar
-        specialties = ChatSession.objects.filter(
-            detected_specialty__isnull=False
-        ).values('detected_specialty').annotate(
-            count=Count('id')
-        ).order_by('-count')[:5]
-
-        stats['top_specialties'] = list(specialties)
-
-        # Feedback statistikasi
-        feedback_stats = ChatFeedback.objects.aggregate(
-            avg_overall=Avg('overall_rating'),
-            avg_accuracy=Avg('ai_accuracy_rating'),
-            avg_response_time=Avg('response_time_rating'),
-            total_feedback=Count('id')
-        )
-
-        stats['feedback'] = feedback_stats
-        stats['ai_available'] = AI_AVAILABLE
-
+        """Chat statistikasi (cache'dan, fonda yangilanadi)"""
+        stats = compute_chat_stats()
         return Response(stats)
 
     def _generate_ai_response(self, classification, session):
@@ -0,0 +1,195 @@
+"""
+Chat WebSocket consumer
+
+Protokol (JSON):
+    Ulanish: ws/chat/ yoki ws/chat/<session_id>/ (ixtiyoriy ?language=ru)
+
+    Klient -> server:
+        {"message": "...", "language": "uz"}
+
+    Server -> klient:
+        {"type": "session", "session_id": "..."}             - ulanishda
+        {"type": "ack", "message_id": 1, ...}                - foydalanuvchi xabari saqlandi
+        {"type": "classification", "classification": {...}} - tibbiy shikoyat tasnifi
+        {"type": "token", "delta": "..."}                    - maslahat bo'lagi (stream)
+        {"type": "complete", "message_id": 2, "content": "...", "metadata": {...}}
+        {"type": "error", "error": "..."}
+
+AI javobi stream tugagandan keyin bir marta ChatMessage sifatida saqlanadi.
+"""
+import logging
+import time
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.utils.translation import gettext as _
+
+from apps.ai_assistant.services import get_gemini_service
+
+from .models import ChatSession, ChatMessage
+from .views import AI_AVAILABLE, ChatMessageView
+
+logger = logging.getLogger(__name__)
+
+
+class ChatConsumer(AsyncJsonWebsocketConsumer):
+    """AI chat - javoblar token oqimi sifatida yuboriladi"""
+
+    async def connect(self):
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        self.language = query.get('language', ['uz'])[0]
+        self.session = await self._get_or_create_session(
+            self.scope['url_route']['kwargs'].get('session_id')
+        )
+        # Xabar turi va javob shablonlari HTTP chat bilan bir xil
+        self.helper = ChatMessageView()
+
+        await self.accept()
+        await self.send_json({'type': 'session', 'session_id': str(self.session.id)})
+
+    async def receive_json(self, content, **kwargs):
+        user_message = str(content.get('message', '')).strip()
+        language = content.get('language') or self.language
+
+        if not user_message:
+            await self.send_json({
+                'type': 'error',
+                'error': _('Xabar bo\'sh bo\'lishi mumkin emas')
+            })
+            return
+
+        try:
+            user_chat_message = await self._save_message(
+                sender_type='user',
+                content=user_message,
+                metadata={'language': language}
+            )
+            await self.send_json({
+                'type': 'ack',
+                'message_id': user_chat_message.id,
+                'session_id': str(self.session.id),
+                'timestamp': user_chat_message.created_at.isoformat()
+            })
+
+            message_type = self.helper._analyze_message_type(user_message, self.session, language)
+
+            if message_type == 'medical_complaint':
+                ai_response = await self._stream_medical_complaint(user_message, language)
+            elif message_type == 'greeting':
+                ai_response = self.helper._get_greeting_response(language)
+            elif message_type == 'general_question':
+                ai_response = self.helper._get_clarification_response(language)
+            else:
+                ai_response = self.helper._get_help_response(language)
+
+            ai_chat_message = await self._save_reply(
+                sender_type='ai',
+                content=ai_response['content'],
+                ai_model_used=ai_response.get('model_used', 'rule-based'),
+                ai_response_time=ai_response.get('processing_time', 0.1),
+                metadata={**ai_response.get('metadata', {}), 'language': language}
+            )
+
+            await self.send_json({
+                'type': 'complete',
+                'message_id': ai_chat_message.id,
+                'content': ai_response['content'],
+                'metadata': ai_response.get('metadata', {}),
+                'message_type': message_type,
+                'ai_available': AI_AVAILABLE,
+                'timestamp': ai_chat_message.created_at.isoformat()
+            })
+
+        except Exception as e:
+            logger.error(f"Chat consumer xatolik: {e}")
+            await self.send_json({
+                'type': 'error',
+                'error': _('Xatolik yuz berdi. Iltimos qayta urinib ko\'ring.')
+            })
+
+    async def _stream_medical_complaint(self, user_message, language):
+        """Tasniflash, so'ng maslahatni token oqimi sifatida yuborish"""
+        start = time.perf_counter()
+        gemini_service = get_gemini_service()
+
+        classification = await gemini_service.aclassify_medical_issue(user_message, language=language)
+        classification_time = time.perf_counter() - start
+        specialty = classification.get('specialty')
+
+        await self._update_session_specialty(classification)
+        await self.send_json({
+            'type': 'classification',
+            'classification': {
+                'specialty': specialty,
+                'confidence': classification.get('confidence'),
+                'explanation': classification.get('explanation'),
+                'urgency_assessment': classification.get('urgency_assessment', {})
+            }
+        })
+
+        chunks = []
+        first_token_time = None
+        symptoms = classification.get('symptoms_analysis', {}).get('detected_symptoms', [])
+        async for delta in gemini_service.astream_medical_advice(
+            user_message, specialty, symptoms, language=language
+        ):
+            if first_token_time is None:
+                first_token_time = time.perf_counter() - start
+            chunks.append(delta)
+            await self.send_json({'type': 'token', 'delta': delta})
+
+        total_time = time.perf_counter() - start
+        advice = ''.join(chunks)
+
+        return {
+            'content': self.helper._format_medical_response(classification, language, advice=advice),
+            'model_used': classification.get('model_used', 'gemini-pro'),
+            'processing_time': total_time,
+            'metadata': {
+                'classification': classification,
+                'advice': {'advice': advice, 'specialty': specialty},
+                'stage_timings': {
+                    'classification': round(classification_time, 4),
+                    'first_token': round(first_token_time or total_time, 4),
+                    'total': round(total_time, 4)
+                },
+                'response_type': 'medical_analysis',
+                'streamed': True,
+                'language': language
+            }
+        }
+
+    @database_sync_to_async
+    def _get_or_create_session(self, session_id):
+        if session_id:
+            try:
+                return ChatSession.objects.get(id=session_id)
+            except ChatSession.DoesNotExist:
+                pass
+
+        user = self.scope.get('user')
+        headers = dict(self.scope.get('headers', []))
+        client = self.scope.get('client') or ('127.0.0.1', 0)
+        return ChatSession.objects.create(
+            user=user if user is not None and user.is_authenticated else None,
+            session_ip=client[0],
+            user_agent=headers.get(b'user-agent', b'').decode('utf-8', 'ignore'),
+            metadata={'language': self.language, 'transport': 'websocket'}
+        )
+
+    @database_sync_to_async
+    def _save_message(self, **fields):
+        return ChatMessage.objects.create(session=self.session, message_type='text', **fields)
+
+    @database_sync_to_async
+    def _save_reply(self, **fields):
+        return ChatMessage.objects.add_reply(
+            ChatMessage(session=self.session, message_type='text', **fields)
+        )
+
+    @database_sync_to_async
+    def _update_session_specialty(self, classification):
+        self.session.detected_specialty = classification.get('specialty')
+        self.session.confidence_score = classification.get('confidence', 0.5)
+        self.session.save(update_fields=['detected_specialty', 'confidence_score', 'updated_at'])
@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.ai_assistant.keyword_index import URGENCY_KEYWORDS, keyword_index, normalize
+from apps.ai_assistant.prompts import EMERGENCY_KEYWORDS, HIGH_PRIORITY_KEYWORDS, SYMPTOM_KEYWORDS
+
+MESSAGES = [
+    "Assalomu alaykum, 3 kundan beri boshim og'riyapti, harorat 38, yo'tal ham bor",
+    "Tishim juda qattiq og'riyapti, tish go'shti shishgan va og'iz hidsi bor",
+    "У меня острая боль в груди и затрудненное дыхание, головокружение",
+    "I have chest pain and shortness of breath since yesterday, also dizziness",
+]
+
+
+def naive_find_all(text):
+    """The old scan: a separate ``in`` check per keyword"""
+    text = normalize(text)
+    found = []
+    for specialties in SYMPTOM_KEYWORDS.values():
+        for keywords in specialties.values():
+            found.extend(keyword for keyword in keywords if keyword in text)
+    for keyword_map in (EMERGENCY_KEYWORDS, HIGH_PRIORITY_KEYWORDS):
+        for keywords in keyword_map.values():
+            found.extend(keyword for keyword in keywords if keyword in text)
+    for keywords in URGENCY_KEYWORDS.values():
+        found.extend(keyword for keyword in keywords if keyword in text)
+    return found
+
+
+class Command(BaseCommand):
+    help = 'Compare the keyword index with the per-keyword substring scan'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=2000,
+            help='Number of passes over the sample messages'
+        )
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        self.stdout.write(f'Keywords: {keyword_index.size}')
+
+        for name, func in (('keyword_index', keyword_index.find_all), ('naive_scan', naive_find_all)):
+            start = time.perf_counter()
+            for _ in range(iterations):
+                for message in MESSAGES:
+                    func(message)
+            elapsed = time.perf_counter() - start
+            per_message = elapsed / (iterations * len(MESSAGES)) * 1_000_000
+            self.stdout.write(f'{name}: {per_message:.2f} us/message')
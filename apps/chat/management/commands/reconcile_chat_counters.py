@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Q
+
+from apps.chat.models import ChatSession
+
+COUNTER_FIELDS = ['user_messages_count', 'ai_messages_count', 'total_messages']
+
+
+class Command(BaseCommand):
+    help = 'Rebuild ChatSession message counters from ChatMessage rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of sessions processed per batch'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report sessions with drifted counters'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        sessions = ChatSession.objects.annotate(
+            actual_user=Count('messages', filter=Q(messages__sender_type='user')),
+            actual_ai=Count('messages', filter=Q(messages__sender_type='ai')),
+        ).only(*COUNTER_FIELDS).order_by('pk')
+
+        checked = 0
+        drifted = []
+        fixed = 0
+
+        for session in sessions.iterator(chunk_size=batch_size):
+            checked += 1
+            actual = {
+                'user_messages_count': session.actual_user,
+                'ai_messages_count': session.actual_ai,
+                'total_messages': session.actual_user + session.actual_ai,
+            }
+            if all(getattr(session, field) == value for field, value in actual.items()):
+                continue
+
+            for field, value in actual.items():
+                setattr(session, field, value)
+            drifted.append(session)
+
+            if len(drifted) >= batch_size:
+                fixed += self._save(drifted, options['dry_run'])
+                drifted = []
+
+        fixed += self._save(drifted, options['dry_run'])
+
+        verb = 'Found' if options['dry_run'] else 'Fixed'
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked {checked} sessions. {verb} {fixed} with drifted counters'
+        ))
+
+    @staticmethod
+    def _save(sessions, dry_run):
+        if sessions and not dry_run:
+            ChatSession.objects.bulk_update(sessions, COUNTER_FIELDS)
+        return len(sessions)
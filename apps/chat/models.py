@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
 import uuid
@@ -128,7 +129,7 @@ class ChatSession(models.Model):
         return f"Anonymous Chat - {self.created_at.strftime('%d.%m.%Y %H:%M')}"
 
     def update_message_counts(self):
-        """Xabarlar sonini yangilash"""
+        """Bitta session xabarlari sonini qaytadan hisoblash (barcha sessionlar uchun: reconcile_chat_counters)"""
         user_count = self.messages.filter(sender_type='user').count()
         ai_count = self.messages.filter(sender_type='ai').count()
 
@@ -137,12 +138,82 @@ class ChatSession(models.Model):
         self.total_messages = user_count + ai_count
         self.save(update_fields=['user_messages_count', 'ai_messages_count', 'total_messages'])
 
-    def calculate_duration(self):
-        """Suhbat davomiyligini hisoblash"""
+    def calculate_duration(self, save=True):
+        """Suhbat davomiyligini hisoblash (save=False - chaqiruvchi o'zi saqlaydi)"""
         if self.ended_at:
             delta = self.ended_at - self.created_at
             self.duration_minutes = int(delta.total_seconds() / 60)
-            self.save(update_fields=['duration_minutes'])
+            if save:
+                self.save(update_fields=['duration_minutes'])
+
+
+def get_counter_increments(sender_types):
+    """Yangi xabarlar uchun session hisoblagichlari o'sishi (system xabarlar hisoblanmaydi)"""
+    user_count = sum(1 for sender_type in sender_types if sender_type == 'user')
+    ai_count = sum(1 for sender_type in sender_types if sender_type == 'ai')
+    increments = {
+        'user_messages_count': user_count,
+        'ai_messages_count': ai_count,
+        'total_messages': user_count + ai_count,
+    }
+    return {field: value for field, value in increments.items() if value}
+
+
+def increment_session_counters(session, sender_types):
+    """Hisoblagichlarni atomik F() bilan oshirish (COUNT so'rovlarisiz)"""
+    increments = get_counter_increments(sender_types)
+    if not increments:
+        return
+
+    ChatSession.objects.filter(pk=session.pk).update(
+        **{field: F(field) + value for field, value in increments.items()}
+    )
+    # Xotiradagi nusxa ham mos bo'lishi kerak (keyingi session.save() uchun)
+    for field, value in increments.items():
+        setattr(session, field, getattr(session, field) + value)
+
+
+class ChatMessageManager(models.Manager):
+    """Chat xabarlari manageri"""
+
+    def create_turn(self, user_msg, ai_msg):
+        """
+        Suhbat bosqichini (foydalanuvchi xabari + AI javobi) bitta tranzaksiyada saqlash
+
+        Args:
+            user_msg (ChatMessage): Saqlanmagan foydalanuvchi xabari
+            ai_msg (ChatMessage): Saqlanmagan AI javobi (xuddi shu session)
+
+        Returns:
+            tuple: (user_msg, ai_msg) - saqlangan xabarlar
+        """
+        if user_msg.session_id != ai_msg.session_id:
+            raise ValueError("Turn messages must belong to the same session")
+
+        with transaction.atomic():
+            user_msg, ai_msg = self.bulk_create([user_msg, ai_msg])
+            increment_session_counters(
+                user_msg.session, [user_msg.sender_type, ai_msg.sender_type]
+            )
+        return user_msg, ai_msg
+
+    def add_reply(self, ai_msg):
+        """
+        Oldin saqlangan foydalanuvchi xabariga AI javobini qo'shish
+
+        Javob AI so'rovidan keyin tayyor bo'lsa ishlatiladi: foydalanuvchi
+        xabari so'rovdan oldin saqlanadi (AI xatolik bersa ham yo'qolmaydi),
+        javob va session hisoblagichlari esa bitta tranzaksiyada yoziladi.
+
+        Args:
+            ai_msg (ChatMessage): Saqlanmagan AI javobi
+
+        Returns:
+            ChatMessage: Saqlangan xabar
+        """
+        with transaction.atomic():
+            ai_msg.save(force_insert=True)
+        return ai_msg
 
 
 class ChatMessage(models.Model):
@@ -253,6 +324,8 @@ class ChatMessage(models.Model):
         verbose_name="Tahrirlangan vaqt"
     )
 
+    objects = ChatMessageManager()
+
     class Meta:
         verbose_name = "Chat xabari"
         verbose_name_plural = "Chat xabarlari"
@@ -268,9 +341,11 @@ class ChatMessage(models.Model):
         return f"{self.get_sender_type_display()}: {content_preview}"
 
     def save(self, *args, **kwargs):
+        is_new = self._state.adding
         super().save(*args, **kwargs)
-        # Session statistikasini yangilash
-        self.session.update_message_counts()
+        # Session statistikasini yangilash (faqat yangi xabar uchun)
+        if is_new:
+            increment_session_counters(self.session, [self.sender_type])
 
 
 class AIAnalysis(models.Model):
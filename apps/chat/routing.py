@@ -1,5 +1,8 @@
+from django.urls import path
+
+from . import consumers
+
 websocket_urlpatterns = [
-    # Define your WebSocket URL patterns here
-    # Example:
-    # path('ws/chat/<str:room_name>/', ChatConsumer.as_asgi()),
-]
\ No newline at end of file
+    path('ws/chat/', consumers.ChatConsumer.as_asgi()),
+    path('ws/chat/<uuid:session_id>/', consumers.ChatConsumer.as_asgi()),
+]
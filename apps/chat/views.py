@@ -15,10 +15,12 @@ from django.utils.translation import gettext as _
 # Models
 from .models import ChatSession, ChatMessage, DoctorRecommendation, ChatFeedback
 from apps.doctors.models import Doctor
+from apps.ai_assistant.keyword_index import SYMPTOM, keyword_index
 
 # AI Service - try/except bilan himoyalash
 try:
-    from apps.ai_assistant.services import GeminiService
+    from apps.ai_assistant.services import get_gemini_service
+    from apps.ai_assistant.pipeline import run_medical_pipeline
 
     AI_AVAILABLE = True
 except ImportError as e:
@@ -63,6 +65,21 @@ except ImportError as e:
                 'model_used': 'fallback'
             }
 
+
+    def get_gemini_service():
+        return GeminiService()
+
+
+    def run_medical_pipeline(service, user_message, user_context=None, language='uz'):
+        classification = service.classify_medical_issue(user_message, user_context, language)
+        advice = service.get_medical_advice(user_message, classification.get('specialty'), language=language)
+        return {
+            'classification': classification,
+            'advice': advice,
+            'stage_timings': {},
+            'speculation': {'guessed_specialty': None, 'status': 'skipped'}
+        }
+
 import json
 import logging
 
@@ -108,7 +125,7 @@ class ChatMessageView(TemplateView):
             else:
                 session = self._create_session(request, user_language)
 
-            user_chat_message = ChatMessage.objects.create(
+            user_chat_message = ChatMessage(
                 session=session,
                 sender_type='user',
                 message_type='text',
@@ -124,12 +141,14 @@ class ChatMessageView(TemplateView):
             elif message_type == 'general_question':
                 ai_response = self._get_clarification_response(user_language)
             elif message_type == 'medical_complaint':
+                # AI so'rovi xatolik bersa ham foydalanuvchi xabari saqlanib qolsin
+                user_chat_message.save()
                 ai_response = self._process_medical_complaint(user_message, session, request, user_language)
             else:
                 ai_response = self._get_help_response(user_language)
 
             # AI javob xabarini saqlash
-            ai_chat_message = ChatMessage.objects.create(
+            ai_chat_message = ChatMessage(
                 session=session,
                 sender_type='ai',
                 message_type='text',
@@ -138,6 +157,11 @@ class ChatMessageView(TemplateView):
                 ai_response_time=ai_response.get('processing_time', 0.1),
                 metadata={**ai_response.get('metadata', {}), 'language': user_language}
             )
+            if user_chat_message.pk:
+                ChatMessage.objects.add_reply(ai_chat_message)
+            else:
+                # Qoidaga asoslangan javob - ikkala xabar bitta tranzaksiyada
+                ChatMessage.objects.create_turn(user_chat_message, ai_chat_message)
 
             return JsonResponse({
                 'success': True,
@@ -184,20 +208,9 @@ class ChatMessageView(TemplateView):
             if message_lower.startswith(word) and len(message_lower.split()) <= 2:
                 return 'greeting'
 
-        # Ko'p tilli tibbiy kalit so'zlar
-        from apps.ai_assistant.prompts import get_symptom_keywords
-        medical_keywords = []
-
-        # Hozirgi til va boshqa tillarning kalit so'zlarini olish
-        for lang in ['uz', 'ru', 'en']:
-            lang_keywords = get_symptom_keywords(lang)
-            for specialty_keywords in lang_keywords.values():
-                medical_keywords.extend(specialty_keywords)
-
-        # Kalit so'zlarni tekshirish
-        for keyword in medical_keywords:
-            if keyword in message_lower:
-                return 'medical_complaint'
+        # Ko'p tilli tibbiy kalit so'zlar (barcha tillar, bitta o'tish)
+        if keyword_index.contains(message_lower, SYMPTOM):
+            return 'medical_complaint'
 
         # Umumiy savollar
         if len(message.split()) <= 2 and '?' not in message:
@@ -492,49 +505,43 @@ Feel free to ask! 😊"""
 
     def _process_medical_complaint(self, user_message, session, request, language='uz'):
         """Ko'p tilli tibbiy shikoyatni qayta ishlash"""
-        # AI tahlili
-        gemini_service = GeminiService()
-
-        # Tibbiy muammoni klassifikatsiya qilish
-        classification_result = gemini_service.classify_medical_issue(
+        # Tasniflash va maslahat parallel bajariladi (apps.ai_assistant.pipeline)
+        pipeline_result = run_medical_pipeline(
+            get_gemini_service(),
             user_message,
             user_context=self._get_user_context(request),
             language=language
         )
+        classification_result = pipeline_result['classification']
+        advice_result = pipeline_result['advice']
 
         # Session ma'lumotlarini yangilash
         session.detected_specialty = classification_result.get('specialty')
         session.confidence_score = classification_result.get('confidence', 0.5)
-        session.save()
-
-
-        # Tibbiy maslahat olish
-        advice_result = gemini_service.get_medical_advice(
-            user_message,
-            classification_result.get('specialty'),
-            classification_result.get('symptoms_analysis', {}).get('detected_symptoms', []),
-            language=language
-        )
-
+        session.save(update_fields=['detected_specialty', 'confidence_score', 'updated_at'])
 
         # AI javobini formatlash
         ai_response_content = self._format_medical_response(
             classification_result,
-            language
+            language,
+            advice=advice_result.get('advice')
         )
 
         return {
             'content': ai_response_content,
             'model_used': classification_result.get('model_used', 'gemini-pro'),
-            'processing_time': advice_result.get('processing_time', 0),
+            'processing_time': pipeline_result['stage_timings'].get('total', 0),
             'metadata': {
                 'classification': classification_result,
+                'advice': advice_result,
+                'stage_timings': pipeline_result['stage_timings'],
+                'speculation': pipeline_result['speculation'],
                 'response_type': 'medical_analysis',
                 'language': language
             }
         }
 
-    def _format_medical_response(self, classification,language='uz'):
+    def _format_medical_response(self, classification, language='uz', advice=None):
         """Ko'p tilli tibbiy javobni formatlash"""
         specialty_display = dict(Doctor.SPECIALTIES).get(
             classification.get('specialty'), classification.get('specialty', '')
@@ -603,6 +610,9 @@ Immediately go to the nearest hospitals or call emergency services: 103
             }
             response += emergency_warnings.get(language, emergency_warnings['uz'])
 
+        if advice:
+            response += template['advice_header'].format(advice=advice)
+
         response += template['footer']
 
         return response
@@ -692,7 +702,7 @@ def classify_issue(request):
             }, status=status.HTTP_400_BAD_REQUEST)
 
         # AI tahlili
-        gemini_service = GeminiService()
+        gemini_service = get_gemini_service()
         result = gemini_service.classify_medical_issue(user_message, language=user_language)
 
         return Response({
@@ -860,7 +870,7 @@ def send_message(request):
         )
 
         # AI tahlil
-        gemini_service = GeminiService()
+        gemini_service = get_gemini_service()
         ai_result = gemini_service.classify_medical_issue(
             user_message,
             language=user_language
@@ -883,7 +893,7 @@ def send_message(request):
                 ai_response_content += f"• {doctor['name']} - {doctor['specialty']} (Reyting: {doctor['rating']})\n"
 
         # AI javob xabarini saqlash
-        ai_chat_message = ChatMessage.objects.create(
+        ai_chat_message = ChatMessage.objects.add_reply(ChatMessage(
             session=session,
             sender_type='ai',
             message_type='doctor_recommendation',
@@ -895,12 +905,12 @@ def send_message(request):
                 'ai_classification': ai_result,
                 'recommended_doctors': recommended_doctors.get('recommendations', [])
             }
-        )
+        ))
 
         # Session ma'lumotlarini yangilash
         session.detected_specialty = ai_result.get('specialty')
         session.confidence_score = ai_result.get('confidence', 0.7)
-        session.save()
+        session.save(update_fields=['detected_specialty', 'confidence_score', 'updated_at'])
 
         return Response({
             'success': True,
@@ -968,7 +978,7 @@ def quick_send_message(request):
         )
 
         # AI tahlil
-        gemini_service = GeminiService()
+        gemini_service = get_gemini_service()
         classification_result = gemini_service.classify_medical_issue(
             message,
             language=language
@@ -996,7 +1006,7 @@ def quick_send_message(request):
                 ai_content += f"   • Tel: {doctor['phone']}\n\n"
 
         # AI javob xabarini saqlash
-        ai_message = ChatMessage.objects.create(
+        ai_message = ChatMessage.objects.add_reply(ChatMessage(
             session=session,
             sender_type='ai',
             message_type='doctor_recommendation',
@@ -1009,12 +1019,12 @@ def quick_send_message(request):
                 'doctor_recommendations': doctor_recommendations.get('recommendations', []),
                 'response_type': 'quick_analysis'
             }
-        )
+        ))
 
         # Session yangilash
         session.detected_specialty = classification_result.get('specialty')
         session.confidence_score = classification_result.get('confidence', 0.7)
-        session.save()
+        session.save(update_fields=['detected_specialty', 'confidence_score', 'updated_at'])
 
         return Response({
             'success': True,
@@ -0,0 +1,217 @@
+"""
+Geospatial "near me" search without PostGIS.
+
+Doctors and hospitals store coordinates as free text (``latitude`` /
+``longitude``). Each save also stores them as floats (``geo_latitude`` /
+``geo_longitude``) plus a geohash cell (``geohash``). A radius query then
+runs in three steps, all in one SQL statement:
+
+    1. geohash prefilter - the 3x3 block of cells around the point, each
+       cell no smaller than the radius, as B-tree range scans on ``geohash``;
+    2. bounding-box prefilter on the float columns;
+    3. haversine distance computed in SQL for the remaining rows, filtered
+       by the radius and used for ordering.
+
+Database math functions are used for step 3, so the same query runs on
+SQLite (Django registers the functions) and PostgreSQL.
+
+Existing rows are filled by ``manage.py backfill_coordinates``.
+"""
+import math
+
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import ASin, Cos, Power, Radians, Sin, Sqrt
+from rest_framework.exceptions import ValidationError
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+
+GEOHASH_PRECISION = 9
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+DEFAULT_RADIUS_KM = 10
+MAX_RADIUS_KM = 100
+
+GEO_FIELDS = ['geo_latitude', 'geo_longitude', 'geohash']
+
+
+def parse_coordinate(value, limit):
+    """
+    Parse a free-text coordinate ("41.3111", " 41,3111 ").
+
+    Returns:
+        float or None: None for empty, malformed or out-of-range values
+    """
+    if value is None:
+        return None
+    try:
+        number = float(str(value).strip().replace(',', '.'))
+    except ValueError:
+        return None
+    if math.isnan(number) or not -limit <= number <= limit:
+        return None
+    return number
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    """Geohash of a point"""
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    geohash, bits, bit_count, even = [], 0, 0, True
+
+    while len(geohash) < precision:
+        value_range, value = (lng_range, longitude) if even else (lat_range, latitude)
+        middle = (value_range[0] + value_range[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            value_range[0] = middle
+        else:
+            value_range[1] = middle
+        even = not even
+
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(GEOHASH_ALPHABET[bits])
+            bits, bit_count = 0, 0
+
+    return ''.join(geohash)
+
+
+def _cell_size(precision):
+    """(latitude degrees, longitude degrees) of a geohash cell"""
+    bits = precision * 5
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** ((bits + 1) // 2)
+
+
+def covering_prefixes(latitude, longitude, radius_km):
+    """
+    Geohash prefixes whose cells cover the circle around the point.
+
+    Uses the longest prefix whose cell is at least ``radius_km`` in both
+    directions; the cell of the point and its 8 neighbours then contain
+    every point within the radius.
+    """
+    lng_km_per_degree = KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01)
+
+    precision = 1
+    for candidate in range(GEOHASH_PRECISION, 0, -1):
+        lat_size, lng_size = _cell_size(candidate)
+        if lat_size * KM_PER_DEGREE >= radius_km and lng_size * lng_km_per_degree >= radius_km:
+            precision = candidate
+            break
+
+    lat_size, lng_size = _cell_size(precision)
+    prefixes = set()
+    for lat_step in (-1, 0, 1):
+        for lng_step in (-1, 0, 1):
+            cell_lat = min(max(latitude + lat_step * lat_size, -90.0), 90.0)
+            cell_lng = (longitude + lng_step * lng_size + 180.0) % 360.0 - 180.0
+            prefixes.add(encode_geohash(cell_lat, cell_lng, precision))
+    return prefixes
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """(min_lat, max_lat, min_lng, max_lng) around the point"""
+    lat_delta = radius_km / KM_PER_DEGREE
+    lng_delta = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01))
+    return (
+        max(latitude - lat_delta, -90.0),
+        min(latitude + lat_delta, 90.0),
+        longitude - lng_delta,
+        longitude + lng_delta,
+    )
+
+
+def distance_expression(latitude, longitude, lat_field='geo_latitude', lng_field='geo_longitude'):
+    """Haversine distance (km) from the point as a database expression"""
+    lat = Radians(F(lat_field))
+    lng = Radians(F(lng_field))
+    point_lat = Value(math.radians(latitude), output_field=FloatField())
+    point_lng = Value(math.radians(longitude), output_field=FloatField())
+
+    a = (
+        Power(Sin((lat - point_lat) / 2), 2)
+        + Value(math.cos(math.radians(latitude)), output_field=FloatField())
+        * Cos(lat) * Power(Sin((lng - point_lng) / 2), 2)
+    )
+    return Value(2 * EARTH_RADIUS_KM, output_field=FloatField()) * ASin(Sqrt(a))
+
+
+def sync_geo_fields(instance, update_fields=None):
+    """
+    Refresh numeric coordinates and geohash from the text fields.
+
+    Args:
+        instance: Doctor or Hospital being saved
+        update_fields: ``save(update_fields=...)`` value
+
+    Returns:
+        update_fields, extended with the geo fields when coordinates are saved
+    """
+    latitude = parse_coordinate(instance.latitude, 90)
+    longitude = parse_coordinate(instance.longitude, 180)
+    if latitude is None or longitude is None:
+        latitude = longitude = None
+
+    instance.geo_latitude = latitude
+    instance.geo_longitude = longitude
+    instance.geohash = encode_geohash(latitude, longitude) if latitude is not None else ''
+
+    if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+        update_fields = list(update_fields) + [name for name in GEO_FIELDS if name not in update_fields]
+    return update_fields
+
+
+def parse_nearby_params(query_params):
+    """
+    Read ?lat=&lng=&radius_km= from a request.
+
+    Returns:
+        tuple or None: (lat, lng, radius_km), None when lat/lng are absent
+
+    Raises:
+        ValidationError: Malformed or out-of-range values
+    """
+    if not query_params.get('lat') and not query_params.get('lng'):
+        return None
+
+    latitude = parse_coordinate(query_params.get('lat'), 90)
+    longitude = parse_coordinate(query_params.get('lng'), 180)
+    if latitude is None or longitude is None:
+        raise ValidationError({'lat': 'lat and lng must be valid coordinates'})
+
+    radius_km = query_params.get('radius_km') or DEFAULT_RADIUS_KM
+    try:
+        radius_km = float(radius_km)
+    except (TypeError, ValueError):
+        raise ValidationError({'radius_km': 'radius_km must be a number'})
+    if not 0 < radius_km <= MAX_RADIUS_KM:
+        raise ValidationError({'radius_km': f'radius_km must be between 0 and {MAX_RADIUS_KM}'})
+
+    return latitude, longitude, radius_km
+
+
+def filter_nearby(queryset, latitude, longitude, radius_km, order=True):
+    """
+    Restrict a Doctor/Hospital queryset to the circle around the point.
+
+    Rows get a ``distance_km`` annotation; with ``order=True`` they are
+    ordered by it (nearest first).
+    """
+    cells = Q()
+    for prefix in covering_prefixes(latitude, longitude, radius_km):
+        # Range instead of startswith: a plain B-tree index serves it on every backend
+        cells |= Q(geohash__gte=prefix, geohash__lt=prefix + '~')
+
+    min_lat, max_lat, min_lng, max_lng = bounding_box(latitude, longitude, radius_km)
+    queryset = queryset.filter(
+        cells,
+        geo_latitude__range=(min_lat, max_lat),
+        geo_longitude__range=(min_lng, max_lng),
+    ).annotate(
+        distance_km=distance_expression(latitude, longitude)
+    ).filter(distance_km__lte=radius_km)
+
+    if order:
+        queryset = queryset.order_by('distance_km')
+    return queryset
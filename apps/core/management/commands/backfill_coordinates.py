@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from apps.core.geo import GEO_FIELDS, sync_geo_fields
+
+
+class Command(BaseCommand):
+    help = 'Parse text latitude/longitude of doctors and hospitals into numeric coordinates and geohash'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of rows updated per batch'
+        )
+
+    def handle(self, *args, **options):
+        from apps.doctors.models import Doctor
+        from apps.hospitals.models import Hospital
+
+        batch_size = options['batch_size']
+        for model in (Doctor, Hospital):
+            rows = model.objects.only('pk', 'latitude', 'longitude', *GEO_FIELDS).order_by('pk')
+            batch, updated, located = [], 0, 0
+
+            for instance in rows.iterator(chunk_size=batch_size):
+                sync_geo_fields(instance)
+                located += instance.geo_latitude is not None
+                batch.append(instance)
+                if len(batch) >= batch_size:
+                    updated += model.objects.bulk_update(batch, GEO_FIELDS)
+                    batch = []
+            if batch:
+                updated += model.objects.bulk_update(batch, GEO_FIELDS)
+
+            self.stdout.write(self.style.SUCCESS(
+                f'{model._meta.verbose_name_plural}: {updated} rows updated, {located} with valid coordinates'
+            ))
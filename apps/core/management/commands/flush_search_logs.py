@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.core.search_log_buffer import get_buffer_settings, get_search_log_buffer
+
+
+class Command(BaseCommand):
+    help = 'Drain buffered search log events into the SearchLog table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep draining the buffer every FLUSH_INTERVAL seconds'
+        )
+
+    def handle(self, *args, **options):
+        config = get_buffer_settings()
+        if config['BACKEND'] != 'redis':
+            self.stdout.write(self.style.WARNING(
+                "Buffer backend is 'local'; only this process's buffer can be drained. "
+                "Use the 'redis' backend to drain events from web workers."
+            ))
+
+        buffer = get_search_log_buffer()
+
+        while True:
+            written = buffer.flush()
+            self.stdout.write(self.style.SUCCESS(f'Flushed {written} search log events'))
+
+            if not options['loop']:
+                break
+            time.sleep(config['FLUSH_INTERVAL'])
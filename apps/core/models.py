@@ -109,26 +109,41 @@ class SearchLog(models.Model):
         """
         Log a search/view for a doctor or hospital.
 
+        The row is buffered and written asynchronously in a batch, so the
+        request thread never waits on the database.
+
         Args:
             entity_type: 'doctor' or 'hospital'
             entity_id: ID of the doctor or hospital
             request: Django request object
             action: Type of action (view, search, detail)
+        """
+        cls.log_searches(entity_type, [entity_id], request, action)
 
-        Returns:
-            SearchLog: Created log entry
+    @classmethod
+    def log_searches(cls, entity_type, entity_ids, request, action='view'):
         """
-        from apps.core.utils import get_client_ip, get_user_agent
+        Log searches/views for several doctors or hospitals at once.
 
-        return cls.objects.create(
-            entity_type=entity_type,
-            entity_id=entity_id,
-            user=request.user if request.user.is_authenticated else None,
-            ip_address=get_client_ip(request),
-            user_agent=get_user_agent(request),
-            action=action,
-            search_date=date.today()
-        )
+        Args:
+            entity_type: 'doctor' or 'hospital'
+            entity_ids: IDs of the doctors or hospitals
+            request: Django request object
+            action: Type of action (view, search, detail)
+        """
+        from apps.core.search_log_buffer import build_event, enqueue_search_logs
+        from apps.core.search_quota import increment_daily_counts
+
+        events = [
+            build_event(entity_type, entity_id, request, action)
+            for entity_id in entity_ids
+        ]
+        if not events:
+            return
+
+        # Keep the daily quota counters in step with the (buffered) log
+        increment_daily_counts(entity_type, entity_ids, events[0]['ip_address'])
+        enqueue_search_logs(events)
 
     @classmethod
     def check_limit_exceeded(cls, entity_type, entity_id, limit, ip_address, today=None):
@@ -148,5 +163,7 @@ class SearchLog(models.Model):
         if limit == 0:
             return False  # Unlimited
 
-        count = cls.get_daily_count(entity_type, entity_id, ip_address, today)
+        from apps.core.search_quota import get_daily_count
+
+        count = get_daily_count(entity_type, entity_id, ip_address, today)
         return count >= limit
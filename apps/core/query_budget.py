@@ -0,0 +1,215 @@
+"""
+SQL query budgets for API endpoints.
+
+``QueryRecorder`` wraps every database connection with
+``connection.execute_wrapper`` (works with DEBUG off) and records each
+statement, its duration and a signature with literals stripped, so repeated
+per-row queries (N+1) show up as duplicate signatures.
+
+``QueryBudgetMiddleware`` records every request and, when enabled:
+    - adds X-Query-Count, X-Query-Time-Ms and X-Query-Duplicates headers
+      (plus X-Query-Budget for views that declare one);
+    - logs a warning when a view runs more queries than its budget.
+
+Views declare a budget with the ``query_budget`` attribute or decorator:
+
+    class DoctorListView(generics.ListAPIView):
+        query_budget = 12
+
+    @query_budget(5)
+    @api_view(['GET'])
+    def quick_stats(request): ...
+
+A dict budget is looked up by viewset action, then by HTTP method:
+``query_budget = {'list': 12, 'retrieve': 6, 'post': 10}``.
+
+Tests fail on regressions with ``assert_query_budget`` (any test runner):
+
+    assert_query_budget(self.client, '/api/v1/doctors/list/')
+
+Configuration (settings.QUERY_BUDGET, all keys optional):
+    {
+        'ENABLED': False,       # middleware on/off (off: removed from the chain)
+        'HEADERS': True,        # add the X-Query-* response headers
+        'LOG_OVER_BUDGET': True,
+        'DEFAULT_BUDGET': None, # budget for views without one (None: no check)
+    }
+
+Streaming responses are measured up to the first byte only.
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.urls import resolve
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': False,
+    'HEADERS': True,
+    'LOG_OVER_BUDGET': True,
+    'DEFAULT_BUDGET': None,
+}
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'\bIN \([^()]*\)', re.IGNORECASE)
+
+
+def get_query_budget_settings():
+    """Return QUERY_BUDGET settings merged with defaults"""
+    return {**DEFAULTS, **getattr(settings, 'QUERY_BUDGET', {})}
+
+
+def query_signature(sql):
+    """SQL with literals and IN lists stripped - equal for repeated per-row queries"""
+    sql = _STRING_RE.sub('?', sql)
+    sql = _IN_LIST_RE.sub('IN (...)', sql)
+    return _NUMBER_RE.sub('?', sql)
+
+
+class QueryRecorder:
+    """Context manager recording the SQL run on every connection"""
+
+    def __init__(self):
+        self.queries = []
+        self._stack = None
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - start))
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def total_time_ms(self):
+        return sum(duration for _, duration in self.queries) * 1000
+
+    def duplicates(self):
+        """{signature: executions} of statements run more than once"""
+        counts = Counter(query_signature(sql) for sql, _ in self.queries)
+        return {signature: count for signature, count in counts.most_common() if count > 1}
+
+    def summary(self, limit=5):
+        """Readable report for logs and assertion messages"""
+        lines = [f"{self.count} queries, {self.total_time_ms:.1f} ms"]
+        for signature, count in list(self.duplicates().items())[:limit]:
+            lines.append(f"  {count}x {signature[:200]}")
+        return '\n'.join(lines)
+
+
+def query_budget(budget):
+    """Decorator declaring the query budget of a function-based view"""
+    def decorator(view_func):
+        view_func.query_budget = budget
+        return view_func
+    return decorator
+
+
+def get_view_budget(view_func, method='get'):
+    """
+    Query budget declared by a resolved view.
+
+    Returns:
+        int or None
+    """
+    budget = getattr(view_func, 'query_budget', None)
+    if budget is None:
+        view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+        budget = getattr(view_class, 'query_budget', None)
+
+    if isinstance(budget, dict):
+        method = method.lower()
+        action = (getattr(view_func, 'actions', None) or {}).get(method)
+        budget = budget.get(action, budget.get(method))
+    return budget
+
+
+class QueryBudgetMiddleware:
+    """Per-request query count, SQL time and duplicate queries"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.settings = get_query_budget_settings()
+        if not self.settings['ENABLED']:
+            raise MiddlewareNotUsed
+
+    def __call__(self, request):
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+
+        budget = getattr(request, '_query_budget', None)
+        if budget is None:
+            budget = self.settings['DEFAULT_BUDGET']
+
+        duplicates = recorder.duplicates()
+        if self.settings['HEADERS']:
+            response['X-Query-Count'] = str(recorder.count)
+            response['X-Query-Time-Ms'] = f"{recorder.total_time_ms:.1f}"
+            response['X-Query-Duplicates'] = str(sum(count - 1 for count in duplicates.values()))
+            if budget is not None:
+                response['X-Query-Budget'] = str(budget)
+
+        if budget is not None and recorder.count > budget and self.settings['LOG_OVER_BUDGET']:
+            logger.warning(
+                f"Query budget exceeded: {request.method} {request.path} "
+                f"ran {recorder.count} queries (budget {budget})\n{recorder.summary()}"
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._query_budget = get_view_budget(view_func, request.method)
+
+
+def assert_query_budget(client, path, method='get', budget=None, **request_kwargs):
+    """
+    Request ``path`` with a test client and fail if it runs too many queries.
+
+    Args:
+        client: Django/DRF test client
+        path: URL of the view
+        method: HTTP method
+        budget: Overrides the budget declared by the view
+        **request_kwargs: Passed to the client method (data, format, ...)
+
+    Returns:
+        The response
+
+    Raises:
+        AssertionError: Over budget, or no budget declared
+    """
+    if budget is None:
+        budget = get_view_budget(resolve(path.split('?')[0]).func, method)
+    if budget is None:
+        raise AssertionError(f"No query budget declared for {path}")
+
+    with QueryRecorder() as recorder:
+        response = getattr(client, method.lower())(path, **request_kwargs)
+        if response.streaming:
+            b''.join(response.streaming_content)
+
+    if recorder.count > budget:
+        raise AssertionError(
+            f"{method.upper()} {path} ran {recorder.count} queries, budget is {budget}\n{recorder.summary()}"
+        )
+    return response
@@ -6,6 +6,7 @@ viewing doctors and hospitals.
 """
 from rest_framework.exceptions import Throttled
 from apps.core.models import SearchLog
+from apps.core.search_quota import filter_exceeded, get_daily_count
 from apps.core.utils import get_client_ip
 
 
@@ -127,7 +128,7 @@ def get_remaining_searches(request, entity_type, entity):
 
     # Get usage for this IP today
     ip_address = get_client_ip(request)
-    used = SearchLog.get_daily_count(entity_type, entity.id, ip_address)
+    used = get_daily_count(entity_type, entity.id, ip_address)
     remaining = max(0, limit - used)
 
     return {
@@ -160,16 +161,12 @@ def filter_by_search_limit(request, queryset, entity_type):
 
     ip_address = get_client_ip(request)
 
-    # Filter out entities where limit is exceeded
-    allowed_ids = []
-    for entity in queryset:
-        if entity.daily_search_limit == 0:
-            # Unlimited
-            allowed_ids.append(entity.id)
-        elif not SearchLog.check_limit_exceeded(
-            entity_type, entity.id, entity.daily_search_limit, ip_address
-        ):
-            # Limit not exceeded
-            allowed_ids.append(entity.id)
-
-    return queryset.filter(id__in=allowed_ids)
+    # Only entities with a limit need checking; counts come from the quota store
+    limits = dict(
+        queryset.filter(daily_search_limit__gt=0).order_by().values_list('id', 'daily_search_limit')
+    )
+    exceeded_ids = filter_exceeded(entity_type, limits, ip_address)
+
+    if not exceeded_ids:
+        return queryset
+    return queryset.exclude(id__in=exceeded_ids)
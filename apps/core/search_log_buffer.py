@@ -0,0 +1,302 @@
+"""
+Buffered ingestion pipeline for SearchLog rows.
+
+Search endpoints log one row per doctor/hospital shown. Writing those rows
+synchronously puts INSERT load on the busiest read path, so the request
+thread only appends an event to a buffer. Buffered events are written with
+``bulk_create`` when the buffer reaches ``BATCH_SIZE`` or when
+``FLUSH_INTERVAL`` seconds have passed since the last flush. Flushes run on a
+background thread, never on the request thread.
+
+Two queue backends are available:
+    - 'local': an in-process deque (default, no external services)
+    - 'redis': a shared Redis list, drained by any worker or by the
+      ``flush_search_logs`` management command
+
+Configuration (settings.SEARCH_LOG_BUFFER, all keys optional):
+    {
+        'ENABLED': True,
+        'BACKEND': 'local',
+        'REDIS_URL': 'redis://127.0.0.1:6379/1',
+        'REDIS_KEY': 'search_log_buffer',
+        'BATCH_SIZE': 500,
+        'FLUSH_INTERVAL': 5,
+    }
+
+Note: ``searched_at`` is auto_now_add, so buffered rows carry the flush time
+(a few seconds late). ``search_date`` is taken from the event itself, so
+daily limits and statistics are unaffected.
+"""
+import atexit
+import json
+import logging
+import threading
+import time
+from collections import Counter, deque
+from datetime import date
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    'BACKEND': 'local',
+    'REDIS_URL': 'redis://127.0.0.1:6379/1',
+    'REDIS_KEY': 'search_log_buffer',
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': 5,
+}
+
+
+def get_buffer_settings():
+    """Return SEARCH_LOG_BUFFER settings merged with defaults"""
+    return {**DEFAULTS, **getattr(settings, 'SEARCH_LOG_BUFFER', {})}
+
+
+def _count_key(event):
+    return event['entity_type'], event['entity_id'], event['ip_address'], event['search_date']
+
+
+class LocalSearchLogQueue:
+    """Thread-safe in-process queue"""
+
+    def __init__(self):
+        self._items = deque()
+        self._counts = Counter()  # buffered events per (entity, IP, day)
+        self._lock = threading.Lock()
+
+    def push(self, events):
+        with self._lock:
+            self._items.extend(events)
+            self._counts.update(_count_key(event) for event in events)
+            return len(self._items)
+
+    def pop_batch(self, size):
+        with self._lock:
+            count = min(size, len(self._items))
+            batch = [self._items.popleft() for _ in range(count)]
+            self._counts.subtract(_count_key(event) for event in batch)
+            self._counts += Counter()  # drop zero counts
+            return batch
+
+    def pending_counts(self, entity_type, entity_ids, ip_address, day):
+        """Buffered events per entity id for one IP and day"""
+        day = day.isoformat()
+        with self._lock:
+            return {
+                entity_id: self._counts[(entity_type, entity_id, ip_address, day)]
+                for entity_id in entity_ids
+            }
+
+    def __len__(self):
+        return len(self._items)
+
+
+class RedisSearchLogQueue:
+    """Queue backed by a Redis list, shared by all processes"""
+
+    def __init__(self, url, key):
+        import redis
+
+        self._client = redis.Redis.from_url(url)
+        self._key = key
+
+    def push(self, events):
+        return self._client.rpush(self._key, *[json.dumps(event) for event in events])
+
+    def pop_batch(self, size):
+        pipe = self._client.pipeline()
+        pipe.lrange(self._key, 0, size - 1)
+        pipe.ltrim(self._key, size, -1)
+        items, _ = pipe.execute()
+        return [json.loads(item) for item in items]
+
+    def pending_counts(self, entity_type, entity_ids, ip_address, day):
+        """
+        Not tracked: reading the shared list would cost a full LRANGE per
+        check, so buffered events count once flushed (FLUSH_INTERVAL).
+        """
+        return {}
+
+    def __len__(self):
+        return self._client.llen(self._key)
+
+
+class SearchLogBuffer:
+    """Buffers SearchLog events and flushes them in batches"""
+
+    def __init__(self, queue, batch_size, flush_interval):
+        self.queue = queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._last_flush = time.monotonic()
+        self._flush_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._flushing = False
+        self._timer = None
+
+    def append(self, events):
+        """Add events to the buffer; schedule a flush if a threshold is reached"""
+        if not events:
+            return
+
+        size = self.queue.push(events)
+        due = time.monotonic() - self._last_flush >= self.flush_interval
+        if size >= self.batch_size or due:
+            self._flush_in_background()
+        else:
+            self._ensure_timer()
+
+    def flush(self):
+        """
+        Write all buffered events to the database.
+
+        Returns:
+            int: Number of SearchLog rows created
+        """
+        from apps.core.models import SearchLog
+
+        total = 0
+        with self._flush_lock:
+            self._last_flush = time.monotonic()
+            while True:
+                events = self.queue.pop_batch(self.batch_size)
+                if not events:
+                    break
+                try:
+                    SearchLog.objects.bulk_create(
+                        [self._to_instance(event) for event in events],
+                        batch_size=self.batch_size
+                    )
+                    total += len(events)
+                except Exception as e:
+                    logger.error(f"Failed to flush {len(events)} search log events: {e}")
+                    break
+        return total
+
+    def _flush_in_background(self):
+        with self._state_lock:
+            if self._flushing:
+                return
+            self._flushing = True
+
+        thread = threading.Thread(target=self._background_flush, daemon=True)
+        thread.start()
+
+    def _background_flush(self):
+        try:
+            self.flush()
+        finally:
+            # Background threads own their DB connections
+            connections.close_all()
+            self._flushing = False
+
+    def _ensure_timer(self):
+        if self._timer is not None and self._timer.is_alive():
+            return
+        self._timer = threading.Timer(self.flush_interval, self._flush_in_background)
+        self._timer.daemon = True
+        self._timer.start()
+
+    @staticmethod
+    def _to_instance(event):
+        from apps.core.models import SearchLog
+
+        return SearchLog(
+            entity_type=event['entity_type'],
+            entity_id=event['entity_id'],
+            user_id=event['user_id'],
+            ip_address=event['ip_address'],
+            user_agent=event['user_agent'],
+            action=event['action'],
+            search_date=date.fromisoformat(event['search_date'])
+        )
+
+
+def build_event(entity_type, entity_id, request, action='view'):
+    """Build a serializable SearchLog event from a request"""
+    from apps.core.utils import get_client_ip, get_user_agent
+
+    return {
+        'entity_type': entity_type,
+        'entity_id': entity_id,
+        'user_id': request.user.id if request.user.is_authenticated else None,
+        'ip_address': get_client_ip(request),
+        'user_agent': get_user_agent(request)[:255],
+        'action': action,
+        'search_date': date.today().isoformat(),
+    }
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_search_log_buffer():
+    """Return the process-wide SearchLogBuffer"""
+    global _buffer
+
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                config = get_buffer_settings()
+                if config['BACKEND'] == 'redis':
+                    queue = RedisSearchLogQueue(config['REDIS_URL'], config['REDIS_KEY'])
+                else:
+                    queue = LocalSearchLogQueue()
+                _buffer = SearchLogBuffer(
+                    queue,
+                    batch_size=config['BATCH_SIZE'],
+                    flush_interval=config['FLUSH_INTERVAL']
+                )
+                atexit.register(_buffer.flush)
+    return _buffer
+
+
+def enqueue_search_logs(events):
+    """
+    Queue SearchLog events for asynchronous insertion.
+
+    When buffering is disabled the events are written immediately.
+    """
+    if not get_buffer_settings()['ENABLED']:
+        from apps.core.models import SearchLog
+
+        SearchLog.objects.bulk_create(
+            [SearchLogBuffer._to_instance(event) for event in events]
+        )
+        return
+
+    try:
+        get_search_log_buffer().append(events)
+    except Exception as e:
+        # Losing a few statistics rows is preferable to failing the request
+        logger.error(f"Failed to buffer {len(events)} search log events: {e}")
+
+
+def get_pending_counts(entity_type, entity_ids, ip_address, day):
+    """
+    Events of one IP and day queued but not written to SearchLog yet.
+
+    Only the 'local' backend tracks them, and only for this process; other
+    workers' events (and all events with the 'redis' backend) reach the
+    database within FLUSH_INTERVAL seconds.
+
+    Returns:
+        dict: Mapping of entity id to buffered events (missing means 0)
+    """
+    if not get_buffer_settings()['ENABLED'] or _buffer is None:
+        return {}
+
+    try:
+        return _buffer.queue.pending_counts(entity_type, entity_ids, ip_address, day)
+    except Exception as e:
+        logger.error(f"Failed to read buffered search log counts: {e}")
+        return {}
+
+
+def flush_search_logs():
+    """Drain the buffer synchronously; returns the number of rows written"""
+    return get_search_log_buffer().flush()
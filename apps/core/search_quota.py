@@ -0,0 +1,224 @@
+"""
+Daily search-quota counters.
+
+Tracks how many times an IP address searched/viewed a doctor or hospital
+today, keyed on (entity_type, entity_id, ip_address, date).
+
+SearchLog is the source of truth: a count is one grouped aggregate over
+today's rows for the whole result set, plus this process's events still
+waiting in the SearchLog buffer (apps/core/search_log_buffer.py; other
+events count once flushed, within FLUSH_INTERVAL seconds).
+
+When a shared cache backend is configured (Redis, Memcached, ...) the counts
+are also kept as cache counters, so checks skip the database:
+    - counters are bumped atomically and expire at midnight, when the daily
+      limit resets (with RedisCache the expiry is set in the same pipeline
+      as the bump, so no counter outlives its day);
+    - a missing counter (cold cache, eviction) is seeded from SearchLog;
+    - with Django's RedisCache a result page is bumped in one pipelined
+      round trip.
+
+A per-process cache (the default LocMemCache) would give every worker its
+own counters - the effective limit would be multiplied by the number of
+workers - so it is never used for quotas.
+"""
+from datetime import date, datetime, time, timedelta
+
+from django.core.cache import cache, caches
+from django.db.models import Count
+
+from apps.core.utils import is_shared_cache
+
+KEY_PREFIX = 'search_quota'
+
+
+def get_quota_key(entity_type, entity_id, ip_address, day):
+    """Cache key of a single daily counter"""
+    return f"{KEY_PREFIX}:{entity_type}:{entity_id}:{ip_address}:{day.isoformat()}"
+
+
+def seconds_until_midnight():
+    """Counter TTL - counters expire when the daily limit resets"""
+    now = datetime.now()
+    midnight = datetime.combine(now.date() + timedelta(days=1), time.min)
+    return max(1, int((midnight - now).total_seconds()))
+
+
+def _count_from_logs(entity_type, entity_ids, ip_address, day):
+    """
+    Count today's searches for many entities: one grouped SearchLog query
+    plus the events that are still buffered.
+    """
+    from apps.core.models import SearchLog
+    from apps.core.search_log_buffer import get_pending_counts
+
+    rows = SearchLog.objects.filter(
+        entity_type=entity_type,
+        entity_id__in=entity_ids,
+        ip_address=ip_address,
+        search_date=day
+    ).values('entity_id').annotate(count=Count('id'))
+
+    counts = dict.fromkeys(entity_ids, 0)
+    counts.update({row['entity_id']: row['count'] for row in rows})
+
+    for entity_id, pending in get_pending_counts(entity_type, entity_ids, ip_address, day).items():
+        counts[entity_id] += pending
+    return counts
+
+
+def get_daily_counts(entity_type, entity_ids, ip_address, day=None):
+    """
+    Get today's search counts of one IP for many entities.
+
+    Args:
+        entity_type: 'doctor' or 'hospital'
+        entity_ids: IDs of the doctors or hospitals
+        ip_address: IP address to check
+        day: Date to check (defaults to today)
+
+    Returns:
+        dict: Mapping of entity id to count
+    """
+    day = day or date.today()
+    entity_ids = list(entity_ids)
+    if not entity_ids:
+        return {}
+
+    if not is_shared_cache():
+        return _count_from_logs(entity_type, entity_ids, ip_address, day)
+
+    keys = {
+        get_quota_key(entity_type, entity_id, ip_address, day): entity_id
+        for entity_id in entity_ids
+    }
+    cached = cache.get_many(list(keys))
+    counts = {keys[key]: value for key, value in cached.items()}
+
+    missing = [entity_id for entity_id in entity_ids if entity_id not in counts]
+    if missing:
+        timeout = seconds_until_midnight()
+        for entity_id, count in _count_from_logs(entity_type, missing, ip_address, day).items():
+            key = get_quota_key(entity_type, entity_id, ip_address, day)
+            # add() never overwrites a counter incremented in the meantime
+            if not cache.add(key, count, timeout):
+                count = cache.get(key, count)
+            counts[entity_id] = count
+
+    return counts
+
+
+def get_daily_count(entity_type, entity_id, ip_address, day=None):
+    """Get today's search count of one IP for a single entity"""
+    return get_daily_counts(entity_type, [entity_id], ip_address, day)[entity_id]
+
+
+def increment_daily_counts(entity_type, entity_ids, ip_address, day=None):
+    """
+    Record one search per entity for this IP today.
+
+    Call before the search is added to the SearchLog buffer. Without a
+    shared cache there is nothing to do - the SearchLog row is the record.
+
+    Args:
+        entity_type: 'doctor' or 'hospital'
+        entity_ids: IDs of the doctors or hospitals
+        ip_address: IP address of the viewer
+        day: Date of the search (defaults to today)
+    """
+    entity_ids = list(entity_ids)
+    if not entity_ids or not is_shared_cache():
+        return
+
+    day = day or date.today()
+    client = _redis_client()
+    if client is not None:
+        _increment_redis(client, entity_type, entity_ids, ip_address, day)
+        return
+
+    cold = []
+    for entity_id in entity_ids:
+        try:
+            cache.incr(get_quota_key(entity_type, entity_id, ip_address, day))
+        except ValueError:
+            cold.append(entity_id)
+
+    if not cold:
+        return
+
+    # Seed cold counters from the logs, then record this search
+    timeout = seconds_until_midnight()
+    for entity_id, count in _count_from_logs(entity_type, cold, ip_address, day).items():
+        key = get_quota_key(entity_type, entity_id, ip_address, day)
+        if not cache.add(key, count + 1, timeout):
+            cache.incr(key)
+
+
+def _redis_client():
+    """Raw client of Django's RedisCache backend, None for other backends"""
+    from django.core.cache.backends.redis import RedisCache
+
+    backend = caches['default']
+    if not isinstance(backend, RedisCache):
+        return None
+    return backend._cache.get_client(write=True)
+
+
+def _increment_redis(client, entity_type, entity_ids, ip_address, day):
+    """
+    INCR and EXPIRE every counter in one pipeline.
+
+    INCR creates a missing counter at 1 (this search); such counters are
+    then topped up with the logged count. Concurrent increments in between
+    are kept, since the seed is added rather than set. The expiry (always
+    the coming midnight) is part of the first pipeline, so a counter
+    expires even if seeding fails.
+    """
+    backend = caches['default']
+    keys = [
+        backend.make_and_validate_key(get_quota_key(entity_type, entity_id, ip_address, day))
+        for entity_id in entity_ids
+    ]
+
+    timeout = seconds_until_midnight()
+    pipe = client.pipeline()
+    for key in keys:
+        pipe.incr(key)
+        pipe.expire(key, timeout)
+    values = pipe.execute()[::2]
+
+    cold = {entity_id: key for entity_id, key, value in zip(entity_ids, keys, values) if value == 1}
+    if not cold:
+        return
+
+    seeds = {
+        cold[entity_id]: count
+        for entity_id, count in _count_from_logs(entity_type, list(cold), ip_address, day).items()
+        if count
+    }
+    if seeds:
+        pipe = client.pipeline()
+        for key, count in seeds.items():
+            pipe.incrby(key, count)
+        pipe.execute()
+
+
+def filter_exceeded(entity_type, limits, ip_address, day=None):
+    """
+    Find entities whose daily limit this IP has reached.
+
+    Args:
+        entity_type: 'doctor' or 'hospital'
+        limits: Mapping of entity id to daily limit (0 means unlimited)
+        ip_address: IP address to check
+        day: Date to check (defaults to today)
+
+    Returns:
+        set: IDs of entities whose limit is exceeded
+    """
+    limited = {entity_id: limit for entity_id, limit in limits.items() if limit}
+    counts = get_daily_counts(entity_type, limited, ip_address, day)
+    return {
+        entity_id for entity_id, limit in limited.items()
+        if counts[entity_id] >= limit
+    }
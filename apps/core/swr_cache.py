@@ -0,0 +1,185 @@
+"""
+Stale-while-revalidate cache for expensive computed payloads.
+
+Public statistics endpoints aggregate whole tables on every hit. Wrapping the
+computation with ``stale_while_revalidate`` serves the payload from the cache:
+
+    - younger than ``soft_ttl``: served as is;
+    - older than ``soft_ttl``: still served immediately, and one background
+      thread recomputes it (single-flight: a per-process guard plus a
+      ``cache.add`` lock shared by all workers);
+    - older than ``hard_ttl`` (or missing): recomputed on the request thread,
+      so a payload is never served past its hard TTL (``hard_ttl=None``
+      keeps it until it is replaced).
+
+With ``version_key`` the payload is also stale once the data it was built
+from changed: writers bump the counter stored under that cache key (see
+``bump_version``) and a payload built at an older version is revalidated
+like one past ``soft_ttl``. The payload and the version are read with one
+``get_many``.
+
+Usage:
+
+    @stale_while_revalidate('api:quick_stats', soft_ttl=60, hard_ttl=600)
+    def compute_quick_stats():
+        ...
+
+    compute_quick_stats()              # cached payload
+    compute_quick_stats.refresh()      # recompute now
+    compute_quick_stats.invalidate()   # drop the cached payload
+    compute_quick_stats.lookup()       # (payload, stale)
+
+``key`` may also be a callable receiving the function arguments, for
+payloads that depend on them (e.g. language).
+"""
+import functools
+import logging
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'swr'
+
+_in_flight = set()
+_in_flight_lock = threading.Lock()
+
+
+class StaleWhileRevalidateCache:
+    """Cached wrapper around one payload-computing function"""
+
+    def __init__(self, func, key, soft_ttl=60, hard_ttl=600, lock_timeout=None,
+                 version_key=None, background=True):
+        if hard_ttl is not None and hard_ttl < soft_ttl:
+            raise ValueError("hard_ttl must not be shorter than soft_ttl")
+
+        self.func = func
+        self.key = key
+        self.soft_ttl = soft_ttl
+        self.hard_ttl = hard_ttl
+        self.lock_timeout = lock_timeout or max(30, soft_ttl)
+        self.version_key = version_key
+        self.background = background
+        functools.update_wrapper(self, func)
+
+    def __call__(self, *args, **kwargs):
+        return self.lookup(*args, **kwargs)[0]
+
+    def lookup(self, *args, **kwargs):
+        """
+        Cached payload and whether it is stale.
+
+        Returns:
+            tuple: (payload, stale) - a stale payload is being revalidated
+        """
+        cache_key = self._cache_key(args, kwargs)
+        if self.version_key:
+            cached = cache.get_many([cache_key, self.version_key])
+            entry = cached.get(cache_key)
+            version = cached.get(self.version_key, 0)
+        else:
+            entry = cache.get(cache_key)
+            version = None
+        now = time.time()
+
+        if entry is None or (self.hard_ttl is not None and now - entry['computed_at'] >= self.hard_ttl):
+            return self._compute(cache_key, args, kwargs), False
+
+        stale = now - entry['computed_at'] >= self.soft_ttl or entry.get('version') != version
+        if stale:
+            if not self.background:
+                return self._compute(cache_key, args, kwargs), False
+            self._revalidate_in_background(cache_key, args, kwargs)
+
+        return entry['value'], stale
+
+    def refresh(self, *args, **kwargs):
+        """Recompute and store the payload on the calling thread"""
+        return self._compute(self._cache_key(args, kwargs), args, kwargs)
+
+    def invalidate(self, *args, **kwargs):
+        """Drop the cached payload; the next call recomputes it"""
+        cache.delete(self._cache_key(args, kwargs))
+
+    def bump_version(self):
+        """Record a data change; cached payloads become stale"""
+        if not cache.add(self.version_key, 1, None):
+            try:
+                cache.incr(self.version_key)
+            except ValueError:
+                # Key evicted between add() and incr()
+                cache.set(self.version_key, 1, None)
+
+    def _cache_key(self, args, kwargs):
+        key = self.key(*args, **kwargs) if callable(self.key) else self.key
+        return f"{KEY_PREFIX}:{key}"
+
+    def _compute(self, cache_key, args, kwargs):
+        # Read the version first: changes made while computing leave it stale
+        version = cache.get(self.version_key, 0) if self.version_key else None
+        value = self.func(*args, **kwargs)
+        cache.set(
+            cache_key,
+            {'value': value, 'computed_at': time.time(), 'version': version},
+            self.hard_ttl
+        )
+        return value
+
+    def _revalidate_in_background(self, cache_key, args, kwargs):
+        with _in_flight_lock:
+            if cache_key in _in_flight:
+                return
+            _in_flight.add(cache_key)
+
+        lock_key = f"{cache_key}:lock"
+        if not cache.add(lock_key, True, self.lock_timeout):
+            # Another worker is already recomputing this payload
+            self._release(cache_key)
+            return
+
+        thread = threading.Thread(
+            target=self._background_compute,
+            args=(cache_key, lock_key, args, kwargs),
+            daemon=True
+        )
+        thread.start()
+
+    def _background_compute(self, cache_key, lock_key, args, kwargs):
+        try:
+            self._compute(cache_key, args, kwargs)
+        except Exception as e:
+            # The stale payload stays until hard_ttl
+            logger.error(f"Background refresh of {cache_key} failed: {e}")
+        finally:
+            # Background threads own their DB connections
+            connections.close_all()
+            cache.delete(lock_key)
+            self._release(cache_key)
+
+    @staticmethod
+    def _release(cache_key):
+        with _in_flight_lock:
+            _in_flight.discard(cache_key)
+
+
+def stale_while_revalidate(key, soft_ttl=60, hard_ttl=600, lock_timeout=None,
+                           version_key=None, background=True):
+    """
+    Decorator caching a function's return value with stale-while-revalidate.
+
+    Args:
+        key: Cache key, or a callable building it from the function arguments
+        soft_ttl: Seconds after which the payload is refreshed in the background
+        hard_ttl: Seconds after which the payload is never served (None - never)
+        lock_timeout: Single-flight lock expiry (defaults to max(30, soft_ttl))
+        version_key: Cache key of a data-version counter (see bump_version)
+        background: False - recompute stale payloads on the calling thread
+    """
+    def decorator(func):
+        return StaleWhileRevalidateCache(
+            func, key, soft_ttl, hard_ttl, lock_timeout, version_key, background
+        )
+    return decorator
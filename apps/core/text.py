@@ -0,0 +1,39 @@
+"""
+Text folding shared by caches and search.
+
+``normalize_text`` maps the spellings of the same Uzbek/Russian text to one
+form, so "Og'riq", "ogriq" and "оғриқ" compare equal:
+    - NFKC and lowercase;
+    - apostrophe variants (' ` ʻ ʼ ‘ ’) removed: "og'riq" == "ogriq";
+    - Cyrillic transliterated to Latin: "бошим оғрияпти" == "boshim ogriyapti";
+    - punctuation and repeated whitespace removed.
+"""
+import re
+import unicodedata
+
+APOSTROPHES = "'`ʻʼ‘’ʹ′"
+
+CYRILLIC_TO_LATIN = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'yo',
+    'ж': 'j', 'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm',
+    'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
+    'ф': 'f', 'х': 'x', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sh', 'ъ': '',
+    'ы': 'i', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+    # O'zbek kirill harflari
+    'ў': 'o', 'қ': 'q', 'ғ': 'g', 'ҳ': 'h',
+}
+
+_TRANSLATION_TABLE = str.maketrans({
+    **CYRILLIC_TO_LATIN,
+    **{char: '' for char in APOSTROPHES},
+})
+_PUNCTUATION_RE = re.compile(r'[^\w\s]|_')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_text(text):
+    """Fold text for comparison (see module docstring)"""
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    text = text.translate(_TRANSLATION_TABLE)
+    text = _PUNCTUATION_RE.sub(' ', text)
+    return _WHITESPACE_RE.sub(' ', text).strip()
@@ -126,3 +126,23 @@ def sanitize_filename(filename: str) -> str:
         filename = name[:max_length - len(ext) - 1] + '.' + ext if ext else name[:max_length]
 
     return filename
+
+
+def is_shared_cache(alias: str = 'default') -> bool:
+    """
+    Check if a cache backend is shared by all worker processes.
+
+    The default LocMemCache (and DummyCache) live inside one process, so
+    counters and version stamps stored there are invisible to other workers.
+
+    Args:
+        alias: Name of the cache in settings.CACHES
+
+    Returns:
+        bool: True for Redis, Memcached, database and file caches
+    """
+    from django.core.cache import caches
+    from django.core.cache.backends.dummy import DummyCache
+    from django.core.cache.backends.locmem import LocMemCache
+
+    return not isinstance(caches[alias], (LocMemCache, DummyCache))
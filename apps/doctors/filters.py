@@ -2,6 +2,7 @@ import django_filters
 from django.db.models import Q
 from .models import Doctor, DoctorFiles
 from ..hospitals.models import Regions, Districts
+from .services.search_index import search_doctors
 
 
 class DoctorFilter(django_filters.FilterSet):
@@ -146,17 +147,9 @@ class DoctorFilter(django_filters.FilterSet):
         return queryset
 
     def filter_search(self, queryset, name, value):
-        """General search - name, specialty, workplace, bio, location"""
+        """General search - name, specialty, workplace, bio, location, translations (ranked)"""
         if value:
-            return queryset.filter(
-                Q(user__first_name__icontains=value) |
-                Q(user__last_name__icontains=value) |
-                Q(specialty__icontains=value) |
-                Q(workplace__icontains=value) |
-                Q(bio__icontains=value) |
-                Q(region__name__icontains=value) |
-                Q(district__name__icontains=value)
-            )
+            return search_doctors(queryset, value)
         return queryset
 
     def filter_name(self, queryset, name, value):
@@ -0,0 +1,43 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.doctors.services.charge_rollup import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily ChargeLog rollup from ChargeLog rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            help='Only rebuild dates from this day on (YYYY-MM-DD)'
+        )
+        parser.add_argument(
+            '--doctor',
+            type=int,
+            action='append',
+            dest='doctor_ids',
+            help='Only rebuild this doctor id (can be repeated)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of rollup rows inserted per batch'
+        )
+
+    def handle(self, *args, **options):
+        start_date = None
+        if options['since']:
+            try:
+                start_date = date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError('--since must be a date in YYYY-MM-DD format')
+
+        written = rebuild_rollups(
+            doctor_ids=options['doctor_ids'],
+            start_date=start_date,
+            batch_size=options['batch_size']
+        )
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} daily charge rollup rows'))
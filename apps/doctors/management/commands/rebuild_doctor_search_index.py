@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from apps.doctors.services.search_index import ensure_search_index, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild doctor search documents and the full-text search index'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of doctors updated per batch'
+        )
+
+    def handle(self, *args, **options):
+        backend = ensure_search_index()
+        count = rebuild_search_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'{count} doctors indexed ({backend} backend)'))
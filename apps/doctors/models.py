@@ -10,11 +10,28 @@ from django.contrib.auth import get_user_model
 
 from django.utils import timezone
 
+from apps.core.geo import sync_geo_fields
+from apps.doctors.services.search_index import SEARCH_SOURCE_FIELDS, build_search_document
 from apps.doctors.services.translation_service import TahrirchiTranslationService
 
 User = get_user_model()
 
 
+class DoctorQuerySet(models.QuerySet):
+    """Shifokorlar so'rovlari"""
+
+    # DoctorSerializer ro'yxatda o'qiydigan bog'lanishlar - sahifa bir necha so'rovda serializatsiya qilinadi
+    LISTING_SELECT_RELATED = ('user__region', 'user__district', 'hospital', 'translations')
+    LISTING_PREFETCH_RELATED = ('files',)
+
+    def for_listing(self):
+        """DoctorSerializer(many=True) uchun kerakli select_related/prefetch_related"""
+        return self.select_related(*self.LISTING_SELECT_RELATED).prefetch_related(
+            *self.LISTING_PREFETCH_RELATED,
+            models.Prefetch('services', queryset=DoctorService.objects.select_related('name')),
+        )
+
+
 class Doctor(models.Model):
     """Shifokorlar modeli - User model bilan bog'langan"""
 
@@ -109,6 +126,14 @@ class Doctor(models.Model):
     latitude = models.CharField(max_length=50, blank=True, null=True, verbose_name="Kenglik")
     longitude = models.CharField(max_length=50, blank=True, null=True, verbose_name="Uzunlik")
 
+    # Raqamli koordinatalar va geohash - "yaqin atrofda" qidiruvi uchun (apps/core/geo.py)
+    geo_latitude = models.FloatField(blank=True, null=True, editable=False, verbose_name="Kenglik (raqam)")
+    geo_longitude = models.FloatField(blank=True, null=True, editable=False, verbose_name="Uzunlik (raqam)")
+    geohash = models.CharField(max_length=12, blank=True, default='', editable=False, verbose_name="Geohash")
+
+    # Qidiruv matni - ism, mutaxassislik, ish joyi, tarjimalar (apps/doctors/services/search_index.py)
+    search_document = models.TextField(blank=True, default='', editable=False, verbose_name="Qidiruv matni")
+
     # Schedule and availability
     is_available = models.BooleanField(default=True, verbose_name="Mavjud")
     is_online_consultation = models.BooleanField(default=True, verbose_name="Online konsultatsiya")
@@ -171,6 +196,8 @@ class Doctor(models.Model):
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Yangilangan")
     last_activity = models.DateTimeField(blank=True, null=True, verbose_name="Oxirgi faollik")
 
+    objects = DoctorQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Shifokor"
         verbose_name_plural = "Shifokorlar"
@@ -181,11 +208,24 @@ class Doctor(models.Model):
             models.Index(fields=['is_available']),
             models.Index(fields=['rating']),
             models.Index(fields=['hospital']),
+            models.Index(fields=['geohash']),
+            models.Index(fields=['geo_latitude', 'geo_longitude']),
         ]
 
     def __str__(self):
         return f"Dr. {self.user.get_full_name()} - {self.get_specialty_display()}"
 
+    def save(self, *args, **kwargs):
+        kwargs['update_fields'] = sync_geo_fields(self, kwargs.get('update_fields'))
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or SEARCH_SOURCE_FIELDS & set(update_fields):
+            self.search_document = build_search_document(self)
+            if update_fields is not None and 'search_document' not in update_fields:
+                kwargs['update_fields'] = list(update_fields) + ['search_document']
+
+        super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         return reverse('doctors:detail', kwargs={'pk': self.pk})
 
@@ -361,12 +401,34 @@ class Doctor(models.Model):
         if not hasattr(self.user, 'wallet'):
             return False, "Hamyon topilmadi"
 
-        if self.user.wallet.balance < Decimal(str(amount)):
+        from apps.billing import sub_ledger
+
+        if sub_ledger.get_available_balance(self.user.wallet) < Decimal(str(amount)):
             return False, "Hamyonda yetarli mablag' yo'q"
 
+        if sub_ledger.is_enabled():
+            # Hamyon qatori yangilanmaydi - to'lov keyinroq guruhlab hisoblanadi
+            from apps.billing.models import PendingCharge
+
+            sub_ledger.defer_charges([PendingCharge(
+                wallet=self.user.wallet,
+                doctor=self,
+                charge_type=charge_type,
+                amount=Decimal(str(amount)),
+                viewer=user,
+                ip_address=ip_address,
+                user_agent=user_agent or '',
+                metadata=metadata or {}
+            )])
+            return True, "To'lov muvaffaqiyatli amalga oshirildi"
+
         # Deduct from user's wallet
-        self.user.wallet.balance -= Decimal(str(amount))
-        self.user.wallet.save(update_fields=['balance'])
+        try:
+            self.user.wallet.deduct_balance(
+                Decimal(str(amount)), f"{dict(ChargeLog.CHARGE_TYPES).get(charge_type, charge_type)} - Dr. {self.full_name}"
+            )
+        except ValueError:
+            return False, "Hamyonda yetarli mablag' yo'q"
 
         # Create charge log
         ChargeLog.objects.create(
@@ -913,3 +975,111 @@ class ChargeLog(models.Model):
 
     def __str__(self):
         return f"{self.doctor.full_name} - {self.get_charge_type_display()} - {self.amount}"
+
+
+class ChargeLogDailyRollup(models.Model):
+    """ChargeLog kunlik yig'indisi (statistika uchun)"""
+
+    doctor = models.ForeignKey(
+        Doctor,
+        on_delete=models.CASCADE,
+        related_name='charge_rollups',
+        verbose_name="Shifokor"
+    )
+
+    date = models.DateField(verbose_name="Sana")
+
+    charge_type = models.CharField(
+        max_length=20,
+        choices=ChargeLog.CHARGE_TYPES,
+        verbose_name="To'lov turi"
+    )
+
+    count = models.PositiveIntegerField(default=0, verbose_name="Soni")
+
+    amount = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        verbose_name="Summa"
+    )
+
+    class Meta:
+        verbose_name = "Kunlik to'lov statistikasi"
+        verbose_name_plural = "Kunlik to'lov statistikasi"
+        ordering = ['-date']
+        unique_together = ['doctor', 'date', 'charge_type']
+        indexes = [
+            models.Index(fields=['date']),
+        ]
+
+    def __str__(self):
+        return f"{self.doctor_id} - {self.date} - {self.charge_type}: {self.count}"
+
+
+# Signal handlers for the daily charge rollup
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+
+@receiver(post_save, sender=ChargeLog)
+def add_charge_to_rollup(sender, instance, created, **kwargs):
+    """Add new charges to the daily rollup"""
+    if created:
+        from apps.doctors.services.charge_rollup import record_charge_logs
+        record_charge_logs([instance])
+
+
+@receiver(post_delete, sender=ChargeLog)
+def remove_charge_from_rollup(sender, instance, **kwargs):
+    """Remove deleted charges from the daily rollup"""
+    from apps.doctors.services.charge_rollup import record_charge_logs
+    record_charge_logs([instance], sign=-1)
+
+
+# Signal handlers for the doctor search index
+from django.db import transaction
+
+from apps.doctors.services import search_index
+
+SEARCH_USER_FIELDS = {'first_name', 'last_name', 'middle_name', 'region', 'district'}
+
+
+@receiver(post_save, sender=Doctor)
+def index_saved_doctor(sender, instance, update_fields=None, **kwargs):
+    """Keep the search index row in sync with search_document"""
+    if update_fields is None or 'search_document' in update_fields:
+        doctor_id, document = instance.pk, instance.search_document
+        transaction.on_commit(lambda: search_index.index_doctor(doctor_id, document))
+
+
+@receiver(post_delete, sender=Doctor)
+def unindex_deleted_doctor(sender, instance, **kwargs):
+    doctor_id = instance.pk
+    transaction.on_commit(lambda: search_index.unindex_doctor(doctor_id))
+
+
+@receiver(post_save, sender=DoctorTranslation)
+@receiver(post_delete, sender=DoctorTranslation)
+def refresh_doctor_search_from_translation(sender, instance, **kwargs):
+    """Translated texts are part of the search document"""
+    doctor_id = instance.doctor_id
+    transaction.on_commit(lambda: search_index.refresh_search_document(doctor_id))
+
+
+def refresh_doctor_search_from_user(sender, instance, update_fields=None, **kwargs):
+    """Names and region/district of the user are part of the search document"""
+    if instance.user_type != 'doctor':
+        return
+    if update_fields is not None and not SEARCH_USER_FIELDS & set(update_fields):
+        return
+    doctor_id = Doctor.objects.filter(user_id=instance.pk).values_list('pk', flat=True).first()
+    if doctor_id is not None:
+        transaction.on_commit(lambda: search_index.refresh_search_document(doctor_id))
+
+
+post_save.connect(
+    refresh_doctor_search_from_user,
+    sender=settings.AUTH_USER_MODEL,
+    dispatch_uid='doctors_refresh_search_from_user'
+)
@@ -19,6 +19,26 @@ from .services.translation_service import TranslationConfig
 
 User = get_user_model()
 
+TRANSLATED_FIELDS = ['bio', 'achievements', 'education', 'workplace', 'workplace_address']
+
+# Empty translation per language, built once
+_EMPTY_LANGUAGES = {
+    lang_item[0] if isinstance(lang_item, tuple) else lang_item: ""
+    for lang_item in TranslationConfig.LANGUAGES
+}
+
+
+def get_doctor_translations(doctor):
+    """
+    Translations of a doctor, or empty ones for every field and language.
+
+    Uses the ``translations`` relation cached by Doctor.objects.for_listing().
+    """
+    try:
+        return doctor.translations.translations
+    except DoctorTranslation.DoesNotExist:
+        return {field: dict(_EMPTY_LANGUAGES) for field in TRANSLATED_FIELDS}
+
 
 class DoctorFilesSerializer(serializers.ModelSerializer):
     """Shifokor hujjatlari serializer"""
@@ -104,24 +124,16 @@ class DoctorSerializer(serializers.ModelSerializer):
     phone = serializers.CharField(source='user.phone', read_only=True)
 
     translations = serializers.SerializerMethodField()
+    # Only set by ?lat=&lng= (near me) searches
+    distance_km = serializers.SerializerMethodField()
+
+    def get_distance_km(self, obj):
+        distance = getattr(obj, 'distance_km', None)
+        return round(distance, 2) if distance is not None else None
 
     def get_translations(self, obj):
         """Get translations for bio and achievements"""
-        try:
-            return DoctorTranslation.objects.get(doctor=obj).translations
-        except DoctorTranslation.DoesNotExist:
-            return {
-                'bio': {lang_item[0] if isinstance(lang_item, tuple) else lang_item: ""
-                       for lang_item in TranslationConfig.LANGUAGES},
-                'achievements': {lang_item[0] if isinstance(lang_item, tuple) else lang_item: ""
-                                for lang_item in TranslationConfig.LANGUAGES},
-                'education': {lang_item[0] if isinstance(lang_item, tuple) else lang_item: ""
-                                for lang_item in TranslationConfig.LANGUAGES},
-                'workplace': {lang_item[0] if isinstance(lang_item, tuple) else lang_item: ""
-                                for lang_item in TranslationConfig.LANGUAGES},
-                'workplace_address': {lang_item[0] if isinstance(lang_item, tuple) else lang_item: ""
-                                for lang_item in TranslationConfig.LANGUAGES},
-            }
+        return get_doctor_translations(obj)
 
     class Meta:
         model = Doctor
@@ -134,7 +146,8 @@ class DoctorSerializer(serializers.ModelSerializer):
             'success_rate', 'avatar', 'region_name', 'hospital_id',
             'district_name', 'region_id', 'district_id', 'files', 'services',
             'work_start_time', 'work_end_time', 'work_days',
-            'first_name', 'last_name', 'middle_name', 'full_name', 'phone', 'translations'
+            'first_name', 'last_name', 'middle_name', 'full_name', 'phone', 'translations',
+            'distance_km'
         ]
 
 
@@ -373,21 +386,7 @@ class DoctorProfileSerializer(serializers.ModelSerializer):
 
     def get_translations(self, obj):
         """Get translations for bio and achievements"""
-        try:
-            return DoctorTranslation.objects.get(doctor=obj).translations
-        except DoctorTranslation.DoesNotExist:
-            return {
-                'bio': {lang_item[0] if isinstance(lang_item, tuple) else lang_item: ""
-                       for lang_item in TranslationConfig.LANGUAGES},
-                'achievements': {lang_item[0] if isinstance(lang_item, tuple) else lang_item: ""
-                                for lang_item in TranslationConfig.LANGUAGES},
-                'education': {lang_item[0] if isinstance(lang_item, tuple) else lang_item: ""
-                                for lang_item in TranslationConfig.LANGUAGES},
-                'workplace': {lang_item[0] if isinstance(lang_item, tuple) else lang_item: ""
-                                for lang_item in TranslationConfig.LANGUAGES},
-                'workplace_address': {lang_item[0] if isinstance(lang_item, tuple) else lang_item: ""
-                                for lang_item in TranslationConfig.LANGUAGES},
-            }
+        return get_doctor_translations(obj)
 
     class Meta:
         model = Doctor
@@ -0,0 +1,228 @@
+"""
+Daily ChargeLog rollup.
+
+Statistics endpoints need charge counts and sums per doctor and charge type
+over all time, this month or a custom range. ChargeLogDailyRollup keeps one
+row per (doctor, date, charge_type), so those figures are aggregated over a
+few hundred rollup rows instead of the full ChargeLog history.
+
+Rows are maintained incrementally:
+    - ChargeLog.objects.create() -> post_save signal
+    - bulk_create()              -> call record_charge_logs() explicitly
+and rebuilt from ChargeLog by ``manage.py backfill_charge_rollups``.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, DecimalField, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest, TruncDate
+from django.utils import timezone
+
+# Charge types reported separately by the statistics views
+STAT_CHARGE_TYPES = {
+    'total_searches': 'search',
+    'total_card_views': 'view_card',
+    'total_phone_views': 'view_phone',
+}
+
+
+def _charge_date(charge_log):
+    created_at = charge_log.created_at or timezone.now()
+    if timezone.is_aware(created_at):
+        return timezone.localdate(created_at)
+    return created_at.date()
+
+
+def record_charge_logs(charge_logs, sign=1):
+    """
+    Add (or with sign=-1 remove) charges to the daily rollup.
+
+    Args:
+        charge_logs: Iterable of saved ChargeLog instances
+        sign: 1 for new charges, -1 for deleted charges
+    """
+    from apps.doctors.models import ChargeLogDailyRollup
+
+    groups = defaultdict(lambda: [0, Decimal('0')])
+    for charge_log in charge_logs:
+        group = groups[(charge_log.doctor_id, _charge_date(charge_log), charge_log.charge_type)]
+        group[0] += 1
+        group[1] += Decimal(str(charge_log.amount))
+
+    if not groups:
+        return
+
+    # One SELECT, one UPDATE and one INSERT for the whole batch
+    keys = Q()
+    for doctor_id, day, charge_type in groups:
+        keys |= Q(doctor_id=doctor_id, date=day, charge_type=charge_type)
+    existing = {
+        (doctor_id, day, charge_type): rollup_id
+        for rollup_id, doctor_id, day, charge_type in ChargeLogDailyRollup.objects.filter(keys).values_list(
+            'id', 'doctor_id', 'date', 'charge_type'
+        )
+    }
+
+    if existing:
+        _increment_rollups({existing[key]: groups[key] for key in existing}, sign)
+
+    missing = [key for key in groups if key not in existing]
+    if not missing or sign < 0:
+        return
+
+    try:
+        with transaction.atomic():
+            ChargeLogDailyRollup.objects.bulk_create([
+                ChargeLogDailyRollup(
+                    doctor_id=doctor_id, date=day, charge_type=charge_type,
+                    count=groups[(doctor_id, day, charge_type)][0],
+                    amount=groups[(doctor_id, day, charge_type)][1],
+                )
+                for doctor_id, day, charge_type in missing
+            ])
+    except IntegrityError:
+        # Some rows were created concurrently by another request
+        for doctor_id, day, charge_type in missing:
+            count, amount = groups[(doctor_id, day, charge_type)]
+            lookup = {'doctor_id': doctor_id, 'date': day, 'charge_type': charge_type}
+            if ChargeLogDailyRollup.objects.filter(**lookup).update(
+                count=F('count') + count, amount=F('amount') + amount
+            ):
+                continue
+            with transaction.atomic():
+                ChargeLogDailyRollup.objects.create(count=count, amount=amount, **lookup)
+
+
+def _increment_rollups(increments, sign):
+    """
+    Add {rollup_id: [count, amount]} to existing rollup rows in one UPDATE.
+
+    Removals are clamped at zero: a rollup rebuilt after some of its charges
+    were deleted must not go negative when their deletion is replayed.
+    """
+    from apps.doctors.models import ChargeLogDailyRollup
+
+    count = F('count') + Case(
+        *[When(pk=rollup_id, then=Value(sign * count)) for rollup_id, (count, _) in increments.items()],
+        output_field=IntegerField()
+    )
+    amount = F('amount') + Case(
+        *[When(pk=rollup_id, then=Value(sign * amount)) for rollup_id, (_, amount) in increments.items()],
+        output_field=DecimalField(max_digits=12, decimal_places=2)
+    )
+    if sign < 0:
+        count = Greatest(count, Value(0))
+        amount = Greatest(amount, Value(Decimal('0')), output_field=DecimalField(max_digits=12, decimal_places=2))
+
+    ChargeLogDailyRollup.objects.filter(pk__in=increments).update(count=count, amount=amount)
+
+
+def get_charge_totals(doctor=None, start_date=None, end_date=None):
+    """
+    Charge statistics from the rollup.
+
+    Args:
+        doctor: Doctor instance or id (None - all doctors)
+        start_date: First date to include (None - from the beginning)
+        end_date: Last date to include (None - until today)
+
+    Returns:
+        dict: total_searches, total_card_views, total_phone_views,
+              total_charges and total_charge_amount
+    """
+    from apps.doctors.models import ChargeLogDailyRollup
+
+    rollups = ChargeLogDailyRollup.objects.all()
+    if doctor is not None:
+        rollups = rollups.filter(doctor=doctor)
+    if start_date is not None:
+        rollups = rollups.filter(date__gte=start_date)
+    if end_date is not None:
+        rollups = rollups.filter(date__lte=end_date)
+
+    totals = rollups.aggregate(
+        **{
+            name: Sum('count', filter=Q(charge_type=charge_type))
+            for name, charge_type in STAT_CHARGE_TYPES.items()
+        },
+        total_charges=Sum('count'),
+        total_charge_amount=Sum('amount')
+    )
+    return {
+        name: value or (Decimal('0') if name == 'total_charge_amount' else 0)
+        for name, value in totals.items()
+    }
+
+
+def charge_total_annotations(prefix='charge_rollups__'):
+    """
+    Annotations computing get_charge_totals() fields per row of a grouped query.
+
+    Usage: Doctor.objects.annotate(**charge_total_annotations())
+    """
+    def total(field, **filters):
+        rollup_filter = Q(**{f'{prefix}{name}': value for name, value in filters.items()})
+        return Coalesce(
+            Sum(f'{prefix}{field}', filter=rollup_filter if filters else None),
+            Value(0),
+            output_field=DecimalField() if field == 'amount' else IntegerField()
+        )
+
+    annotations = {
+        name: total('count', charge_type=charge_type)
+        for name, charge_type in STAT_CHARGE_TYPES.items()
+    }
+    annotations['total_charges'] = total('count')
+    annotations['total_charge_amount'] = total('amount')
+    return annotations
+
+
+def rebuild_rollups(doctor_ids=None, start_date=None, batch_size=1000):
+    """
+    Rebuild rollup rows from ChargeLog.
+
+    Args:
+        doctor_ids: Only rebuild these doctors (None - all doctors)
+        start_date: Only rebuild dates from this day on (None - full history)
+        batch_size: bulk_create batch size
+
+    Returns:
+        int: Number of rollup rows written
+    """
+    from apps.doctors.models import ChargeLog, ChargeLogDailyRollup
+
+    charge_logs = ChargeLog.objects.all()
+    rollups = ChargeLogDailyRollup.objects.all()
+    if doctor_ids:
+        charge_logs = charge_logs.filter(doctor_id__in=doctor_ids)
+        rollups = rollups.filter(doctor_id__in=doctor_ids)
+    if start_date is not None:
+        charge_logs = charge_logs.filter(created_at__date__gte=start_date)
+        rollups = rollups.filter(date__gte=start_date)
+
+    rows = (
+        charge_logs
+        .annotate(day=TruncDate('created_at'))
+        .values('doctor_id', 'day', 'charge_type')
+        .annotate(total_count=Count('id'), total_amount=Sum('amount'))
+        .order_by()
+    )
+
+    with transaction.atomic():
+        rollups.delete()
+        ChargeLogDailyRollup.objects.bulk_create(
+            [
+                ChargeLogDailyRollup(
+                    doctor_id=row['doctor_id'],
+                    date=row['day'],
+                    charge_type=row['charge_type'],
+                    count=row['total_count'],
+                    amount=row['total_amount'] or 0
+                )
+                for row in rows.iterator(chunk_size=batch_size)
+            ],
+            batch_size=batch_size
+        )
+
+    return rollups.count()
@@ -0,0 +1,256 @@
+"""
+Batched search-visibility charging.
+
+Doctors pay for appearing in search results, at most once per viewer
+(user or IP) per doctor per day. Charging a whole result page at once keeps
+the number of queries fixed regardless of page size:
+
+    1 cache.get_many      - per-day dedup keys
+    1 SELECT              - wallets of the affected doctors (no locks)
+    1 conditional UPDATE  - new wallet balances (apps/billing/ledger.py)
+    3 bulk INSERTs        - WalletTransaction, DoctorViewCharge, ChargeLog
+    1 upsert per day/type - daily charge rollup (one row for a search page)
+    1 cache.set_many      - mark doctors as charged for today
+
+With the billing sub-ledger enabled (apps/billing/sub_ledger.py) the
+wallets are read without locks and the page costs a single bulk INSERT of
+PendingCharge rows; balances are updated later in settlement batches.
+"""
+import logging
+from datetime import date
+
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+
+from apps.billing import ledger, sub_ledger
+from apps.core.utils import get_client_ip
+from apps.doctors.services.charge_rollup import record_charge_logs
+
+logger = logging.getLogger(__name__)
+
+# Per-doctor outcomes returned by charge_search_batch
+CHARGED = 'charged'
+ALREADY_CHARGED = 'already_charged'
+NO_CHARGE = 'no_charge'
+NO_WALLET = 'no_wallet'
+WALLET_BLOCKED = 'wallet_blocked'
+INSUFFICIENT_BALANCE = 'insufficient_balance'
+FAILED = 'failed'
+
+CHARGE_KEY_TTL = 86400  # 24 hours
+
+
+def get_search_charge_key(doctor_id, charge_identifier, today=None):
+    """Cache key marking that a viewer has already been charged for a doctor today"""
+    return f"doctor_search_charge_{doctor_id}_{charge_identifier}_{today or date.today()}"
+
+
+def _get_search_charge(doctor):
+    """Return the doctor's configured search charge, or None when not chargeable"""
+    try:
+        charges = doctor.charges
+    except ObjectDoesNotExist:
+        return None
+
+    if charges.search_charge <= 0:
+        return None
+    return charges.search_charge
+
+
+def charge_search_batch(doctors, request):
+    """
+    Charge every doctor on a search result page for search visibility.
+
+    Args:
+        doctors: Iterable of Doctor instances (ideally with ``charges`` selected)
+        request: Django/DRF request object of the viewer
+
+    Returns:
+        dict: Mapping of doctor id to one of the outcome constants above
+    """
+    from apps.billing.models import DoctorViewCharge, UserWallet
+    from apps.doctors.models import ChargeLog
+
+    doctors = list(doctors)
+    outcomes = {}
+
+    user = request.user if request.user.is_authenticated else None
+    ip_address = get_client_ip(request)
+    user_agent = request.META.get('HTTP_USER_AGENT', '')[:255]
+    charge_identifier = f"user_{user.id}" if user else f"ip_{ip_address}"
+    viewer_name = (user.get_full_name() or user.username) if user else 'anonymous user'
+    viewer = user.username if user else f'anonymous_{ip_address}'
+
+    # Doctors without a configured charge are never billed
+    chargeable = {}
+    for doctor in doctors:
+        amount = _get_search_charge(doctor)
+        if amount is None:
+            outcomes[doctor.id] = NO_CHARGE
+        else:
+            chargeable[doctor.id] = (doctor, amount)
+
+    if not chargeable:
+        return outcomes
+
+    # Resolve all per-day dedup keys with a single cache round trip
+    today = date.today()
+    keys = {
+        get_search_charge_key(doctor_id, charge_identifier, today): doctor_id
+        for doctor_id in chargeable
+    }
+    for key in cache.get_many(list(keys)):
+        doctor_id = keys[key]
+        outcomes[doctor_id] = ALREADY_CHARGED
+        del chargeable[doctor_id]
+
+    if not chargeable:
+        return outcomes
+
+    if sub_ledger.is_enabled():
+        return _defer_search_charges(
+            chargeable, outcomes, user, ip_address, user_agent, viewer, charge_identifier, today
+        )
+
+    charged_keys = {}
+    try:
+        wallets = {
+            wallet.user_id: wallet
+            for wallet in UserWallet.objects.filter(
+                user_id__in=[doctor.user_id for doctor, _ in chargeable.values()]
+            )
+        }
+
+        debits = []
+        for doctor_id, (doctor, amount) in chargeable.items():
+            wallet = wallets.get(doctor.user_id)
+            if wallet is None:
+                outcomes[doctor_id] = NO_WALLET
+                continue
+            if wallet.is_blocked:
+                outcomes[doctor_id] = WALLET_BLOCKED
+                continue
+            if not wallet.has_sufficient_balance(amount):
+                outcomes[doctor_id] = INSUFFICIENT_BALANCE
+                continue
+            debits.append((doctor, amount, ledger.LedgerEntry(
+                wallet.id, 'debit', amount, f"Search visibility charge - viewed by {viewer_name}"
+            )))
+
+        if debits:
+            with transaction.atomic():
+                # The balance is re-checked by the conditional UPDATE
+                wallet_transactions = ledger.post([entry for _, _, entry in debits], partial=True)
+
+                view_charges = []
+                charge_logs = []
+                for (doctor, amount, _), wallet_transaction in zip(debits, wallet_transactions):
+                    if wallet_transaction is None:
+                        outcomes[doctor.id] = INSUFFICIENT_BALANCE
+                        continue
+
+                    # DoctorViewCharge tracks who viewed the doctor
+                    if user:
+                        view_charges.append(DoctorViewCharge(
+                            user=user,
+                            doctor=doctor,
+                            transaction=wallet_transaction,
+                            amount_charged=amount,
+                            ip_address=ip_address
+                        ))
+
+                    charge_logs.append(ChargeLog(
+                        doctor=doctor,
+                        charge_type='search',
+                        amount=amount,
+                        user=user,
+                        ip_address=ip_address,
+                        user_agent=user_agent,
+                        metadata={
+                            'action': 'search_visibility',
+                            'charged_to': 'doctor',
+                            'viewer': viewer
+                        }
+                    ))
+
+                    outcomes[doctor.id] = CHARGED
+                    charged_keys[get_search_charge_key(doctor.id, charge_identifier, today)] = True
+
+                if view_charges:
+                    DoctorViewCharge.objects.bulk_create(view_charges)
+                ChargeLog.objects.bulk_create(charge_logs)
+                # bulk_create skips post_save, so update the rollup explicitly
+                record_charge_logs(charge_logs)
+
+    except Exception as e:
+        # Log error but don't fail the search request
+        logger.error(f"Batch search charge failed for doctors {list(chargeable)}: {e}")
+        for doctor_id in chargeable:
+            outcomes[doctor_id] = FAILED
+        return outcomes
+
+    # Mark as charged for today
+    if charged_keys:
+        cache.set_many(charged_keys, CHARGE_KEY_TTL)
+
+    return outcomes
+
+
+def _defer_search_charges(chargeable, outcomes, user, ip_address, user_agent, viewer, charge_identifier, today):
+    """Sub-ledger variant of charge_search_batch: one bulk INSERT, no wallet locks"""
+    from apps.billing.models import PendingCharge, UserWallet
+
+    charged_keys = {}
+    try:
+        wallets = {
+            wallet.user_id: wallet
+            for wallet in UserWallet.objects.filter(
+                user_id__in=[doctor.user_id for doctor, _ in chargeable.values()]
+            )
+        }
+        pending = sub_ledger.get_pending_totals(wallet.id for wallet in wallets.values())
+
+        pending_charges = []
+        for doctor_id, (doctor, amount) in chargeable.items():
+            wallet = wallets.get(doctor.user_id)
+            if wallet is None:
+                outcomes[doctor_id] = NO_WALLET
+                continue
+            if wallet.is_blocked:
+                outcomes[doctor_id] = WALLET_BLOCKED
+                continue
+            if wallet.balance - pending.get(wallet.id, 0) < amount:
+                outcomes[doctor_id] = INSUFFICIENT_BALANCE
+                continue
+
+            pending_charges.append(PendingCharge(
+                wallet=wallet,
+                doctor=doctor,
+                charge_type='search',
+                amount=amount,
+                viewer=user,
+                ip_address=ip_address,
+                user_agent=user_agent,
+                track_view=True,
+                metadata={
+                    'action': 'search_visibility',
+                    'charged_to': 'doctor',
+                    'viewer': viewer
+                }
+            ))
+            outcomes[doctor_id] = CHARGED
+            charged_keys[get_search_charge_key(doctor_id, charge_identifier, today)] = True
+
+        sub_ledger.defer_charges(pending_charges, pending_totals=pending)
+
+    except Exception as e:
+        # Log error but don't fail the search request
+        logger.error(f"Deferred search charge failed for doctors {list(chargeable)}: {e}")
+        for doctor_id in chargeable:
+            outcomes[doctor_id] = FAILED
+        return outcomes
+
+    if charged_keys:
+        cache.set_many(charged_keys, CHARGE_KEY_TTL)
+    return outcomes
@@ -0,0 +1,305 @@
+"""
+Doctor full-text search.
+
+Every doctor keeps a ``search_document``: names, specialty, workplace, bio,
+hospital, region/district names in all four languages and every string in
+DoctorTranslation.translations, folded with apps.core.text.normalize_text
+(Uzbek Latin/Cyrillic, apostrophes, case). Search terms are folded the same
+way, so "Каримов", "karimov" and "Karimov" match each other.
+
+The document is rebuilt on Doctor save (when a source field is saved), on
+DoctorTranslation save/delete and when a doctor's user changes name or
+region (see the signal handlers in doctors/models.py). It is queried through
+an index that keeps latency flat as the table grows:
+
+    - PostgreSQL: ``to_tsvector('simple', search_document)`` GIN index,
+      prefix tsquery, ranked with ts_rank;
+    - SQLite: FTS5 table ``doctors_doctor_search_fts`` (rowid = doctor id),
+      prefix MATCH as a subquery of the filtered queryset, ranked with bm25
+      (looked up by rowid for the matching rows only);
+    - other backends / SQLite without FTS5, or while the index does not
+      exist yet: AND of ``contains`` lookups on the folded column, unranked.
+
+The index objects are created by ``manage.py rebuild_doctor_search_index``
+(which also rebuilds documents and index rows), never on the request path:
+requests only look the index up in the catalog and fall back to ``contains``
+when it is missing.
+"""
+import logging
+
+from django.db import OperationalError, connection
+from django.db.models import F, FloatField, Func, Value
+from django.db.models.expressions import RawSQL
+
+from apps.core.text import normalize_text
+
+FTS_TABLE = 'doctors_doctor_search_fts'
+PG_INDEX = 'doctors_doctor_search_gin'
+
+# Doctor fields that end up in the search document
+SEARCH_SOURCE_FIELDS = {
+    'user', 'specialty', 'workplace', 'workplace_address', 'bio', 'hospital',
+}
+
+MAX_TERMS = 8
+
+logger = logging.getLogger(__name__)
+
+_fts5_compiled = {}
+
+
+def _iter_strings(value):
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _iter_strings(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from _iter_strings(item)
+
+
+def _place_names(place):
+    if place is None:
+        return []
+    return [place.name, place.name_ru, place.name_en, place.name_kr]
+
+
+def build_search_document(doctor, translations=None):
+    """
+    Folded search text of a doctor.
+
+    Args:
+        doctor: Doctor instance
+        translations: DoctorTranslation.translations (None - loaded from the DB)
+    """
+    from apps.doctors.models import DoctorTranslation
+
+    user = doctor.user
+    parts = [
+        user.first_name, user.last_name, user.middle_name,
+        doctor.specialty, doctor.get_specialty_display(),
+        doctor.workplace, doctor.workplace_address, doctor.bio,
+        doctor.hospital.name if doctor.hospital_id else None,
+        *_place_names(user.region),
+        *_place_names(user.district),
+    ]
+
+    if translations is None and doctor.pk:
+        translations = DoctorTranslation.objects.filter(
+            doctor_id=doctor.pk
+        ).values_list('translations', flat=True).first()
+    parts.extend(_iter_strings(translations or {}))
+
+    folded = normalize_text(' '.join(part for part in parts if part))
+    # Repeated words add nothing to matching
+    return ' '.join(dict.fromkeys(folded.split()))
+
+
+def get_backend():
+    """Backend the database supports: 'postgres', 'fts5' or 'like'"""
+    if connection.vendor == 'postgresql':
+        return 'postgres'
+    if connection.vendor == 'sqlite' and _fts5_available():
+        return 'fts5'
+    return 'like'
+
+
+def _fts5_available():
+    # A compile option of the SQLite library, fixed for the process
+    if connection.alias not in _fts5_compiled:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+            _fts5_compiled[connection.alias] = bool(cursor.fetchone()[0])
+    return _fts5_compiled[connection.alias]
+
+
+def search_index_exists(backend=None):
+    """Catalog lookup of the FTS5 table / GIN index (no DDL)"""
+    backend = backend or get_backend()
+    with connection.cursor() as cursor:
+        if backend == 'postgres':
+            cursor.execute("SELECT 1 FROM pg_indexes WHERE indexname = %s", [PG_INDEX])
+        elif backend == 'fts5':
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE name = %s", [FTS_TABLE])
+        else:
+            return False
+        return cursor.fetchone() is not None
+
+
+def get_search_backend():
+    """Backend usable right now: 'like' until the index has been created"""
+    backend = get_backend()
+    if backend != 'like' and not search_index_exists(backend):
+        return 'like'
+    return backend
+
+
+def ensure_search_index():
+    """
+    Create the FTS5 table / GIN index if missing.
+
+    Schema change - run from rebuild_doctor_search_index, not from requests.
+    The GIN index is built CONCURRENTLY, so call it outside a transaction.
+    """
+    backend = get_backend()
+    if backend == 'like' or search_index_exists(backend):
+        return backend
+
+    with connection.cursor() as cursor:
+        if backend == 'postgres':
+            cursor.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {PG_INDEX} ON doctors_doctor "
+                f"USING gin (to_tsvector('simple'::regconfig, COALESCE(search_document, '')))"
+            )
+        else:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+                f"document, tokenize = 'unicode61 remove_diacritics 2')"
+            )
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, document) "
+                f"SELECT id, search_document FROM doctors_doctor WHERE search_document != ''"
+            )
+    return backend
+
+
+def index_doctor(doctor_id, document):
+    """
+    Store a doctor's search document in the FTS5 table.
+
+    Skipped while the table does not exist; rebuild_doctor_search_index
+    fills it from search_document when it is created.
+    """
+    if get_search_backend() == 'fts5':
+        _write_fts_row(doctor_id, document)
+
+
+def _write_fts_row(doctor_id, document):
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [doctor_id])
+            if document:
+                cursor.execute(
+                    f"INSERT INTO {FTS_TABLE} (rowid, document) VALUES (%s, %s)",
+                    [doctor_id, document]
+                )
+    except OperationalError as e:
+        # Table dropped meanwhile; the next rebuild restores the row
+        logger.error(f"Failed to index doctor {doctor_id}: {e}")
+
+
+def unindex_doctor(doctor_id):
+    """Remove a deleted doctor from the FTS5 table"""
+    index_doctor(doctor_id, '')
+
+
+def refresh_search_document(doctor_id):
+    """Rebuild one doctor's document (translation or user changed)"""
+    from apps.doctors.models import Doctor
+
+    doctor = Doctor.objects.select_related(
+        'user__region', 'user__district', 'hospital'
+    ).filter(pk=doctor_id).first()
+    if doctor is None:
+        return
+
+    document = build_search_document(doctor)
+    Doctor.objects.filter(pk=doctor_id).update(search_document=document)
+    index_doctor(doctor_id, document)
+
+
+class FTSRank(Func):
+    """bm25 relevance of a doctor for an FTS5 MATCH expression (higher is better)"""
+    output_field = FloatField()
+
+    def __init__(self, match, expression='pk'):
+        super().__init__(F(expression))
+        self.match = match
+
+    def as_sql(self, compiler, connection, **extra_context):
+        rowid_sql, rowid_params = compiler.compile(self.source_expressions[0])
+        sql = (
+            f"(SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s AND rowid = {rowid_sql})"
+        )
+        return sql, [self.match, *rowid_params]
+
+
+def search_doctors(queryset, query):
+    """
+    Filter a Doctor queryset by a search query, best matches first.
+
+    Rows get a ``search_rank`` annotation (higher is better; 0 when the query
+    has no searchable terms and the queryset is returned unfiltered).
+    """
+    terms = normalize_text(query).split()[:MAX_TERMS]
+    if not terms:
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    backend = get_search_backend()
+
+    if backend == 'postgres':
+        from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+
+        vector = SearchVector('search_document', config='simple')
+        # Terms are folded to word characters, safe for a raw tsquery
+        search_query = SearchQuery(
+            ' & '.join(f'{term}:*' for term in terms), config='simple', search_type='raw'
+        )
+        return queryset.annotate(
+            search_vector=vector,
+            search_rank=SearchRank(vector, search_query)
+        ).filter(search_vector=search_query).order_by('-search_rank')
+
+    if backend == 'fts5':
+        match = ' '.join(f'"{term}"*' for term in terms)
+        # The queryset's own filters narrow the matches; only those get ranked
+        return queryset.filter(
+            pk__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match])
+        ).annotate(search_rank=FTSRank(match)).order_by('-search_rank')
+
+    for term in terms:
+        queryset = queryset.filter(search_document__contains=term)
+    return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+def rebuild_search_index(batch_size=500):
+    """
+    Rebuild every doctor's search document and index row.
+
+    Returns:
+        int: Number of doctors indexed
+    """
+    from apps.doctors.models import Doctor, DoctorTranslation
+
+    doctors = Doctor.objects.select_related(
+        'user__region', 'user__district', 'hospital'
+    ).order_by('pk')
+
+    count = 0
+    batch = []
+    for doctor in doctors.iterator(chunk_size=batch_size):
+        batch.append(doctor)
+        if len(batch) >= batch_size:
+            count += _rebuild_batch(batch, Doctor, DoctorTranslation)
+            batch = []
+    if batch:
+        count += _rebuild_batch(batch, Doctor, DoctorTranslation)
+    return count
+
+
+def _rebuild_batch(doctors, doctor_model, translation_model):
+    translations = dict(
+        translation_model.objects.filter(
+            doctor_id__in=[doctor.pk for doctor in doctors]
+        ).values_list('doctor_id', 'translations')
+    )
+    for doctor in doctors:
+        doctor.search_document = build_search_document(doctor, translations.get(doctor.pk, {}))
+    doctor_model.objects.bulk_update(doctors, ['search_document'])
+
+    if get_search_backend() == 'fts5':
+        for doctor in doctors:
+            _write_fts_row(doctor.pk, doctor.search_document)
+    return len(doctors)
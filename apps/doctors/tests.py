@@ -1,3 +1,203 @@
-from django.test import TestCase
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from apps.billing.models import DoctorViewCharge, PendingCharge, UserWallet, WalletTransaction
+from apps.doctors.models import ChargeLog, ChargeLogDailyRollup, Doctor, DoctorCharge
+from apps.doctors.services import search_charging, search_index
+
+User = get_user_model()
+
+
+class DoctorSearchTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+        self.cardiologist = self.create_doctor('+998901111111', 'kardiolog', 'Yurak kasalliklari, kardiolog')
+        self.pediatrician = self.create_doctor('+998901111112', 'pediatr', 'Bolalar kardiologi')
+        # Normally created by rebuild_doctor_search_index; rolled back with each test
+        search_index.ensure_search_index()
+
+    @staticmethod
+    def create_doctor(phone, specialty, bio):
+        user = User.objects.create(phone=phone, first_name='Test', last_name='Doctor', user_type='doctor')
+        return Doctor.objects.create(
+            user=user,
+            specialty=specialty,
+            experience=5,
+            education='Tashkent Medical Academy',
+            workplace='City Hospital',
+            consultation_price=50000,
+            bio=bio,
+            verification_status='approved'
+        )
+
+    def test_search_without_terms(self):
+        """A query without searchable terms lists doctors unfiltered"""
+        response = self.client.get('/api/v1/doctors/list/', {'search': '!!!'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        ranked = search_index.search_doctors(Doctor.objects.all(), '!!!')
+        self.assertEqual(
+            {(doctor.pk, doctor.search_rank) for doctor in ranked},
+            {(self.cardiologist.pk, 0.0), (self.pediatrician.pk, 0.0)}
+        )
+
+    def test_search_applies_queryset_filters(self):
+        """Matches outside the filtered queryset are not returned"""
+        queryset = Doctor.objects.filter(specialty='pediatr')
+        self.assertEqual(list(search_index.search_doctors(queryset, 'kardiolog')), [self.pediatrician])
+
+    def test_search_ranks_matches(self):
+        """Every match gets a search rank"""
+        results = list(search_index.search_doctors(Doctor.objects.all(), 'kardiolog'))
+        self.assertEqual({doctor.pk for doctor in results}, {self.cardiologist.pk, self.pediatrician.pk})
+        self.assertTrue(all(doctor.search_rank is not None for doctor in results))
+
+        response = self.client.get('/api/v1/doctors/list/', {'search': 'yurak'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([doctor['id'] for doctor in response.data['results']], [self.cardiologist.pk])
+
+    def test_search_without_index(self):
+        """Until the index is created, searches fall back to substring matching"""
+        if search_index.get_backend() != 'fts5':
+            self.skipTest('FTS5 is not available')
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE {search_index.FTS_TABLE}")
+        self.assertEqual(search_index.get_search_backend(), 'like')
+
+        results = list(search_index.search_doctors(Doctor.objects.all(), 'kardiolog'))
+        self.assertEqual({doctor.pk for doctor in results}, {self.cardiologist.pk, self.pediatrician.pk})
+        self.assertTrue(all(doctor.search_rank == 0.0 for doctor in results))
+
+        # Index writes are skipped, the table is not recreated on the request path
+        search_index.index_doctor(self.cardiologist.pk, 'yurak')
+        self.assertFalse(search_index.search_index_exists())
+
+        response = self.client.get('/api/v1/doctors/list/', {'search': 'yurak'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([doctor['id'] for doctor in response.data['results']], [self.cardiologist.pk])
+
+
+class SearchChargingTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.viewer = User.objects.create(phone='+998901222220', first_name='Test', last_name='Patient')
+        self.doctor = self.create_doctor('+998901222221', Decimal('10000'))
+        self.other_doctor = self.create_doctor('+998901222222', Decimal('10000'))
+
+    @staticmethod
+    def create_doctor(phone, balance, search_charge=Decimal('500')):
+        user = User.objects.create(phone=phone, first_name='Test', last_name='Doctor', user_type='doctor')
+        UserWallet.objects.filter(user=user).update(balance=balance)
+        doctor = Doctor.objects.create(
+            user=user,
+            specialty='terapevt',
+            experience=5,
+            education='Tashkent Medical Academy',
+            workplace='City Hospital',
+            consultation_price=50000,
+            verification_status='approved'
+        )
+        DoctorCharge.objects.create(doctor=doctor, search_charge=search_charge)
+        return doctor
+
+    def charge(self, doctors, user=None, ip_address='10.0.0.1'):
+        request = self.factory.get('/', REMOTE_ADDR=ip_address)
+        request.user = user or AnonymousUser()
+        doctors = Doctor.objects.filter(pk__in=[doctor.pk for doctor in doctors])
+        return search_charging.charge_search_batch(doctors, request)
+
+    def balance(self, doctor):
+        return UserWallet.objects.get(user=doctor.user).balance
+
+    def test_charges_result_page(self):
+        outcomes = self.charge([self.doctor, self.other_doctor], user=self.viewer)
+
+        self.assertEqual(outcomes, {self.doctor.pk: 'charged', self.other_doctor.pk: 'charged'})
+        self.assertEqual(self.balance(self.doctor), Decimal('9500'))
+        self.assertEqual(WalletTransaction.objects.filter(transaction_type='debit').count(), 2)
+        self.assertEqual(DoctorViewCharge.objects.filter(user=self.viewer).count(), 2)
+        self.assertEqual(ChargeLog.objects.filter(charge_type='search').count(), 2)
+
+        rollup = ChargeLogDailyRollup.objects.get(doctor=self.doctor, charge_type='search')
+        self.assertEqual((rollup.count, rollup.amount), (1, Decimal('500')))
+
+    def test_viewer_charged_once_per_day(self):
+        """The per-day dedup key skips doctors already charged for this viewer"""
+        self.charge([self.doctor])
+
+        self.assertEqual(self.charge([self.doctor]), {self.doctor.pk: 'already_charged'})
+        self.assertEqual(self.balance(self.doctor), Decimal('9500'))
+
+        # Another IP is a different viewer
+        self.assertEqual(self.charge([self.doctor], ip_address='10.0.0.2'), {self.doctor.pk: 'charged'})
+
+    def test_doctor_without_charge(self):
+        DoctorCharge.objects.filter(doctor=self.doctor).update(search_charge=0)
+
+        self.assertEqual(self.charge([self.doctor]), {self.doctor.pk: 'no_charge'})
+        self.assertFalse(WalletTransaction.objects.exists())
+
+    def test_missing_or_blocked_wallet(self):
+        UserWallet.objects.filter(user=self.doctor.user).delete()
+        UserWallet.objects.filter(user=self.other_doctor.user).update(is_blocked=True)
+
+        outcomes = self.charge([self.doctor, self.other_doctor])
+
+        self.assertEqual(outcomes, {self.doctor.pk: 'no_wallet', self.other_doctor.pk: 'wallet_blocked'})
+        self.assertEqual(self.balance(self.other_doctor), Decimal('10000'))
+        self.assertFalse(ChargeLog.objects.exists())
+
+    def test_insufficient_balance(self):
+        UserWallet.objects.filter(user=self.doctor.user).update(balance=Decimal('499'))
+
+        outcomes = self.charge([self.doctor, self.other_doctor])
+
+        self.assertEqual(outcomes, {self.doctor.pk: 'insufficient_balance', self.other_doctor.pk: 'charged'})
+        self.assertEqual(self.balance(self.doctor), Decimal('499'))
+
+        # Not marked as charged: the doctor is billed once the wallet is topped up
+        UserWallet.objects.filter(user=self.doctor.user).update(balance=Decimal('1000'))
+        self.assertEqual(self.charge([self.doctor]), {self.doctor.pk: 'charged'})
+
+    def test_partial_ledger_result(self):
+        """A debit rejected by the conditional UPDATE fails alone; the rest of the page is charged"""
+        # The balance read without locks is stale: another request spent it meanwhile
+        UserWallet.objects.filter(user=self.doctor.user).update(balance=Decimal('100'))
+
+        with mock.patch.object(UserWallet, 'has_sufficient_balance', return_value=True):
+            outcomes = self.charge([self.doctor, self.other_doctor], user=self.viewer)
+
+        self.assertEqual(outcomes, {self.doctor.pk: 'insufficient_balance', self.other_doctor.pk: 'charged'})
+        self.assertEqual(self.balance(self.doctor), Decimal('100'))
+        self.assertEqual(list(ChargeLog.objects.values_list('doctor_id', flat=True)), [self.other_doctor.pk])
+        self.assertEqual(DoctorViewCharge.objects.count(), 1)
+        self.assertFalse(ChargeLogDailyRollup.objects.filter(doctor=self.doctor).exists())
+
+    @override_settings(BILLING_SUB_LEDGER={'ENABLED': True, 'SETTLE_INTERVAL': 3600})
+    def test_deferred_charges(self):
+        """With the sub-ledger the page is one bulk INSERT; pending totals are summed once"""
+        PendingCharge.objects.create(
+            wallet=UserWallet.objects.get(user=self.doctor.user), doctor=self.doctor,
+            charge_type='search', amount=Decimal('9600')
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            outcomes = self.charge([self.doctor, self.other_doctor])
+
+        self.assertEqual(outcomes, {self.doctor.pk: 'insufficient_balance', self.other_doctor.pk: 'charged'})
+        self.assertEqual(len([query for query in queries if 'SUM(' in query['sql']]), 1)
+        self.assertEqual(PendingCharge.objects.filter(doctor=self.other_doctor).count(), 1)
+        # Nothing is settled yet
+        self.assertEqual(self.balance(self.other_doctor), Decimal('10000'))
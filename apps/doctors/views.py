@@ -4,11 +4,13 @@ from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import generics, permissions, status, viewsets
 from rest_framework.decorators import action
-from rest_framework.filters import OrderingFilter, SearchFilter
+from rest_framework.filters import OrderingFilter
 from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from apps.billing.sub_ledger import get_available_balance
+from apps.core.geo import filter_nearby, parse_nearby_params
 from apps.core.throttling import SearchThrottle
 from apps.core.utils import get_client_ip, is_private_ip, is_valid_ip
 
@@ -46,23 +48,18 @@ from .serializers import (
     DoctorUpdateSerializer,
     RegionSerializer,
 )
+from .services.search_charging import charge_search_batch
 from .services.translation_service import DoctorTranslationService
 
 
 class DoctorViewSet(viewsets.ModelViewSet):
     """Complete CRUD operations for doctors"""
 
-    queryset = Doctor.objects.select_related(
-        'user', 'hospital', 'translations',
-    ).prefetch_related('files', 'schedules', 'specializations')
+    queryset = Doctor.objects.for_listing().prefetch_related('schedules', 'specializations')
 
     serializer_class = DoctorSerializer
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_class = DoctorFilter
-    search_fields = [
-        'user__first_name', 'user__last_name', 'specialty',
-        'workplace', 'bio', 'region__name', 'district__name'
-    ]
     ordering_fields = [
         'rating', 'total_reviews', 'consultation_price',
         'experience', 'created_at', 'total_consultations'
@@ -383,6 +380,7 @@ class DoctorListView(generics.ListAPIView):
     - Search limit enforcement (per IP for unauthenticated users)
     - Automatic charging for searches (if configured)
     - Rate limiting to prevent abuse
+    - Near me search: ?lat=&lng=&radius_km= (default 10 km)
 
     Rate Limits:
     - Authenticated users: 60 requests/min
@@ -392,28 +390,40 @@ class DoctorListView(generics.ListAPIView):
     queryset = Doctor.objects.filter(
         verification_status='approved',
         is_blocked=False
-    ).select_related(
-        'user', 'hospital', 'charges'
-    ).prefetch_related('files')
+    ).for_listing().select_related('charges')
 
     serializer_class = DoctorSerializer
     permission_classes = [permissions.AllowAny]
     throttle_classes = [SearchThrottle]
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_class = DoctorFilter
-    search_fields = [
-        'user__first_name', 'user__last_name', 'specialty',
-        'workplace', 'bio', 'region__name', 'district__name'
-    ]
     ordering_fields = ['rating', 'total_reviews', 'consultation_price', 'experience', 'charges__search_charge']
     ordering = ['-charges__search_charge', '-rating']
+    # SQL queries per page, search logging and charging included (apps/core/query_budget.py)
+    query_budget = 20
+
+    def filter_queryset(self, queryset):
+        """
+        Filters plus "near me" search: ?lat=&lng=&radius_km=
+
+        Near me results are ordered by distance and ?search= results by
+        relevance, unless ?ordering= is given.
+        """
+        queryset = super().filter_queryset(queryset)
+        query_params = self.request.query_params
+
+        nearby = parse_nearby_params(query_params)
+        if nearby:
+            queryset = filter_nearby(queryset, *nearby, order='ordering' not in query_params)
+        elif query_params.get('search', '').strip() and 'ordering' not in query_params:
+            queryset = queryset.order_by('-search_rank', '-rating')
+        return queryset
 
     def list(self, request, *args, **kwargs):
         """
         Enhanced list with search logging and charging
         """
         from apps.core.models import SearchLog
-        from apps.core.utils import get_client_ip
 
         # Get queryset
         queryset = self.filter_queryset(self.get_queryset())
@@ -431,136 +441,33 @@ class DoctorListView(generics.ListAPIView):
             # Log searches for each doctor shown (for statistics)
             # Only log first page to avoid excessive logging
             if request.query_params.get('page', '1') == '1':
-                ip_address = get_client_ip(request)
-                for doctor in page:
-                    SearchLog.log_search(
-                        entity_type='doctor',
-                        entity_id=doctor.id,
-                        request=request,
-                        action='search'
-                    )
-
-                    # Charge doctor for appearing in search (if configured)
-                    if hasattr(doctor, 'charges'):
-                        user = request.user if request.user.is_authenticated else None
-                        self._charge_for_search(user, doctor)
+                SearchLog.log_searches(
+                    entity_type='doctor',
+                    entity_ids=[doctor.id for doctor in page],
+                    request=request,
+                    action='search'
+                )
+
+                # Charge doctors for appearing in search (if configured)
+                charge_search_batch(page, request)
 
             return self.get_paginated_response(serializer.data)
 
-        serializer = self.get_serializer(queryset, many=True)
+        doctors = list(queryset)
+        serializer = self.get_serializer(doctors, many=True)
 
         # Log and charge for all results (non-paginated)
-        ip_address = get_client_ip(request)
-        for doctor in queryset:
-            SearchLog.log_search(
-                entity_type='doctor',
-                entity_id=doctor.id,
-                request=request,
-                action='search'
-            )
+        SearchLog.log_searches(
+            entity_type='doctor',
+            entity_ids=[doctor.id for doctor in doctors],
+            request=request,
+            action='search'
+        )
 
-            # Charge doctor for appearing in search (if configured)
-            if hasattr(doctor, 'charges'):
-                user = request.user if request.user.is_authenticated else None
-                self._charge_for_search(user, doctor)
+        charge_search_batch(doctors, request)
 
         return Response(serializer.data)
 
-    def _charge_for_search(self, user, doctor):
-        """
-        Charge DOCTOR for appearing in search results
-        Doctor pays for visibility/advertising in search
-        Only charged once per user/IP per doctor per day
-        """
-        if not hasattr(doctor, 'charges') or doctor.charges.search_charge <= 0:
-            return  # No charge configured
-
-        from datetime import date
-
-        from django.core.cache import cache
-
-        from apps.billing.models import DoctorViewCharge, UserWallet, WalletTransaction
-        from apps.core.utils import get_client_ip
-
-        # Create unique charge key based on user ID or IP address
-        if user:
-            charge_identifier = f"user_{user.id}"
-        else:
-            ip_address = get_client_ip(self.request) if hasattr(self, 'request') else '0.0.0.0'
-            charge_identifier = f"ip_{ip_address}"
-
-        charge_key = f"doctor_search_charge_{doctor.id}_{charge_identifier}_{date.today()}"
-
-        if cache.get(charge_key):
-            return  # Already charged today for this user/IP
-
-        try:
-            # Get doctor's wallet
-            doctor_wallet, created = UserWallet.objects.get_or_create(user=doctor.user)
-
-            # Check if doctor's wallet is blocked
-            if doctor_wallet.is_blocked:
-                return
-
-            # Check if doctor has sufficient balance
-            if not doctor_wallet.has_sufficient_balance(doctor.charges.search_charge):
-                return  # Insufficient balance, don't charge
-
-            # Deduct from doctor's wallet
-            balance_before = doctor_wallet.balance
-            doctor_wallet.balance -= doctor.charges.search_charge
-            doctor_wallet.total_spent += doctor.charges.search_charge
-            doctor_wallet.save()
-
-            # Create wallet transaction
-            viewer_name = (user.get_full_name() or user.username) if user else 'anonymous user'
-            transaction = WalletTransaction.objects.create(
-                wallet=doctor_wallet,
-                transaction_type='debit',
-                amount=doctor.charges.search_charge,
-                balance_before=balance_before,
-                balance_after=doctor_wallet.balance,
-                description=f"Search visibility charge - viewed by {viewer_name}",
-                status='completed'
-            )
-
-            # Get IP address for tracking
-            ip_addr = get_client_ip(self.request) if hasattr(self, 'request') else '0.0.0.0'
-
-            # Create DoctorViewCharge record (tracks who viewed the doctor)
-            if user:
-                DoctorViewCharge.objects.create(
-                    user=user,
-                    doctor=doctor,
-                    transaction=transaction,
-                    amount_charged=doctor.charges.search_charge,
-                    ip_address=ip_addr
-                )
-
-            # Create ChargeLog for doctor's records
-            ChargeLog.objects.create(
-                doctor=doctor,
-                charge_type='search',
-                amount=doctor.charges.search_charge,
-                user=user,  # Can be None for unauthenticated
-                ip_address=ip_addr,
-                user_agent=self.request.META.get('HTTP_USER_AGENT', '')[:255] if hasattr(self, 'request') else '',
-                metadata={
-                    'action': 'search_visibility',
-                    'charged_to': 'doctor',
-                    'viewer': user.username if user else f'anonymous_{ip_addr}'
-                }
-            )
-
-            # Mark as charged for today
-            cache.set(charge_key, True, 86400)  # 24 hours
-
-        except Exception as e:
-            # Log error but don't fail the request
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.error(f"Doctor search charge failed for doctor {doctor.id}, user {user.id}: {e}")
-
 
 class DoctorDetailView(generics.RetrieveAPIView):
     """Doctor detail view"""
@@ -599,7 +506,8 @@ class DoctorDetailView(generics.RetrieveAPIView):
 
         from django.core.cache import cache
 
-        from apps.billing.models import DoctorViewCharge, UserWallet, WalletTransaction
+        from apps.billing import ledger, sub_ledger
+        from apps.billing.models import DoctorViewCharge, PendingCharge, UserWallet
 
         # Get or create charge settings
         charge_settings, created = DoctorCharge.objects.get_or_create(doctor=doctor)
@@ -627,27 +535,39 @@ class DoctorDetailView(generics.RetrieveAPIView):
             if doctor_wallet.is_blocked:
                 return
 
-            # Check if doctor has sufficient balance
-            if not doctor_wallet.has_sufficient_balance(charge_settings.view_card_charge):
-                return  # Insufficient balance, don't charge
-
-            # Deduct from doctor's wallet
-            balance_before = doctor_wallet.balance
-            doctor_wallet.balance -= charge_settings.view_card_charge
-            doctor_wallet.total_spent += charge_settings.view_card_charge
-            doctor_wallet.save()
+            if sub_ledger.is_enabled():
+                # One INSERT instead of a wallet row update; settled in batches
+                if sub_ledger.get_available_balance(doctor_wallet) < charge_settings.view_card_charge:
+                    return
+                ip_addr = get_client_ip(request)
+                sub_ledger.defer_charges([PendingCharge(
+                    wallet=doctor_wallet,
+                    doctor=doctor,
+                    charge_type='view_card',
+                    amount=charge_settings.view_card_charge,
+                    viewer=request.user if request.user.is_authenticated else None,
+                    ip_address=ip_addr,
+                    user_agent=request.META.get('HTTP_USER_AGENT', '')[:255],
+                    track_view=True,
+                    metadata={
+                        'action': 'card_view',
+                        'charged_to': 'doctor',
+                        'viewer': request.user.username if request.user.is_authenticated else f'anonymous_{ip_addr}'
+                    }
+                )])
+                cache.set(charge_key, True, 86400)  # 24 hours
+                return
 
-            # Create wallet transaction
+            # Deduct from doctor's wallet (no-op when the balance is insufficient)
             viewer_name = (request.user.get_full_name() or request.user.username) if request.user.is_authenticated else 'anonymous user'
-            transaction = WalletTransaction.objects.create(
-                wallet=doctor_wallet,
-                transaction_type='debit',
-                amount=charge_settings.view_card_charge,
-                balance_before=balance_before,
-                balance_after=doctor_wallet.balance,
-                description=f"Card view charge - viewed by {viewer_name}",
-                status='completed'
-            )
+            try:
+                transaction = ledger.debit(
+                    doctor_wallet.id,
+                    charge_settings.view_card_charge,
+                    f"Card view charge - viewed by {viewer_name}"
+                )
+            except ledger.InsufficientBalance:
+                return  # Insufficient balance, don't charge
 
             # Get IP address for tracking
             ip_addr = get_client_ip(request)
@@ -1083,32 +1003,27 @@ class DoctorSearchView(generics.ListAPIView):
 
     serializer_class = DoctorSerializer
     permission_classes = [permissions.AllowAny]
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_class = DoctorFilter
-    search_fields = [
-        'user__first_name', 'user__last_name', 'specialty',
-        'workplace', 'bio', 'region__name', 'district__name'
-    ]
     ordering_fields = ['rating', 'total_reviews', 'consultation_price', 'experience', 'charges__search_charge']
+    query_budget = 8
 
     def get_queryset(self):
         """Custom queryset with location filtering"""
         queryset = Doctor.objects.filter(
             verification_status='approved',
             is_blocked=False
-        ).select_related(
-            'user', 'hospital', 'region', 'district', 'charges'
-        ).prefetch_related('files')
+        ).for_listing().select_related('charges')
 
-        # Location filtering
+        # Location filtering (region/district live on the doctor's user)
         region_id = self.request.query_params.get('region')
         district_id = self.request.query_params.get('district')
 
         if region_id:
-            queryset = queryset.filter(region_id=region_id)
+            queryset = queryset.filter(user__region_id=region_id)
 
         if district_id:
-            queryset = queryset.filter(district_id=district_id)
+            queryset = queryset.filter(user__district_id=district_id)
 
         # Specialty filtering
         specialty = self.request.query_params.get('specialty')
@@ -1426,7 +1341,7 @@ class DoctorPhoneNumberView(APIView):
             'success': True,
             'phone': doctor.user.phone,
             'charged_amount': charge_settings.view_phone_charge,
-            'remaining_balance': doctor.user.wallet.balance if hasattr(doctor.user, 'wallet') else 0
+            'remaining_balance': get_available_balance(doctor.user.wallet) if hasattr(doctor.user, 'wallet') else 0
         })
 
 
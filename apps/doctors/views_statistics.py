@@ -1,12 +1,11 @@
 
-from django.db.models import Count, Q, Sum
 from django.utils import timezone
 from rest_framework import permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from .models import ChargeLog
 from .serializers import DoctorStatisticsOverviewSerializer
+from .services.charge_rollup import get_charge_totals
 
 
 class DoctorStatisticsOverviewView(APIView):
@@ -31,25 +30,11 @@ class DoctorStatisticsOverviewView(APIView):
         now = timezone.now()
         this_month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
 
-        # Get all-time charge statistics
-        all_time_charges = ChargeLog.objects.filter(doctor=doctor).aggregate(
-            total_searches=Count('id', filter=Q(charge_type='search')),
-            total_card_views=Count('id', filter=Q(charge_type='view_card')),
-            total_phone_views=Count('id', filter=Q(charge_type='view_phone')),
-            total_charges=Count('id'),
-            total_charge_amount=Sum('amount')
-        )
-
-        # Get this month's charge statistics
-        monthly_charges = ChargeLog.objects.filter(
+        # Charge statistics from the daily rollup
+        all_time_charges = get_charge_totals(doctor=doctor)
+        monthly_charges = get_charge_totals(
             doctor=doctor,
-            created_at__gte=this_month_start
-        ).aggregate(
-            searches_this_month=Count('id', filter=Q(charge_type='search')),
-            card_views_this_month=Count('id', filter=Q(charge_type='view_card')),
-            phone_views_this_month=Count('id', filter=Q(charge_type='view_phone')),
-            charges_this_month=Count('id'),
-            charge_amount_this_month=Sum('amount')
+            start_date=timezone.localdate(now).replace(day=1)
         )
 
         # Get consultation statistics for this month
@@ -101,12 +86,12 @@ class DoctorStatisticsOverviewView(APIView):
             'monthly_views': doctor.monthly_views,
 
             # Contact statistics (from ChargeLog)
-            'total_searches': all_time_charges['total_searches'] or 0,
-            'total_card_views': all_time_charges['total_card_views'] or 0,
-            'total_phone_views': all_time_charges['total_phone_views'] or 0,
-            'searches_this_month': monthly_charges['searches_this_month'] or 0,
-            'card_views_this_month': monthly_charges['card_views_this_month'] or 0,
-            'phone_views_this_month': monthly_charges['phone_views_this_month'] or 0,
+            'total_searches': all_time_charges['total_searches'],
+            'total_card_views': all_time_charges['total_card_views'],
+            'total_phone_views': all_time_charges['total_phone_views'],
+            'searches_this_month': monthly_charges['total_searches'],
+            'card_views_this_month': monthly_charges['total_card_views'],
+            'phone_views_this_month': monthly_charges['total_phone_views'],
 
             # Consultation statistics
             'total_consultations': doctor.total_consultations,
@@ -120,10 +105,10 @@ class DoctorStatisticsOverviewView(APIView):
             'reviews_this_month': reviews_this_month,
 
             # Financial statistics
-            'total_charges': all_time_charges['total_charges'] or 0,
-            'total_charge_amount': all_time_charges['total_charge_amount'] or 0,
-            'charges_this_month': monthly_charges['charges_this_month'] or 0,
-            'charge_amount_this_month': monthly_charges['charge_amount_this_month'] or 0,
+            'total_charges': all_time_charges['total_charges'],
+            'total_charge_amount': all_time_charges['total_charge_amount'],
+            'charges_this_month': monthly_charges['total_charges'],
+            'charge_amount_this_month': monthly_charges['total_charge_amount'],
 
             # Wallet information
             'wallet_balance': wallet_balance,
@@ -0,0 +1,49 @@
+"""
+Response cache for the public hospital list.
+
+Pages of HospitalListAPIView are cached per (language, search, cursor,
+page size). Every key embeds a list version that is bumped whenever a
+Hospital, HospitalTranslation, region or district is saved or deleted (see
+the signal handlers in hospitals/models.py), so all cached pages are dropped
+at once without deleting keys one by one.
+
+The version is only seen by every worker with a shared cache backend. With
+a per-process cache (the default LocMemCache) a bump reaches the current
+process only, so pages are kept for LOCAL_CACHE_TIMEOUT seconds and other
+workers serve a changed list for at most that long.
+"""
+import hashlib
+
+from django.core.cache import cache
+
+from apps.core.utils import is_shared_cache
+
+KEY_PREFIX = 'hospital_list'
+VERSION_KEY = f'{KEY_PREFIX}:version'
+CACHE_TIMEOUT = 60 * 15
+LOCAL_CACHE_TIMEOUT = 30
+
+
+def get_cache_timeout():
+    """Page TTL - short when other workers cannot see version bumps"""
+    return CACHE_TIMEOUT if is_shared_cache() else LOCAL_CACHE_TIMEOUT
+
+
+def get_list_version():
+    """Current hospital list version"""
+    return cache.get(VERSION_KEY, 0)
+
+
+def invalidate_hospital_list():
+    """Drop every cached hospital list page"""
+    if not cache.add(VERSION_KEY, 1, None):
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.set(VERSION_KEY, 1, None)
+
+
+def get_page_cache_key(language, search, cursor, page_size):
+    """Cache key of one rendered list page"""
+    params = hashlib.md5(f"{search}\x00{cursor}\x00{page_size}".encode()).hexdigest()
+    return f"{KEY_PREFIX}:v{get_list_version()}:{language}:{params}"
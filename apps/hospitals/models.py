@@ -2,6 +2,8 @@ from django.db import models
 from django.core.validators import RegexValidator, MinValueValidator, MaxValueValidator
 import uuid
 
+from apps.core.geo import sync_geo_fields
+
 
 class Hospital(models.Model):
     """Shifoxonalar modeli"""
@@ -93,6 +95,11 @@ class Hospital(models.Model):
     latitude = models.CharField(max_length=50, blank=True, null=True, verbose_name="Kenglik")
     longitude = models.CharField(max_length=50, blank=True, null=True, verbose_name="Uzunlik")
 
+    # Raqamli koordinatalar va geohash - "yaqin atrofda" qidiruvi uchun (apps/core/geo.py)
+    geo_latitude = models.FloatField(blank=True, null=True, editable=False, verbose_name="Kenglik (raqam)")
+    geo_longitude = models.FloatField(blank=True, null=True, editable=False, verbose_name="Uzunlik (raqam)")
+    geohash = models.CharField(max_length=12, blank=True, default='', editable=False, verbose_name="Geohash")
+
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Yaratilgan")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Yangilangan")
 
@@ -104,11 +111,19 @@ class Hospital(models.Model):
             models.Index(fields=['region', 'district']),
             models.Index(fields=['hospital_type']),
             models.Index(fields=['is_active', 'is_verified']),
+            # Active filter + list cursor ordering; the name/address search is icontains, not indexed
+            models.Index(fields=['is_active', 'name']),
+            models.Index(fields=['geohash']),
+            models.Index(fields=['geo_latitude', 'geo_longitude']),
         ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        kwargs['update_fields'] = sync_geo_fields(self, kwargs.get('update_fields'))
+        super().save(*args, **kwargs)
+
     def update_statistics(self):
         """Statistikalarni yangilash"""
         # Shifokorlar sonini hisoblash
@@ -309,3 +324,22 @@ class HospitalTranslation(models.Model):
         return f"Tarjimalar - {self.hospital.name}"
 
 
+# Hospital list cache invalidation (see apps/hospitals/list_cache.py)
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+
+def _invalidate_hospital_list(sender, **kwargs):
+    """Shifoxonalar ro'yxati cache'ini eskirgan deb belgilash"""
+    update_fields = kwargs.get('update_fields')
+    if update_fields and set(update_fields) <= {'total_doctors', 'total_patients'}:
+        # Statistika hisoblagichlari ro'yxatda ko'rsatilmaydi
+        return
+
+    from .list_cache import invalidate_hospital_list
+    transaction.on_commit(invalidate_hospital_list)
+
+
+for _model in (Hospital, HospitalTranslation, Regions, Districts):
+    post_save.connect(_invalidate_hospital_list, sender=_model, dispatch_uid=f'hospital_list_save_{_model.__name__}')
+    post_delete.connect(_invalidate_hospital_list, sender=_model, dispatch_uid=f'hospital_list_delete_{_model.__name__}')
@@ -1,23 +1,30 @@
 from datetime import timedelta
 from decimal import Decimal
 
+from django.core.cache import cache
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
+from django.utils.translation import get_language
 from django.db.models import Count, Q, Sum
 from django.core.paginator import Paginator
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
+from rest_framework.pagination import CursorPagination
 
+from apps.core.geo import filter_nearby, parse_nearby_params
 from apps.doctors.models import Doctor
 from apps.doctors.services.translation_service import DoctorTranslationService, HospitalTranslationService
 from apps.hospitals.models import HospitalService, Regions, Districts, Hospital, HospitalTranslation
+from apps.billing import free_views
 from apps.billing.models import UserWallet, BillingSettings, DoctorViewCharge
 from apps.billing.services import BillingService
 from apps.payments.models import Payment, PaymentGateway
 from apps.doctors.serializers import DoctorSerializer
 
+from .list_cache import get_cache_timeout, get_page_cache_key
+
 
 class HospitalAdminRequiredPermission(permissions.BasePermission):
     """Custom permission to check if user is hospital admin"""
@@ -214,7 +221,7 @@ class HospitalDashboardAPIView(APIView):
         top_doctors = Doctor.objects.filter(
             hospital=hospital,
             verification_status='approved'
-        ).order_by('-rating')[:5]
+        ).for_listing().order_by('-rating')[:5]
 
         return Response({
             'success': True,
@@ -252,7 +259,7 @@ class HospitalDoctorsListAPIView(APIView):
         per_page = int(request.GET.get('per_page', 15))
 
         # Base queryset
-        doctors = Doctor.objects.filter(hospital=hospital).select_related('user')
+        doctors = Doctor.objects.filter(hospital=hospital).for_listing()
 
         # Apply filters
         if status_filter == 'active':
@@ -380,22 +387,20 @@ class DoctorDetailWithBillingAPIView(APIView):
                     'message': 'Already viewed today - free access'
                 })
 
-            # Check free views
-            free_views_used = BillingService.get_daily_free_views_used(request.user)
-            if free_views_used < settings.free_views_per_day:
-                # Free view available
+            # Use a free view if any are left today
+            if free_views.consume(request.user, settings.free_views_per_day):
                 return Response({
                     'success': True,
                     'doctor': DoctorSerializer(doctor).data,
                     'charged': False,
                     'free_view_used': True,
-                    'free_views_remaining': settings.free_views_per_day - free_views_used - 1,
+                    'free_views_remaining': free_views.remaining(request.user, settings.free_views_per_day),
                     'message': 'Free view used'
                 })
 
             # Need to charge for view
             try:
-                charge_result = BillingService.charge_for_service(request.user, doctor)
+                charge_result = BillingService.charge_for_service(request.user, 'doctor_view', doctor.id)
 
                 return Response({
                     'success': True,
@@ -456,7 +461,7 @@ class DoctorViewAccessCheckAPIView(APIView):
                 })
 
             # Check free views
-            free_views_used = BillingService.get_daily_free_views_used(request.user)
+            free_views_used = free_views.used(request.user)
             if free_views_used < settings.free_views_per_day:
                 return Response({
                     'has_access': True,
@@ -469,12 +474,12 @@ class DoctorViewAccessCheckAPIView(APIView):
             wallet, created = UserWallet.objects.get_or_create(user=request.user)
             billing_rule = settings.get_billing_rule('doctor_view')
 
-            if billing_rule and wallet.balance >= billing_rule.amount:
+            if billing_rule and wallet.balance >= billing_rule.price:
                 return Response({
                     'has_access': True,
                     'reason': 'sufficient_balance',
                     'charge_required': True,
-                    'charge_amount': float(billing_rule.amount),
+                    'charge_amount': float(billing_rule.price),
                     'current_balance': float(wallet.balance)
                 })
 
@@ -482,9 +487,9 @@ class DoctorViewAccessCheckAPIView(APIView):
                 'has_access': False,
                 'reason': 'insufficient_balance',
                 'charge_required': True,
-                'charge_amount': float(billing_rule.amount) if billing_rule else 0,
+                'charge_amount': float(billing_rule.price) if billing_rule else 0,
                 'current_balance': float(wallet.balance),
-                'required_top_up': float(billing_rule.amount - wallet.balance) if billing_rule else 0
+                'required_top_up': float(billing_rule.price - wallet.balance) if billing_rule else 0
             })
 
         except Exception as e:
@@ -875,49 +880,122 @@ class DistrictsListAPIView(APIView):
         })
 
 
+class HospitalCursorPagination(CursorPagination):
+    """Hospital list pagination (name bo'yicha)"""
+    ordering = ('name', 'id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+def _localized_names(place):
+    """Region/district nomlari barcha tillarda"""
+    if place is None:
+        return None
+    return {
+        "uz": place.name,
+        "ru": place.name_ru,
+        "en": place.name_en,
+        "kr": place.name_kr,
+    }
+
+
 class HospitalListAPIView(APIView):
-    """List all hospitals (NEW in v3)"""
+    """
+    List all hospitals (NEW in v3)
+
+    Cursor pagination (?cursor=, ?page_size=), ?search= by name/address,
+    ?lang=uz|ru|en|kr for localized region/district names and near me search
+    (?lat=&lng=&radius_km=, nearest first). Rendered pages are cached per
+    language and dropped when hospitals change (see list_cache); near me
+    pages are not cached.
+
+    The search is a substring match (icontains) and is not index-backed:
+    a leading-wildcard LIKE cannot use a B-tree index, and a trigram index
+    needs PostgreSQL. The (is_active, name) index serves the active filter
+    and the cursor ordering only.
+    """
     permission_classes = [permissions.AllowAny]
+    pagination_class = HospitalCursorPagination
+    languages = ('uz', 'ru', 'en', 'kr')
+    query_budget = 3
 
-    @staticmethod
-    def get(request):
+    def get(self, request):
         """Get list of hospitals with basic info"""
-        hospitals = Hospital.objects.filter(is_active=True).order_by('name')
+        language = request.GET.get('lang') or get_language() or 'uz'
+        if language not in self.languages:
+            language = 'uz'
+        search_query = request.GET.get("search", "").strip()
+        nearby = parse_nearby_params(request.GET)
+
+        cache_key = None
+        if not nearby:
+            cache_key = get_page_cache_key(
+                language,
+                search_query,
+                request.GET.get('cursor', ''),
+                request.GET.get('page_size', '')
+            )
+            data = cache.get(cache_key)
+            if data is not None:
+                return Response(data)
 
-        if "search" in request.GET:
-            search_query = request.GET.get("search", "")
+        hospitals = Hospital.objects.filter(is_active=True).select_related(
+            'region', 'district', 'translations'
+        )
+        if search_query:
             hospitals = hospitals.filter(
                 Q(name__icontains=search_query) |
                 Q(address__icontains=search_query)
             )
 
-        return Response({
+        paginator = self.pagination_class()
+        if nearby:
+            hospitals = filter_nearby(hospitals, *nearby, order=False)
+            paginator.ordering = ('distance_km', 'id')
+        page = paginator.paginate_queryset(hospitals, request, view=self)
+
+        data = {
             'success': True,
-            'hospitals': [
-                {
-                    'id': hospital.id,
-                    'name': hospital.name,
-                    'type': hospital.hospital_type,
-                    'address': hospital.address,
-                    'phone': hospital.phone,
-                    'email': hospital.email,
-                    'region': {
-                        "uz": hospital.region.name,
-                        "ru": hospital.region.name_ru,
-                        "en": hospital.region.name_en,
-                        "kr": hospital.region.name_kr,
-                    },
-                    # 'district': hospital.district,
-                    'district': {
-                        "uz": hospital.district.name,
-                        "ru": hospital.district.name_ru,
-                        "en": hospital.district.name_en,
-                        "kr": hospital.district.name_kr,
-                    },
-                    'logo': hospital.logo.url if hospital.logo else None,
-                    'website': hospital.website,
-                    'translations': HospitalTranslation.objects.filter(hospital=hospital).values()[
-                        0] if HospitalTranslation.objects.filter(hospital=hospital).exists() else {}
-                } for hospital in hospitals
-            ]
-        })
+            'language': language,
+            'next': paginator.get_next_link(),
+            'previous': paginator.get_previous_link(),
+            'hospitals': [self._serialize(hospital, language) for hospital in page]
+        }
+        if cache_key:
+            cache.set(cache_key, data, get_cache_timeout())
+        return Response(data)
+
+    @staticmethod
+    def _serialize(hospital, language):
+        region = _localized_names(hospital.region)
+        district = _localized_names(hospital.district)
+
+        try:
+            translation = hospital.translations
+        except HospitalTranslation.DoesNotExist:
+            translation = None
+
+        return {
+            'id': hospital.id,
+            'name': hospital.name,
+            'type': hospital.hospital_type,
+            'address': hospital.address,
+            'phone': hospital.phone,
+            'email': hospital.email,
+            'region': region,
+            'region_name': (region[language] or region['uz']) if region else None,
+            'district': district,
+            'district_name': (district[language] or district['uz']) if district else None,
+            'logo': hospital.logo.url if hospital.logo else None,
+            'website': hospital.website,
+            'distance_km': round(hospital.distance_km, 2) if hasattr(hospital, 'distance_km') else None,
+            'translations': {
+                'id': translation.id,
+                'hospital_id': translation.hospital_id,
+                'translations': translation.translations,
+                'updated_at': translation.updated_at,
+                'created_at': translation.created_at,
+                'is_auto_translated': translation.is_auto_translated,
+            } if translation else {}
+        }
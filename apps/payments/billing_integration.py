@@ -9,7 +9,9 @@ from django.contrib.auth import get_user_model
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 
-from apps.billing.models import UserWallet, WalletTransaction, BillingRule, DoctorViewCharge, BillingSettings
+from apps.billing import ledger
+from apps.billing.config_cache import get_rule
+from apps.billing.models import UserWallet, DoctorViewCharge, BillingSettings
 from .models import Payment, PaymentGateway
 
 User = get_user_model()
@@ -36,75 +38,18 @@ class WalletService:
     @staticmethod
     def deduct_balance(user, amount, description="", related_object=None):
         """Deduct amount from user wallet"""
-        with transaction.atomic():
-            wallet = WalletService.get_or_create_wallet(user)
-
-            if not wallet.has_sufficient_balance(amount):
-                raise ValidationError(f"Insufficient balance. Available: {wallet.balance}, Required: {amount}")
-
-            # Store balance before deduction
-            balance_before = wallet.balance
-
-            # Deduct balance
-            wallet.balance -= amount
-            wallet.total_spent += amount
-            wallet.save()
-
-            # Create transaction record
-            wallet_transaction = WalletTransaction.objects.create(
-                wallet=wallet,
-                transaction_type='debit',
-                amount=amount,
-                balance_before=balance_before,
-                balance_after=wallet.balance,
-                description=description,
-                status='completed'
-            )
-
-            # Link to related object if provided
-            if related_object:
-                from django.contrib.contenttypes.models import ContentType
-                content_type = ContentType.objects.get_for_model(related_object)
-                wallet_transaction.content_type = content_type
-                wallet_transaction.object_id = related_object.pk
-                wallet_transaction.save()
+        wallet = WalletService.get_or_create_wallet(user)
 
-            return wallet_transaction
+        try:
+            return ledger.debit(wallet.id, amount, description, ref=related_object)
+        except ledger.InsufficientBalance:
+            raise ValidationError(f"Insufficient balance. Available: {wallet.balance}, Required: {amount}")
 
     @staticmethod
     def add_balance(user, amount, description="", related_object=None):
         """Add amount to user wallet"""
-        with transaction.atomic():
-            wallet = WalletService.get_or_create_wallet(user)
-
-            # Store balance before addition
-            balance_before = wallet.balance
-
-            # Add balance
-            wallet.balance += amount
-            wallet.total_topped_up += amount
-            wallet.save()
-
-            # Create transaction record
-            wallet_transaction = WalletTransaction.objects.create(
-                wallet=wallet,
-                transaction_type='credit',
-                amount=amount,
-                balance_before=balance_before,
-                balance_after=wallet.balance,
-                description=description,
-                status='completed'
-            )
-
-            # Link to related object if provided
-            if related_object:
-                from django.contrib.contenttypes.models import ContentType
-                content_type = ContentType.objects.get_for_model(related_object)
-                wallet_transaction.content_type = content_type
-                wallet_transaction.object_id = related_object.pk
-                wallet_transaction.save()
-
-            return wallet_transaction
+        wallet = WalletService.get_or_create_wallet(user)
+        return ledger.credit(wallet.id, amount, description, ref=related_object)
 
     @staticmethod
     def get_wallet_info(user):
@@ -146,14 +91,10 @@ class BillingService:
     @staticmethod
     def get_service_price(service_type, quantity=1):
         """Get price for a service"""
-        try:
-            billing_rule = BillingRule.objects.get(
-                service_type=service_type,
-                is_active=True
-            )
-            return billing_rule.get_effective_price(quantity)
-        except BillingRule.DoesNotExist:
+        billing_rule = get_rule(service_type)
+        if billing_rule is None:
             return Decimal('0.00')
+        return billing_rule.get_effective_price(quantity)
 
     @staticmethod
     def can_access_service(user, service_type, quantity=1):
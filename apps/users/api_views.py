@@ -23,6 +23,7 @@ from apps.core.throttling import (
 from apps.core.utils import get_client_ip
 
 from .models import UserMedicalHistory, UserPreferences
+from .service_search import search_service_ids
 from .serializers import (
     ChangePasswordSerializer,
     DoctorRegistrationSerializer,
@@ -678,47 +679,6 @@ def update_my_profile(request):
 # Import them from there instead of defining here
 
 
-def expand_search_terms(query):
-    """
-    Expand search terms to include common abbreviations and synonyms
-    """
-    query_lower = query.lower().strip()
-
-    # Common medical abbreviations and their full forms
-    abbreviations = {
-        'lab': ['laboratory', 'laboratoriya', 'лаборатория'],
-        'ct': ['computed tomography', 'компьютерная томография', 'kt'],
-        'mri': ['magnetic resonance imaging', 'мрт', 'magnitno-rezonans'],
-        'uzi': ['ultrasound', 'ultrasonografiya', 'узи'],
-        'ekg': ['electrocardiogram', 'elektrokardiogramma', 'экг'],
-        'xray': ['x-ray', 'rentgen', 'рентген', 'rentgenografiya'],
-        'blood': ['qon', 'кровь', 'qon tahlili'],
-        'urine': ['siydik', 'моча', 'siydik tahlili'],
-        'cardio': ['cardiologia', 'kardiologiya', 'кардиология', 'yurak'],
-        'neuro': ['neurologiya', 'неврология', 'asab'],
-        'ortho': ['orthopediya', 'ортопедия', 'ortopediya'],
-        'pediatr': ['pediatriya', 'педиатрия', 'bolalar'],
-        'gyneco': ['ginekologiya', 'гинекология', 'ayollar'],
-    }
-
-    # Expand search terms
-    expanded_terms = [query_lower]
-
-    # Check if query matches any abbreviation
-    for abbrev, expansions in abbreviations.items():
-        if abbrev in query_lower or query_lower in abbrev:
-            expanded_terms.extend(expansions)
-
-    # Check if query matches any expansion
-    for abbrev, expansions in abbreviations.items():
-        for expansion in expansions:
-            if expansion in query_lower or query_lower in expansion:
-                expanded_terms.append(abbrev)
-                expanded_terms.extend(expansions)
-
-    return list(set(expanded_terms))  # Remove duplicates
-
-
 class ServiceSearchAPIView(APIView):
     """
     Service Search API for Users
@@ -733,6 +693,7 @@ class ServiceSearchAPIView(APIView):
     """
     permission_classes = [permissions.AllowAny]
     throttle_classes = [SearchThrottle]
+    query_budget = 8
 
     def get(self, request):
         query = request.GET.get('q', '').strip()
@@ -750,35 +711,15 @@ class ServiceSearchAPIView(APIView):
             }, status=status.HTTP_400_BAD_REQUEST)
 
         # Search for matching service names in DoctorServiceName
-        from apps.doctors.models import DoctorService, DoctorServiceName
+        from apps.doctors.models import DoctorService
         from apps.hospitals.models import HospitalService
 
-        # Step 1: Find matching service names (enhanced search with abbreviations)
-        search_query = Q()
-
-        # Expand search terms to include abbreviations and synonyms
-        expanded_terms = expand_search_terms(query)
-
-        # Search in all language fields with case-insensitive matching
-        search_fields = ['name', 'name_en', 'name_ru', 'name_kr', 'description']
-
-        # Search for original query and expanded terms
-        for term in expanded_terms:
-            for field in search_fields:
-                search_query |= Q(**{f'{field}__icontains': term})
-
-        # Also search individual words from the original query
-        query_words = query.lower().split()
-        for word in query_words:
-            if len(word) >= 2:  # Only search words with 2+ characters
-                for field in search_fields:
-                    search_query |= Q(**{f'{field}__icontains': word})
-
-        matching_service_names = DoctorServiceName.objects.filter(search_query).distinct()
+        # Step 1: Find matching service names (in-memory index, abbreviations expanded)
+        service_name_ids, hospital_service_ids, expanded_terms = search_service_ids(query)
 
         # Step 2: Get doctors with these services
         doctor_services = DoctorService.objects.filter(
-            name__in=matching_service_names,
+            name_id__in=service_name_ids,
             is_active=True,
             doctor__verification_status='approved',
             doctor__is_available=True,
@@ -831,25 +772,9 @@ class ServiceSearchAPIView(APIView):
                 'is_active': service.is_active
             })
 
-        # Step 3: Get hospitals with matching services (enhanced search)
-        hospital_search_query = Q()
-
-        # Search in hospital service name and description with expanded terms
-        hospital_search_fields = ['name', 'description']
-
-        # Search for expanded terms
-        for term in expanded_terms:
-            for field in hospital_search_fields:
-                hospital_search_query |= Q(**{f'{field}__icontains': term})
-
-        # Also search individual words from original query
-        for word in query_words:
-            if len(word) >= 2:
-                for field in hospital_search_fields:
-                    hospital_search_query |= Q(**{f'{field}__icontains': word})
-
+        # Step 3: Get hospitals with matching services
         hospital_services = HospitalService.objects.filter(
-            hospital_search_query,
+            id__in=hospital_service_ids,
             is_active=True,
             hospital__is_active=True,
             hospital__is_verified=True
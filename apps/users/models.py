@@ -415,4 +415,21 @@ from django.dispatch import receiver
 def create_user_preferences(sender, instance, created, **kwargs):
     """Yangi user yaratilganda preferences ham yaratish"""
     if created:
-        UserPreferences.objects.create(user=instance)
\ No newline at end of file
+        UserPreferences.objects.create(user=instance)
+
+# Service search index invalidation (see apps/users/service_search.py)
+from django.db import transaction
+from django.db.models.signals import post_delete
+
+SERVICE_SEARCH_MODELS = ('doctors.DoctorServiceName', 'hospitals.HospitalService')
+
+
+def _invalidate_service_search(sender, **kwargs):
+    """Service names changed - rebuild the in-memory search index"""
+    from .service_search import invalidate_service_index
+    transaction.on_commit(invalidate_service_index)
+
+
+for _model in SERVICE_SEARCH_MODELS:
+    post_save.connect(_invalidate_service_search, sender=_model, dispatch_uid=f'service_search_save_{_model}')
+    post_delete.connect(_invalidate_service_search, sender=_model, dispatch_uid=f'service_search_delete_{_model}')
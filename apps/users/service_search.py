@@ -0,0 +1,222 @@
+"""
+In-memory search index for medical service names.
+
+ServiceSearchAPIView used to OR ``icontains`` over every field, expanded term
+and query word (60+ LIKE clauses for a three-word query). Service names are a
+small, rarely changing table, so they are indexed once per process instead:
+
+    - every indexed text (DoctorServiceName name/name_en/name_ru/name_kr/
+      description, HospitalService name/description) is folded with
+      apps.core.text.normalize_text, so Latin and Cyrillic spellings match;
+    - a trie maps every prefix of every token suffix to service ids, which
+      keeps the old ``icontains`` semantics ("kardio" still finds
+      "elektrokardiogramma") with one dict walk per term;
+    - a term matches a service when all its words match; the query matches
+      the union over its words and their abbreviation expansions
+      (``expand_search_terms``).
+
+The database is then queried with ``id__in`` only.
+
+Freshness:
+    - Saving or deleting a DoctorServiceName or HospitalService bumps a
+      version in the cache (see the signal handlers in users/models.py); a
+      process rebuilds its index on the next search after the version
+      changes. With a per-process cache (LocMemCache) only the process that
+      saved sees the new version.
+    - Every process therefore also checks the table itself at most every
+      ``CHECK_INTERVAL`` seconds: one COUNT/MAX(updated_at) query, and a
+      rebuild when the result differs from the one the index was built at.
+"""
+import threading
+import time
+
+from django.apps import apps
+from django.core.cache import cache
+from django.db.models import Count, Max
+
+from apps.core.text import normalize_text
+
+VERSION_KEY = 'service_search:version'
+
+# Seconds an index is used before its table is checked for changes
+CHECK_INTERVAL = 30
+
+MIN_TOKEN_LENGTH = 2
+
+# Common medical abbreviations and their full forms
+SERVICE_ABBREVIATIONS = {
+    'lab': ['laboratory', 'laboratoriya', 'лаборатория'],
+    'ct': ['computed tomography', 'компьютерная томография', 'kt'],
+    'mri': ['magnetic resonance imaging', 'мрт', 'magnitno-rezonans'],
+    'uzi': ['ultrasound', 'ultrasonografiya', 'узи'],
+    'ekg': ['electrocardiogram', 'elektrokardiogramma', 'экг'],
+    'xray': ['x-ray', 'rentgen', 'рентген', 'rentgenografiya'],
+    'blood': ['qon', 'кровь', 'qon tahlili'],
+    'urine': ['siydik', 'моча', 'siydik tahlili'],
+    'cardio': ['cardiologia', 'kardiologiya', 'кардиология', 'yurak'],
+    'neuro': ['neurologiya', 'неврология', 'asab'],
+    'ortho': ['orthopediya', 'ортопедия', 'ortopediya'],
+    'pediatr': ['pediatriya', 'педиатрия', 'bolalar'],
+    'gyneco': ['ginekologiya', 'гинекология', 'ayollar'],
+}
+
+
+def expand_search_terms(query):
+    """
+    Expand search terms to include common abbreviations and synonyms
+    """
+    query_lower = query.lower().strip()
+
+    # Expand search terms
+    expanded_terms = [query_lower]
+
+    # Check if query matches any abbreviation
+    for abbrev, expansions in SERVICE_ABBREVIATIONS.items():
+        if abbrev in query_lower or query_lower in abbrev:
+            expanded_terms.extend(expansions)
+
+    # Check if query matches any expansion
+    for abbrev, expansions in SERVICE_ABBREVIATIONS.items():
+        for expansion in expansions:
+            if expansion in query_lower or query_lower in expansion:
+                expanded_terms.append(abbrev)
+                expanded_terms.extend(expansions)
+
+    return list(set(expanded_terms))  # Remove duplicates
+
+
+def _tokens(text):
+    return [token for token in normalize_text(text).split() if len(token) >= MIN_TOKEN_LENGTH]
+
+
+class ServiceNameIndex:
+    """Substring trie from folded tokens to service ids"""
+
+    def __init__(self, entries=()):
+        """
+        Args:
+            entries: Iterable of (service_id, [text, ...])
+        """
+        # Node: (children by character, ids of services passing through)
+        self._root = ({}, set())
+        for service_id, texts in entries:
+            for token in set(_tokens(' '.join(text for text in texts if text))):
+                self._add(token, service_id)
+
+    def _add(self, token, service_id):
+        for start in range(len(token) - MIN_TOKEN_LENGTH + 1):
+            node = self._root
+            for char in token[start:]:
+                node = node[0].setdefault(char, ({}, set()))
+                node[1].add(service_id)
+
+    def lookup(self, token):
+        """Ids of services with a token containing ``token``"""
+        node = self._root
+        for char in token:
+            node = node[0].get(char)
+            if node is None:
+                return set()
+        return node[1]
+
+    def match(self, terms):
+        """
+        Ids of services matching any of the terms.
+
+        A term matches when every one of its words is found.
+        """
+        matched = set()
+        for term in terms:
+            tokens = _tokens(term)
+            if not tokens:
+                continue
+            ids = set(self.lookup(tokens[0]))
+            for token in tokens[1:]:
+                ids &= self.lookup(token)
+                if not ids:
+                    break
+            matched |= ids
+        return matched
+
+
+def _doctor_service_entries():
+    from apps.doctors.models import DoctorServiceName
+
+    for row in DoctorServiceName.objects.values_list(
+        'id', 'name', 'name_en', 'name_ru', 'name_kr', 'description'
+    ).iterator():
+        yield row[0], row[1:]
+
+
+def _hospital_service_entries():
+    from apps.hospitals.models import HospitalService
+
+    for row in HospitalService.objects.values_list('id', 'name', 'description').iterator():
+        yield row[0], row[1:]
+
+
+_indexes = {}  # name -> (version, table fingerprint, checked at, index)
+_build_lock = threading.Lock()
+
+# Index name -> (model of the indexed table, entries)
+INDEX_SOURCES = {
+    'doctor_services': ('doctors.DoctorServiceName', _doctor_service_entries),
+    'hospital_services': ('hospitals.HospitalService', _hospital_service_entries),
+}
+
+
+def _fingerprint(name):
+    """Row count and last update of the indexed table"""
+    model = apps.get_model(INDEX_SOURCES[name][0])
+    totals = model.objects.aggregate(count=Count('id'), updated_at=Max('updated_at'))
+    return totals['count'], totals['updated_at']
+
+
+def get_index(name):
+    """Current index of ``name`` (one of INDEX_SOURCES), rebuilt if outdated"""
+    version = cache.get(VERSION_KEY, 0)
+    built = _indexes.get(name)
+    if built is not None and built[0] == version and time.monotonic() - built[2] < CHECK_INTERVAL:
+        return built[3]
+
+    with _build_lock:
+        built = _indexes.get(name)
+        now = time.monotonic()
+        if built is not None and built[0] == version and now - built[2] < CHECK_INTERVAL:
+            return built[3]
+
+        # Read before building: changes made while building leave it outdated
+        fingerprint = _fingerprint(name)
+        if built is not None and built[0] == version and built[1] == fingerprint:
+            index = built[3]
+        else:
+            index = ServiceNameIndex(INDEX_SOURCES[name][1]())
+        _indexes[name] = (version, fingerprint, now, index)
+    return index
+
+
+def invalidate_service_index():
+    """Service names changed - rebuild on the next search (other processes: see CHECK_INTERVAL)"""
+    if not cache.add(VERSION_KEY, 1, None):
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.set(VERSION_KEY, 1, None)
+
+
+def search_service_ids(query):
+    """
+    Match a search query against service names.
+
+    Returns:
+        tuple: (DoctorServiceName ids, HospitalService ids, expanded terms)
+    """
+    expanded_terms = expand_search_terms(query)
+    # Individual words of the query match on their own too
+    terms = expanded_terms + query.lower().split()
+
+    return (
+        get_index('doctor_services').match(terms),
+        get_index('hospital_services').match(terms),
+        expanded_terms,
+    )
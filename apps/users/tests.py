@@ -70,4 +70,49 @@ class AuthenticationTestCase(TestCase):
 
         # Verify doctor is approved
         doctor_user.refresh_from_db()
-        self.assertTrue(doctor_user.is_approved_by_admin)
\ No newline at end of file
+        self.assertTrue(doctor_user.is_approved_by_admin)
+
+class ServiceSearchQueryBudgetTestCase(TestCase):
+    def setUp(self):
+        from apps.doctors.models import Doctor, DoctorService, DoctorServiceName
+        from apps.hospitals.models import Hospital, HospitalService
+
+        self.client = APIClient()
+        # bulk_create skips DoctorServiceName.save(), which calls the translation API
+        service_name = DoctorServiceName.objects.bulk_create([
+            DoctorServiceName(name='Kardiologiya', name_ru='Кардиология')
+        ])[0]
+        for index in range(10):
+            user = User.objects.create(
+                phone=f'+9989012300{index:02d}',
+                user_type='doctor',
+                first_name='Doctor',
+                last_name=f'User{index}'
+            )
+            doctor = Doctor.objects.create(
+                user=user,
+                specialty='kardiolog',
+                experience=5,
+                education='Tashkent Medical Academy',
+                workplace='City Hospital',
+                consultation_price=50000,
+                verification_status='approved'
+            )
+            DoctorService.objects.create(doctor=doctor, name=service_name, price=100000)
+
+            hospital = Hospital.objects.create(
+                name=f'Hospital {index}',
+                address='Tashkent',
+                phone='+998712000000',
+                is_verified=True
+            )
+            HospitalService.objects.create(hospital=hospital, name='Kardiologiya tekshiruvi')
+
+    def test_service_search_query_budget(self):
+        """Query count does not grow with the number of matching doctors and hospitals"""
+        from apps.core.query_budget import assert_query_budget
+
+        response = assert_query_budget(self.client, '/api/v1/users/services/search/?q=kardio')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data']['total_doctors'], 10)
+        self.assertEqual(response.data['data']['total_hospitals'], 10)